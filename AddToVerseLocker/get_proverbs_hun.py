@@ -1,5 +1,6 @@
 from hmac import new
 import os
+import sys
 import xml.etree.ElementTree as ET
 import time
 from selenium import webdriver
@@ -10,11 +11,18 @@ from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 import dotenv
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import bible_books
+from verse_pack import open_pack_dir
+
 # --- CONFIGURATION ---
 dotenv.load_dotenv()
 EMAIL = os.getenv('EMAIL')
 PASSWORD = os.getenv('PASSWORD')
 XML_FILE = "SF_2005-03-10_HUN_HUNUJ_(MAGYAR ÚJFORDÍTÁSÚ BIBLIA).xml"
+# Optional: directory of .pack files built by `xml_to_json.py --pack` from the same XML.
+# When set, verses are read from the memory-mapped packs instead of parsing the XML.
+PACK_DIR = None
 BATCH_SIZE = 6
 
 # *** LIST THE BOOKS YOU WANT TO ADD HERE ***
@@ -22,63 +30,75 @@ BOOKS_TO_PROCESS = [
     "Revelation",
 ]
 
-# Mapping English Book names to XML names
-BOOK_MAP = {
-    "Proverbs": "Példabeszédek",
-    "Genesis": "1 Mózes", "Exodus": "2 Mózes", "Leviticus": "3 Mózes", "Numbers": "4 Mózes", "Deuteronomy": "5 Mózes",
-    "Joshua": "Józsué", "Judges": "Bírák", "Ruth": "Ruth", "1 Samuel": "1 Sámuel", "2 Samuel": "2 Sámuel",
-    "1 Kings": "1 Királyok", "2 Kings": "2 Királyok", "1 Chronicles": "1 Krónikák", "2 Chronicles": "2 Krónika",
-    "Ezra": "Ezsdrás", "Nehemiah": "Nehemiás", "Esther": "Eszter", "Job": "Jób", "Psalm": "Zsoltárok", "Psalm": "Zsoltárok",
-    "Ecclesiastes": "Prédikátor", "Song of Solomon": "Énekek éneke", "Isaiah": "Ézsaiás",
-    "Jeremiah": "Jeremiás", "Lamentations": "Jeremiás siralmai", "Ezekiel": "Ezékiel", "Daniel": "Dániel", "Hosea": "Hóseás",
-    "Joel": "Jóel", "Amos": "Ámósz", "Obadiah": "Abdiás", "Jonah": "Jónás", "Micah": "Mikeás", "Nahum": "Náhum",
-    "Habakkuk": "Habakuk", "Zephaniah": "Zofóniás", "Haggai": "Haggeus", "Zechariah": "Zakariás", "Malachi": "Malakiás",
-    "Matthew": "Máté", "Mark": "Márk", "Luke": "Lukács", "John": "János", "Acts": "Apostolok cselekedetei",
-    "Romans": "Rómaiakhoz", "1 Corinthians": "1 Korintusi", "2 Corinthians": "2 Korintusi", "Galatians": "Galatákhoz",
-    "Ephesians": "Efézusiakhoz", "Philippians": "Filippiekhez", "Colossians": "Kolosséiakhoz", "1 Thessalonians": "1 Thesszalonika",
-    "2 Thessalonians": "2 Thesszalonika", "1 Timothy": "1 Timóteushoz", "2 Timothy": "2 Timóteushoz", "Titus": "Tituszhoz",
-    "Philemon": "Filemonhoz", "Hebrews": "Zsidókhoz", "James": "Jakab", "1 Peter": "1 Péter", "2 Peter": "2 Péter",
-    "1 John": "1 János", "2 John": "2 János", "3 John": "3 János", "Jude": "Júdás", "Revelation": "Jelenések"
-}
 
 class BibleIndexer:
-    def __init__(self, xml_path):
-        print(f"Loading and indexing XML: {xml_path}...")
+    def __init__(self, xml_path, pack_dir=None):
         self.data = {}
+        self.packs = {}
+        if pack_dir:
+            print(f"Opening verse packs: {pack_dir}...")
+            self.packs = open_pack_dir(pack_dir)
+            print(f"Opened {len(self.packs)} book packs.")
+            return
+
+        print(f"Loading and indexing XML: {xml_path}...")
         try:
             tree = ET.parse(xml_path)
             for book in tree.findall("BIBLEBOOK"):
-                b_name = book.get("bname")
-                self.data[b_name] = {}
+                # Keyed by canonical book ID (bnumber), independent of the XML's language
+                canonical = bible_books.by_number(book.get("bnumber")) or bible_books.resolve(book.get("bname", ""))
+                if canonical is None:
+                    print(f"Unknown book in XML: {book.get('bnumber')} {book.get('bname')}, skipped.")
+                    continue
+                book_id = canonical.id
+                self.data[book_id] = {}
                 for chap in book.findall("CHAPTER"):
                     c_num = int(chap.get("cnumber"))
-                    self.data[b_name][c_num] = {}
+                    self.data[book_id][c_num] = {}
                     for verse in chap.findall("VERS"):
                         v_num = int(verse.get("vnumber"))
                         if verse.text:
-                            self.data[b_name][c_num][v_num] = verse.text.strip()
+                            self.data[book_id][c_num][v_num] = verse.text.strip()
             print("Indexing complete.")
         except Exception as e:
             print(f"CRITICAL ERROR loading XML: {e}")
 
-    def get_text_for_range(self, book_hu, chapter, start, end):
+    def has_book(self, book_id):
+        return book_id in self.packs or book_id in self.data
+
+    def get_chapters(self, book_id):
+        if book_id in self.packs:
+            return self.packs[book_id].chapters()
+        return sorted(self.data[book_id].keys())
+
+    def get_verse_numbers(self, book_id, chapter):
+        if book_id in self.packs:
+            return self.packs[book_id].verses(chapter)
+        return sorted(self.data[book_id][chapter].keys())
+
+    def get_text_for_range(self, book_id, chapter, start, end):
+        if book_id in self.packs:
+            texts = [f"{v} {text}" for v, text in self.packs[book_id].get_range(chapter, start, end)]
+            return " ".join(texts) if texts else None
+
         texts = []
-        chap_data = self.data.get(book_hu, {}).get(chapter, {})
+        chap_data = self.data.get(book_id, {}).get(chapter, {})
         for v in range(start, end + 1):
             if v in chap_data:
                 texts.append(f"{v} {chap_data[v]}")
         return " ".join(texts) if texts else None
 
     def generate_batches_for_book(self, book_en, batch_size):
-        book_hu = BOOK_MAP.get(book_en, book_en)
+        book = bible_books.resolve(book_en)
         batches = []
         
-        if book_hu not in self.data:
-            print(f"Book '{book_hu}' not found in XML.")
+        if book is None or not self.has_book(book.id):
+            print(f"Book '{book_en}' not found in XML.")
             return []
+        book_id = book.id
 
-        for chap_num in sorted(self.data[book_hu].keys()):
-            verses = sorted(self.data[book_hu][chap_num].keys())
+        for chap_num in self.get_chapters(book_id):
+            verses = self.get_verse_numbers(book_id, chap_num)
             if not verses: continue
             
             total_verses = len(verses)
@@ -104,7 +124,7 @@ def click_list_item(wait, container_id, item_text):
     wait.until(EC.element_to_be_clickable((By.XPATH, xpath))).click()
 
 def main():
-    bible = BibleIndexer(XML_FILE)
+    bible = BibleIndexer(XML_FILE, PACK_DIR)
     
     # 1. SETUP BROWSER
     service = Service(ChromeDriverManager().install())
@@ -135,13 +155,13 @@ def main():
             print(f"Found {len(upload_queue)} batches for {current_book}.")
 
             for (book_en, chap, start_v, end_v) in upload_queue:
-                book_hu = BOOK_MAP.get(book_en, book_en)
-                text_content = bible.get_text_for_range(book_hu, chap, start_v, end_v)
+                book = bible_books.resolve(book_en)
+                text_content = bible.get_text_for_range(book.id, chap, start_v, end_v)
                 
                 if not text_content: continue
 
                 # Define the Collection Name for the website (Book + Chapter)
-                playlist_name = f"{book_hu} {chap}"
+                playlist_name = f"{book.hu} {chap}"
 
                 print(f"Uploading: {book_en} {chap}:{start_v}-{end_v} -> Playlist: '{playlist_name}'")
                 
@@ -14,18 +14,11 @@ const OUTPUT_DIR = path.join(ASSETS_DIR, 'index/search');
 // Minimum word length to include in the index
 const MIN_WORD_LENGTH = 3;
 
-// Standard Book IDs (1-66) — same order as generate-bibles.js
+// Standard Book IDs (1-66), index = bnumber. Read from the canonical book list
+// (translation_structures/books.json, kept in sync with bible_books.py).
 const BOOK_ID_MAP = [
   null,
-  'gen', 'exo', 'lev', 'num', 'deu', 'jos', 'jdg', 'rut',
-  '1sa', '2sa', '1ki', '2ki', '1ch', '2ch', 'ezr', 'neh', 'est',
-  'job', 'psa', 'pro', 'ecc', 'sng',
-  'isa', 'jer', 'lam', 'eze', 'dan',
-  'hos', 'joe', 'amo', 'oba', 'jon', 'mic', 'nah', 'hab', 'zep', 'hag', 'zec', 'mal',
-  'mat', 'mar', 'luk', 'joh', 'act',
-  'rom', '1co', '2co', 'gal', 'eph', 'phi', 'col',
-  '1th', '2th', '1ti', '2ti', 'tit', 'phm',
-  'heb', 'jam', '1pe', '2pe', '1jo', '2jo', '3jo', 'jud', 'rev',
+  ...require('../src/assets/translation_structures/books.json').map((book) => book.id),
 ];
 
 // ============================================================================
@@ -1,11 +1,20 @@
+import argparse
+import asyncio
 import os
+import sys
 import json
-import requests
+import httpx
 import re
 import pandas as pd
 import time
+from collections import deque
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import List, Dict, Any
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import bible_books
+
 # ==========================================
 # CONFIGURATION
 # ==========================================
@@ -13,51 +22,48 @@ from typing import List, Dict, Any
 CONFIG = {
     "LLM_MODEL": "gemma2:9b-instruct",
     "LLM_API_URL": "http://localhost:11434/api/generate",
-    "BATCH_SIZE": 5,           
+    "BATCH_SIZE": 5,           # starting size, adapted at runtime
+    "MAX_BATCH_SIZE": 20,
+    "TOKEN_BUDGET": 3000,      # estimated prompt tokens per request
+    "ADAPT_WINDOW": 8,         # recent batches the success rate is computed over
+    "GROW_ABOVE": 0.95,
+    "SHRINK_BELOW": 0.7,
+    "MAX_SINGLE_ATTEMPTS": 2,
+    "REORDER_WINDOW": 200,     # verses
+    "IN_FLIGHT": 4,            # concurrent LLM requests
+    "LLM_TIMEOUT": 300,        # seconds
+    "KEEP_ALIVE": "30m",       # keeps the model and its cached system prompt loaded between batches
     "CHUNK_SIZE": 300,         
     "OUTPUT_DIR": "dist/bibles/hu_tagged",
     
     # EXACT FILES
     "INPUT_CSV": "BHS-with-Strong-no-extended.csv", 
-    "INPUT_JSON_HU": "1chron_1.json",
+    "INPUT_JSON_HU": "1ch_1.json",
     
     # Your dictionary path (optional, uses internal fallback if missing)
-    "STRONGS_DIR": "src/assets/strongs/hebrew"
-}
-
-# Standard Book Numbering (BHS/KJV Common Intersection)
-BOOK_MAP = {
-    1: "gen", 2: "exod", 3: "lev", 4: "num", 5: "deut",
-    6: "josh", 7: "judg", 8: "ruth", 9: "1sam", 10: "2sam",
-    11: "1kings", 12: "2kings", 13: "1chron", 14: "2chron",
-    15: "ezra", 16: "neh", 17: "est", 18: "job", 19: "ps",
-    20: "prov", 21: "eccl", 22: "song", 23: "isa", 24: "jer",
-    25: "lam", 26: "ezek", 27: "dan", 28: "hos", 29: "joel",
-    30: "amos", 31: "obad", 32: "jonah", 33: "mic", 34: "nah",
-    35: "hab", 36: "zeph", 37: "hag", 38: "zech", 39: "mal"
+    "STRONGS_DIR": "src/assets/strongs/hebrew",
+    "STRONGS_BUCKET_SIZE": 350,    # CHUNK_SIZE in "# fix_strongs_csv.py"
+    "KEYWORD_CACHE_SIZE": 8192,
 }
 
-os.makedirs(CONFIG["OUTPUT_DIR"], exist_ok=True)
-
 # ==========================================
 # 1. DICTIONARY SERVICE
 # ==========================================
 
 class DictionaryService:
-    def __init__(self):
-        self.definitions = {}
-        # Try loading real files
-        if os.path.exists(CONFIG["STRONGS_DIR"]):
-            try:
-                files = [f for f in os.listdir(CONFIG["STRONGS_DIR"]) if f.endswith(".json")]
-                print(f"[Dict] Loading {len(files)} Strong's files...")
-                for file in files:
-                    with open(os.path.join(CONFIG["STRONGS_DIR"], file), 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        for k, v in data.items():
-                            self.definitions[k] = v.get("defs", {})
-            except Exception as e:
-                print(f"[Dict] Warning: {e}")
+    """
+    Strong's lookups without loading the whole dictionary: the entries are
+    stored in buckets of STRONGS_BUCKET_SIZE numbers (strongs_h1.json,
+    strongs_h351.json, ... as written by "# fix_strongs_csv.py"), and only
+    the bucket a requested ID falls in is read, on first use. Rendered
+    keyword strings are memoized in a bounded LRU.
+    """
+
+    def __init__(self, strongs_dir: str = None, cache_size: int = None):
+        self.strongs_dir = strongs_dir or CONFIG["STRONGS_DIR"]
+        self.bucket_size = CONFIG["STRONGS_BUCKET_SIZE"]
+        self._buckets: Dict[int, Dict[str, Any]] = {}
+        self.get_keywords = lru_cache(maxsize=cache_size or CONFIG["KEYWORD_CACHE_SIZE"])(self._render_keywords)
 
         # Fallback for 1 Chronicles 1 (Names & Genealogy)
         self.fallback = {
@@ -68,82 +74,122 @@ class DictionaryService:
             "H1121": "son (fiai)", "H3205": "begot (nemzé)", "H4428": "king (király)"
         }
 
-    def get_keywords(self, strong_id: str) -> str:
-        # 1. Try loaded DB
-        if strong_id in self.definitions:
-            defs = self.definitions[strong_id]
-            hu = ", ".join(defs.get('hu', [])[:2])
-            en = ", ".join(defs.get('en', [])[:2])
+    def bucket_path(self, number: int) -> str:
+        start = (number - 1) // self.bucket_size * self.bucket_size + 1
+        return os.path.join(self.strongs_dir, f"strongs_h{start}.json")
+
+    def _bucket(self, number: int) -> Dict[str, Any]:
+        index = (number - 1) // self.bucket_size
+        if index not in self._buckets:
+            path = self.bucket_path(number)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._buckets[index] = json.load(f)
+            except FileNotFoundError:
+                self._buckets[index] = {}
+            except Exception as e:
+                print(f"[Dict] Warning: {path}: {e}")
+                self._buckets[index] = {}
+        return self._buckets[index]
+
+    def get_defs(self, strong_id: str) -> Dict[str, Any]:
+        digits = re.search(r'\d+', strong_id)
+        if not digits or int(digits.group()) == 0:
+            return {}
+        entry = self._bucket(int(digits.group())).get(strong_id)
+        return entry.get("defs", {}) if entry else {}
+
+    @staticmethod
+    def _first_defs(value) -> str:
+        # Buckets hold either a list of glosses or one comma separated string
+        if isinstance(value, str):
+            return value.strip()
+        return ", ".join(value[:2])
+
+    def _render_keywords(self, strong_id: str) -> str:
+        # 1. Try the dictionary bucket
+        defs = self.get_defs(strong_id)
+        if defs:
+            hu = self._first_defs(defs.get('hu', []))
+            en = self._first_defs(defs.get('en', []))
             return f"{hu} ({en})"
         
         # 2. Try Fallback
         return self.fallback.get(strong_id, "concept")
 
-dict_service = DictionaryService()
-
 # ==========================================
 # 2. DATA LOADERS
 # ==========================================
 
-def clean_hebrew(text: str) -> str:
-    if not isinstance(text, str): return ""
+# Column Names
+COL_ID = '〔KJVverseID｜book｜chapter｜verse〕'
+COL_WORD = 'BHSA'
+COL_STRONG = 'extendedStrongNumber'
+
+def parse_hebrew_tokens(path: str) -> pd.DataFrame:
+    """
+    Reads the BHS TSV into one row per usable word token: vid ("1ch-1-1"),
+    id (Strong's number) and lemma. Column operations only, no per-row Python.
+    """
+    df = pd.read_csv(path, sep='\t', usecols=[COL_ID, COL_WORD, COL_STRONG],
+                     dtype={COL_ID: str, COL_WORD: str, COL_STRONG: str})
+    df = df.dropna(subset=[COL_ID, COL_STRONG])
+
+    # Parse ID: 〔1｜1｜1｜1〕 -> Book 1, Chap 1, Verse 1
+    parts = df[COL_ID].str.replace('[〔〕]', '', regex=True).str.split('｜', expand=True)
+    if parts.shape[1] < 4:
+        return pd.DataFrame({"vid": [], "id": [], "lemma": []})
+
+    # Map to the canonical ID ("1ch"), same as xml_to_json.py output keys
+    book_ids = pd.to_numeric(parts[1], errors='coerce').map({book.number: book.id for book in bible_books.BOOKS})
+    vid = book_ids + '-' + parts[2].str.strip() + '-' + parts[3].str.strip()
+
     # Remove XML tags <H>...</H>
-    clean = re.sub(r'<[^>]+>', '', text).strip()
-    return clean
+    lemma = df[COL_WORD].str.replace(r'<[^>]+>', '', regex=True).str.strip()
+    sid = df[COL_STRONG].str.strip()
+
+    tokens = pd.DataFrame({"vid": vid, "id": sid, "lemma": lemma})
+    tokens = tokens[tokens["vid"].notna() & (tokens["lemma"].fillna('') != '') & (tokens["id"] != '')]
+    return tokens.astype({"vid": "category", "id": "category"}).reset_index(drop=True)
+
+def load_hebrew_tokens(path: str, cache_path: str = None) -> pd.DataFrame:
+    """parse_hebrew_tokens() behind a pickle cache that is valid while the CSV's size and mtime match."""
+    cache_path = cache_path or path + ".tokens.pkl"
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    if os.path.exists(cache_path):
+        try:
+            cached = pd.read_pickle(cache_path)
+            if cached.get("signature") == signature:
+                print(f"[Loader] Using cached tokens: {cache_path}")
+                return cached["tokens"]
+        except Exception as e:
+            print(f"[Loader] Ignoring unreadable cache {cache_path}: {e}")
+
+    tokens = parse_hebrew_tokens(path)
+    pd.to_pickle({"signature": signature, "tokens": tokens}, cache_path)
+    return tokens
 
-def load_hebrew_csv(path: str) -> Dict[str, List[Dict]]:
+def load_hebrew_csv(path: str, dictionary: DictionaryService) -> Dict[str, List[Dict]]:
     print(f"[Loader] Reading CSV: {path}...")
+    started = time.perf_counter()
     try:
-        df = pd.read_csv(path, sep='\t')
+        tokens = load_hebrew_tokens(path)
     except Exception as e:
         print(f"[Error] CSV Load Failed: {e}")
         return {}
 
-    # Define Column Names
-    COL_ID = '〔KJVverseID｜book｜chapter｜verse〕'
-    COL_WORD = 'BHSA'
-    COL_STRONG = 'extendedStrongNumber'
+    # Definitions are attached after loading (not cached): one lookup per distinct Strong's number
+    ids = tokens["id"].astype(str).to_numpy()
+    lemmas = tokens["lemma"].to_numpy()
+    defs = {sid: dictionary.get_keywords(sid) for sid in tokens["id"].cat.categories}
+    records = [{"id": sid, "lemma": lemma, "def": defs[sid]} for sid, lemma in zip(ids, lemmas)]
 
     grouped = {}
+    for vid, rows in tokens.groupby("vid", sort=False, observed=True).indices.items():
+        grouped[vid] = [records[i] for i in rows]
 
-    for raw_id, group in df.groupby(COL_ID, sort=False):
-        try:
-            # Parse ID: 〔1｜1｜1｜1〕 -> Book 1, Chap 1, Verse 1
-            clean_id = raw_id.replace('〔', '').replace('〕', '')
-            parts = clean_id.split('｜') # Note: Check if your separator is pipe '|' or unicode '｜'
-            
-            # Verify split worked
-            if len(parts) < 4: continue 
-            
-            book_num = int(parts[1])
-            chapter = parts[2]
-            verse = parts[3]
-
-            # Map to "1chron"
-            book_name = BOOK_MAP.get(book_num)
-            if not book_name: continue
-
-            vid = f"{book_name}-{chapter}-{verse}"
-            
-            tokens = []
-            for _, row in group.iterrows():
-                lemma = clean_hebrew(row[COL_WORD])
-                sid = str(row[COL_STRONG]).strip()
-                
-                if lemma and sid and sid != "nan":
-                    tokens.append({
-                        "id": sid,
-                        "lemma": lemma,
-                        "def": dict_service.get_keywords(sid)
-                    })
-            
-            if tokens:
-                grouped[vid] = tokens
-                
-        except Exception:
-            continue
-
-    print(f"[Loader] Parsed {len(grouped)} Hebrew verses.")
+    print(f"[Loader] Parsed {len(grouped)} Hebrew verses in {time.perf_counter() - started:.2f}s.")
     # Debug: Print first key to verify format
     if grouped:
         print(f"[Debug] Sample Hebrew Key: {list(grouped.keys())[0]}")
@@ -168,17 +214,52 @@ def load_hungarian_json(path: str) -> Dict[str, str]:
         return {}
 
 # ==========================================
-# 3. LLM CLIENT (Robust)
+# 3. LLM CLIENT (Async, pooled)
 # ==========================================
 
+# Sent as Ollama's "system" field and identical for every request, so it forms a
+# stable prompt prefix the server evaluates once and then reuses from its KV cache.
+# Everything that varies per batch goes after it, in the prompt.
+SYSTEM_PROMPT = (
+    "You are a precise linguistic alignment engine.\n"
+    "TASK: Insert Strong's Tags (e.g. <H1234>) into the 'text' based on 'vocab'.\n"
+    "RULES:\n"
+    "1. Insert tags immediately after the matching Hungarian word (no space).\n"
+    "2. Do NOT translate or summarize. Keep text exact.\n"
+    "3. Output JSON list: [{\"id\": \"...\", \"tagged_text\": \"...\"}]"
+)
+
 class LLMClient:
-    def __init__(self):
-        self.url = CONFIG["LLM_API_URL"]
+    """
+    One pooled keep-alive connection set to Ollama, at most IN_FLIGHT
+    requests at a time. Ollama only runs them in parallel if the server
+    allows it (OLLAMA_NUM_PARALLEL), otherwise they simply queue there
+    instead of leaving the server idle between batches.
+    """
+
+    def __init__(self, url: str = None, in_flight: int = None):
+        self.url = url or CONFIG["LLM_API_URL"]
         self.model = CONFIG["LLM_MODEL"]
-
-    def process_items(self, items: List[Dict]) -> List[Dict]:
+        self.in_flight = in_flight or CONFIG["IN_FLIGHT"]
+        self.requests = 0
+        self.llm_seconds = 0.0   # summed request durations
+        self.prompt_tokens = 0   # prompt tokens Ollama actually evaluated (cached prefix excluded)
+        self.eval_tokens = 0
+        self._client = None
+        self._slots = None
+
+    async def __aenter__(self):
+        limits = httpx.Limits(max_connections=self.in_flight, max_keepalive_connections=self.in_flight)
+        self._client = httpx.AsyncClient(limits=limits, timeout=CONFIG["LLM_TIMEOUT"])
+        self._slots = asyncio.Semaphore(self.in_flight)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._client.aclose()
+
+    def build_payload(self, items: List[Dict]) -> Dict[str, Any]:
         """
-        Processes a list of items. 
+        Builds the Ollama request for a list of items.
         Note: We pass the whole object but prompt only with necessary fields.
         """
         prompt_data = []
@@ -191,25 +272,29 @@ class LLMClient:
                 "vocab": vocab
             })
 
-        system_prompt = (
-            "You are a precise linguistic alignment engine.\n"
-            "TASK: Insert Strong's Tags (e.g. <H1234>) into the 'text' based on 'vocab'.\n"
-            "RULES:\n"
-            "1. Insert tags immediately after the matching Hungarian word (no space).\n"
-            "2. Do NOT translate or summarize. Keep text exact.\n"
-            "3. Output JSON list: [{\"id\": \"...\", \"tagged_text\": \"...\"}]"
-        )
-
-        payload = {
+        return {
             "model": self.model,
-            "prompt": f"{system_prompt}\n\nDATA:\n{json.dumps(prompt_data, ensure_ascii=False)}",
+            "system": SYSTEM_PROMPT,
+            "prompt": f"DATA:\n{json.dumps(prompt_data, ensure_ascii=False)}",
             "format": "json",
             "stream": False,
-            "temperature": 0.0
+            "keep_alive": CONFIG["KEEP_ALIVE"],
+            "options": {"temperature": 0.0}
         }
 
+    async def process_items(self, items: List[Dict]) -> List[Dict]:
+        payload = self.build_payload(items)
         try:
-            res = requests.post(self.url, json=payload).json()
+            async with self._slots:
+                started = time.perf_counter()
+                try:
+                    response = await self._client.post(self.url, json=payload)
+                finally:
+                    self.requests += 1
+                    self.llm_seconds += time.perf_counter() - started
+            res = response.json()
+            self.prompt_tokens += res.get('prompt_eval_count', 0)
+            self.eval_tokens += res.get('eval_count', 0)
             response_json = json.loads(res['response'])
             
             # Handle variable response structures
@@ -221,24 +306,155 @@ class LLMClient:
             elif isinstance(response_json, list):
                 results = response_json
             
-            # CRITICAL FIX: Re-map IDs if LLM messed them up
-            # If we sent 1 item and got 1 item, force the ID to match
-            if len(items) == 1 and len(results) == 1:
-                results[0]['id'] = items[0]['verse_id']
-
             return results
             
         except Exception as e:
-            print(f"  [LLM Fail] {e}")
+            print(f"  [LLM Fail] {e!r}")
             return [] # Return empty to trigger fallback
 
 # ==========================================
 # 4. PIPELINE ORCHESTRATOR
 # ==========================================
 
-def main():
+def estimate_tokens(item: Dict) -> int:
+    """Rough prompt token count of one verse (~3 characters per token for HU text + vocab)."""
+    chars = len(item['hu_text']) + sum(len(t['def']) + len(t['id']) + 8 for t in item['tokens'])
+    return chars // 3 + 10
+
+class AdaptiveScheduler:
+    """
+    Decides what the next LLM request carries.
+    - Validated verses of a batch are kept, only the failed ones go back.
+    - A failed group is bisected; halves are retried before any new work,
+      a lone verse gets MAX_SINGLE_ATTEMPTS tries before it is given up.
+    - Batch size follows the recent success rate (additive increase,
+      multiplicative decrease) and never exceeds TOKEN_BUDGET prompt tokens.
+    """
+
+    def __init__(self, queue: List[Dict], batch_size: int):
+        self.pending = deque(queue)
+        self.retry: deque = deque()
+        self.size = batch_size
+        self.history: deque = deque(maxlen=CONFIG["ADAPT_WINDOW"])
+        self.attempts: Dict[str, int] = {}
+
+    def has_work(self) -> bool:
+        return bool(self.pending or self.retry)
+
+    def next_batch(self) -> List[Dict]:
+        if self.retry:
+            return self.retry.popleft()
+        batch = [self.pending.popleft()]
+        tokens = estimate_tokens(batch[0])
+        while self.pending and len(batch) < self.size:
+            cost = estimate_tokens(self.pending[0])
+            if tokens + cost > CONFIG["TOKEN_BUDGET"]:
+                break
+            batch.append(self.pending.popleft())
+            tokens += cost
+        return batch
+
+    def report(self, batch: List[Dict], valid_ids: set) -> List[Dict]:
+        """Feeds back a batch outcome; returns the verses that are given up."""
+        failed = [item for item in batch if item['verse_id'] not in valid_ids]
+        self.history.append(1 - len(failed) / len(batch))
+        success = sum(self.history) / len(self.history)
+        if success >= CONFIG["GROW_ABOVE"]:
+            self.size = min(self.size + 1, CONFIG["MAX_BATCH_SIZE"])
+        elif success < CONFIG["SHRINK_BELOW"]:
+            self.size = max(1, self.size // 2)
+
+        if not failed:
+            return []
+        if len(failed) > 1:
+            mid = len(failed) // 2
+            self.retry.appendleft(failed[mid:])
+            self.retry.appendleft(failed[:mid])
+            return []
+        item = failed[0]
+        self.attempts[item['verse_id']] = self.attempts.get(item['verse_id'], 0) + 1
+        if self.attempts[item['verse_id']] >= CONFIG["MAX_SINGLE_ATTEMPTS"]:
+            return [item]
+        self.retry.appendleft([item])
+        return []
+
+def validate_results(batch: List[Dict], results: List[Dict]) -> Dict[str, Dict]:
+    """Results whose ID belongs to the batch and that carry a tagged text, by verse ID."""
+    batch_ids = {item['verse_id'] for item in batch}
+    if len(batch) == 1 and len(results) == 1:
+        # Force ID correctness in single mode
+        results[0]['id'] = batch[0]['verse_id']
+    valid = {}
+    for res in results:
+        rid = res.get('id')
+        if rid and rid != "null" and rid in batch_ids and res.get('tagged_text'):
+            valid[rid] = res
+    return valid
+
+async def run_pipeline(queue: List[Dict], llm: LLMClient, batch_size: int, on_results) -> AdaptiveScheduler:
+    """
+    IN_FLIGHT workers take batches from the AdaptiveScheduler. Results are
+    handed to on_results strictly in queue order. Backpressure: no new
+    verse is started while the oldest unfinished one is more than
+    REORDER_WINDOW verses behind, so the reorder buffer stays bounded.
+    """
+    scheduler = AdaptiveScheduler(queue, batch_size)
+    position = {item['verse_id']: i for i, item in enumerate(queue)}
+    finished: Dict[int, Dict] = {}
+    next_idx = 0
+    busy = 0
+    changed = asyncio.Condition()
+
+    def emit():
+        nonlocal next_idx
+        ready = []
+        while next_idx in finished:
+            ready.append(finished.pop(next_idx))
+            next_idx += 1
+        if ready:
+            on_results(ready)
+
+    def can_start() -> bool:
+        if scheduler.retry:
+            return True
+        return bool(scheduler.pending) and \
+            position[scheduler.pending[0]['verse_id']] - next_idx < CONFIG["REORDER_WINDOW"]
+
+    async def worker():
+        nonlocal busy
+        while True:
+            async with changed:
+                await changed.wait_for(lambda: can_start() or (busy == 0 and not scheduler.has_work()))
+                if not scheduler.has_work():
+                    changed.notify_all()
+                    return
+                batch = scheduler.next_batch()
+                busy += 1
+
+            valid = validate_results(batch, await llm.process_items(batch))
+
+            async with changed:
+                busy -= 1
+                given_up = scheduler.report(batch, set(valid))
+                if given_up or len(valid) < len(batch):
+                    print(f"\n[Adaptive] {len(valid)}/{len(batch)} valid, batch size now {scheduler.size}")
+                for item in batch:
+                    if item['verse_id'] in valid:
+                        finished[position[item['verse_id']]] = valid[item['verse_id']]
+                for item in given_up:
+                    # Final fail: Save original text un-tagged
+                    print(f"  -> Failed {item['verse_id']}")
+                    finished[position[item['verse_id']]] = {"id": item['verse_id'], "tagged_text": item['hu_text']}
+                emit()
+                changed.notify_all()
+
+    await asyncio.gather(*(worker() for _ in range(llm.in_flight)))
+    return scheduler
+
+def main(args):
     # 1. Load
-    hebrew_db = load_hebrew_csv(CONFIG["INPUT_CSV"])
+    os.makedirs(CONFIG["OUTPUT_DIR"], exist_ok=True)
+    hebrew_db = load_hebrew_csv(CONFIG["INPUT_CSV"], DictionaryService())
     hungarian_db = load_hungarian_json(CONFIG["INPUT_JSON_HU"])
 
     # 2. Match
@@ -253,59 +469,23 @@ def main():
     
     if not queue:
         print("\n[CRITICAL] No IDs matched! Check the [Debug] keys printed above.")
-        print("Expected match format: '1chron-1-1'")
+        print("Expected match format: '1ch-1-1'")
         return
 
     print(f"\n[Pipeline] Starting processing for {len(queue)} verses...")
 
     # 3. Execute
-    llm = LLMClient()
     buffer = []
     chunk_idx = 0
+    processed = 0
+    started = time.perf_counter()
 
-    # Iterate
-    i = 0
-    while i < len(queue):
-        # Determine current batch
-        batch = queue[i : i + CONFIG["BATCH_SIZE"]]
-        
-        # Try processing batch
-        results = llm.process_items(batch)
-        
-        # Validation
-        valid_batch_results = []
-        
-        # Map inputs by ID for quick verification
-        batch_map = {item['verse_id']: item for item in batch}
-        
-        for res in results:
-            rid = res.get('id')
-            rtxt = res.get('tagged_text')
-            
-            # If ID is valid and exists in our batch
-            if rid and rid != "null" and rid in batch_map and rtxt:
-                valid_batch_results.append(res)
-        
-        # Success check
-        if len(valid_batch_results) == len(batch):
-            buffer.extend(valid_batch_results)
-            i += len(batch)
-            print(f"Processed {i}/{len(queue)} verses...", end='\r')
-        else:
-            # Fallback: Process 1-by-1 if batch failed or had mismatches
-            print(f"\n[Fallback] Batch failed at index {i}. Switching to single mode...")
-            for item in batch:
-                single_res = llm.process_items([item])
-                if single_res and single_res[0].get('tagged_text'):
-                    # Force ID correctness in single mode
-                    single_res[0]['id'] = item['verse_id']
-                    buffer.extend(single_res)
-                    print(f"  -> Recovered {item['verse_id']}")
-                else:
-                    # Final fail: Save original text un-tagged
-                    print(f"  -> Failed {item['verse_id']}")
-                    buffer.append({"id": item['verse_id'], "tagged_text": item['hu_text']})
-            i += len(batch)
+    def on_results(results: List[Dict]):
+        nonlocal buffer, chunk_idx, processed
+        buffer.extend(results)
+        processed += len(results)
+        rate = processed / (time.perf_counter() - started)
+        print(f"Processed {processed}/{len(queue)} verses ({rate:.2f} verses/s)...", end='\r')
 
         # Save Chunk
         if len(buffer) >= CONFIG["CHUNK_SIZE"]:
@@ -313,11 +493,24 @@ def main():
             buffer = []
             chunk_idx += 1
 
+    async def run():
+        async with LLMClient(args.api_url, args.in_flight) as llm:
+            await run_pipeline(queue, llm, args.batch_size, on_results)
+            return llm
+
+    llm = asyncio.run(run())
+
     # Final save
     if buffer:
         save_buffer(buffer, chunk_idx)
 
-    print("\n[Pipeline] Job Complete.")
+    elapsed = time.perf_counter() - started
+    print(f"\n[Pipeline] Job Complete: {processed} verses in {elapsed:.1f}s "
+          f"({processed / elapsed:.2f} verses/s, {llm.requests} LLM requests, "
+          f"{processed / max(llm.llm_seconds, 1e-9):.2f} verses per LLM second).")
+    if processed:
+        print(f"[Pipeline] Prompt eval: {llm.prompt_tokens} tokens ({llm.prompt_tokens / processed:.0f} per verse), "
+              f"output: {llm.eval_tokens} tokens ({llm.eval_tokens / processed:.0f} per verse).")
 
 def save_buffer(data, idx):
     path = os.path.join(CONFIG["OUTPUT_DIR"], f"chunk_{idx}.json")
@@ -332,5 +525,67 @@ def save_buffer(data, idx):
         json.dump(output, f, ensure_ascii=False, indent=2)
     print(f"  -> Saved {path}")
 
+# ==========================================
+# 5. FAKE OLLAMA (local testing)
+# ==========================================
+
+class _FakeOllamaHandler(BaseHTTPRequestHandler):
+    """
+    Answers /api/generate like Ollama: tags the first word of every verse, after a delay.
+    Token counts are estimated at ~4 characters per token; like a warm Ollama, a
+    system prompt already seen is reported as cached and not counted again.
+    """
+    latency = 0.5
+    seen_systems = set()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        items = json.loads(payload["prompt"].split("DATA:\n", 1)[1])
+        time.sleep(self.latency * (1 + 0.2 * len(items)))
+        results = []
+        for item in items:
+            first_id = re.search(r"<(H\d+)>", item["vocab"])
+            words = item["text"].split(" ", 1)
+            tag = f"<{first_id.group(1)}>" if first_id else ""
+            results.append({"id": item["id"], "tagged_text": " ".join([words[0] + tag] + words[1:])})
+        response = json.dumps(results, ensure_ascii=False)
+        prompt_chars = len(payload["prompt"])
+        if payload.get("system") not in self.seen_systems:
+            self.seen_systems.add(payload.get("system"))
+            prompt_chars += len(payload.get("system") or "")
+        body = json.dumps({"model": payload["model"], "response": response, "done": True,
+                           "prompt_eval_count": prompt_chars // 4,
+                           "eval_count": len(response) // 4}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def run_fake_ollama(port: int, latency: float):
+    _FakeOllamaHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", port), _FakeOllamaHandler)
+    print(f"Fake Ollama listening on http://127.0.0.1:{port}/api/generate ({latency}s per request)")
+    server.serve_forever()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tag Hungarian verses with Strong's numbers via Ollama")
+    parser.add_argument("--api-url", default=CONFIG["LLM_API_URL"], help="Ollama /api/generate endpoint")
+    parser.add_argument("--in-flight", type=int, default=CONFIG["IN_FLIGHT"],
+                        help="Concurrent LLM requests (match OLLAMA_NUM_PARALLEL on the server)")
+    parser.add_argument("--batch-size", type=int, default=CONFIG["BATCH_SIZE"],
+                        help="Starting verses per LLM request (adapted to the success rate)")
+    parser.add_argument("--fake-ollama", type=int, metavar="PORT",
+                        help="Run a fake Ollama endpoint on PORT for local testing, then point --api-url at it")
+    parser.add_argument("--fake-latency", type=float, default=0.5, help="Fake Ollama: seconds per request")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    if args.fake_ollama:
+        run_fake_ollama(args.fake_ollama, args.fake_latency)
+    else:
+        main(args)
\ No newline at end of file
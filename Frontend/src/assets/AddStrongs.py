@@ -1,13 +1,25 @@
 import os
+import argparse
+import gzip
 import json
 import re
 import requests
 import gc
 import sys
+import threading
 import unicodedata
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, Optional, List, Dict
 
+from strongs_align import (Alignment, PreAligner, StrongsLexicon, number_tokens, parse_tag_pairs,
+                           splice_tags, tagged_to_pairs, tokenize)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # --- KONFIGURÁCIÓ ---
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -19,10 +31,18 @@ STRONGS_DIR = os.path.join(SCRIPT_DIR, "strongs")
 # Kimeneti fájlok
 OUTPUT_FILE = os.path.join(SCRIPT_DIR, "hu_karoli_strongs.json")
 FAILED_FILE = os.path.join(SCRIPT_DIR, "failed_verses.json")
+# Versenkénti napló: ebből folytatódik egy megszakadt futás, és ebből áll össze a két fájl fent
+JOURNAL_FILE = os.path.join(SCRIPT_DIR, "hu_karoli_strongs.journal.jsonl")
+# Kompakt módban a bejegyzésekből kiemelt verziónév ide kerül
+OUTPUT_META_FILE = os.path.join(SCRIPT_DIR, "hu_karoli_strongs.meta.json")
+
+VERSION_NAME = "Karoli Strongs"
 
 # Modell - Qwen 2.5 7B Instruct (GTX 1080 Ti-re optimalizálva)
 OLLAMA_MODEL = "qwen2.5:7b-instruct" 
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA_URL = "http://localhost:11434/api/chat"
+# A modell (és a rendszerüzenet KV-cache-e) ennyi ideig marad betöltve két kérés között
+KEEP_ALIVE = "30m"
 
 # Hányszor próbálja újra, ha elrontja a szöveget?
 MAX_RETRIES = 5
@@ -30,17 +50,189 @@ MAX_RETRIES = 5
 # Request timeout (másodpercben)
 REQUEST_TIMEOUT = 180
 
+# Előillesztő: a vers Strong-kódjainak legalább ekkora hányadát kell szótárból
+# elhelyeznie (a tulajdonneveket mindet), és az egyezések átlagos pontszáma
+# (az el nem helyezett kód 0) is el kell érje a küszöböt, különben a vers az LLM-hez megy.
+# Alapból minden kódot: a részben illesztett vers kódjai elvesznének a kimenetből.
+# Kisebb --prealign-coverage mellett a kimaradt kódok csak a naplóba kerülnek ("untagged").
+PREALIGN_MIN_COVERAGE = 1.0
+PREALIGN_MIN_CONFIDENCE = 0.8
+# Csak a naplóban tárolt mezők, a kimeneti JSON-ba nem kerülnek
+JOURNAL_ONLY_KEYS = ("failure", "untagged")
+
+# Tag-only módban a modell csak "sorszám=kód" párokat ír, nem az egész verset
+NUM_PREDICT = 1024
+TAG_ONLY_NUM_PREDICT = 256
+# A vers különböző Strong-kódjainak legalább ekkora hányadát el kell helyeznie a válasznak,
+# különben újrapróbálás, végül hibalista (--retry-failed). Nem 1.0: pl. a H853 gyakran szó nélküli.
+TAG_ONLY_MIN_COVERAGE = 0.8
+
+# Egyszerre futó fejezetek (Ollama oldalon OLLAMA_NUM_PARALLEL legyen legalább ennyi)
+PARALLEL = 1
+
+def precompress_file(path: str):
+    """.gz (és ha a brotli elérhető, .br) testvérfájl a statikus kiszolgáláshoz."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path + ".gz", 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+    else:
+        print("  ⚠ A 'brotli' csomag nincs telepítve, csak .gz készült.")
+
+# Qwen szereti a '###' szeparátorokat és a világos utasításokat.
+# A rendszerüzenet minden versnél betűre azonos: ezt az Ollama könyvenként egyszer értékeli ki.
+SYSTEM_PROMPT = """### UTASÍTÁS
+A feladatod Strong-számok (pl. {H1234}) beillesztése egy meglévő magyar bibliai versbe, az angol eredeti alapján.
+
+### SZABÁLYOK
+1. A magyar szöveg minden szavát, írásjelét és sorrendjét TARTSD MEG pontosan úgy, ahogy van. Szigorúan TILOS átírni vagy fordítani!
+2. A Strong kódokat közvetlenül a vonatkozó magyar szó után illeszd be kapcsos zárójelben. Pl: Az Úr{H3068}
+3. Használd a megadott szótárat a párosításhoz. Nem minden szóhoz tartozik kód."""
+
+TAG_ONLY_SYSTEM_PROMPT = """### UTASÍTÁS
+A feladatod Strong-számok (pl. H1234) hozzárendelése egy magyar bibliai vers szavaihoz, az angol eredeti alapján.
+
+### SZABÁLYOK
+1. A magyar szöveget NE írd vissza! Csak a szavak sorszámát és a hozzájuk tartozó Strong kódot add meg.
+2. Formátum: sorszám=kód párok vesszővel elválasztva, egy sorban. Pl: 1=H5146, 3=H2526
+3. Csak a megadott szótár kódjait használd. Nem minden szóhoz tartozik kód."""
+
+class TaggingJournal:
+    """
+    Append-only napló, versenként egy JSON sor: {book, chapter, verse, text}
+    és sikertelen versnél a hibajegyzet ("failure"). Minden sor azonnal
+    kiíródik; újraindításkor a már naplózott versek kimaradnak. Ugyanannak
+    a versnek a későbbi sora (--retry-failed) felülírja a korábbit, a
+    megszakadt utolsó sort betöltéskor eldobjuk.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[Tuple[str, str, int], Dict] = {}
+        self._torn = False
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self._torn = not line.endswith('\n')
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.entries[self.key(entry)] = entry
+        self._file = None
+
+    @staticmethod
+    def key(entry: Dict) -> Tuple[str, str, int]:
+        return entry["book"], str(entry["chapter"]), int(entry["verse"])
+
+    def add(self, entry: Dict):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+                if self._torn:
+                    self._file.write('\n')
+                    self._torn = False
+            self.entries[self.key(entry)] = entry
+            self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def failed_keys(self) -> set:
+        return {key for key, entry in self.entries.items() if "failure" in entry}
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class BookMemory:
+    """
+    Egy könyv few-shot példái: a könyv első 3 sikeres LLM verse, utána
+    rögzítve (a prompt előtagja ne változzon versről versre). A könyv első
+    fejezete tölti fel; a többi fejezet megvárja, amíg betelik vagy az első
+    fejezet véget ér, így a promptok nem függnek attól, melyik munkaszál
+    mikor fut, és ugyanazok, mint soros futásnál.
+    """
+
+    def __init__(self, maxlen: int = 3):
+        self.examples = deque(maxlen=maxlen)
+        self.settled = threading.Event()
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self.examples))
+
+    def add(self, kjv_text: str, tagged_text: str):
+        with self._lock:
+            if self.settled.is_set():
+                return
+            self.examples.append((kjv_text, tagged_text))
+            if len(self.examples) == self.examples.maxlen:
+                self.settled.set()
+
+    def clear(self):
+        """Hiba után töröljük a még be nem telt példákat, ne zavarják a következőt."""
+        with self._lock:
+            if not self.settled.is_set():
+                self.examples.clear()
+
+    def settle(self):
+        self.settled.set()
+
 class BibleTagger:
-    def __init__(self):
+    def __init__(self, compact: bool = False, precompress: bool = False,
+                 prealign: bool = True, prealign_min_coverage: float = PREALIGN_MIN_COVERAGE,
+                 prealign_min_confidence: float = PREALIGN_MIN_CONFIDENCE,
+                 tag_only: bool = False, tag_only_min_coverage: float = TAG_ONLY_MIN_COVERAGE,
+                 parallel: int = PARALLEL, retry_failed: bool = False):
+        self.compact = compact
+        self.precompress = precompress
+        self.tag_only = tag_only
+        self.tag_only_min_coverage = tag_only_min_coverage
+        self.parallel = max(1, parallel)
+        self.retry_failed = retry_failed
+        self.journal = TaggingJournal(JOURNAL_FILE)
+        # --retry-failed: csak ezek a versek futnak újra, minden más marad a naplóból
+        self.retry_keys: Optional[set] = None
         self.hebrew_defs = {}
         self.greek_defs = {}
         self.load_dictionaries()
-        self.memory = deque(maxlen=3)
-        
-        self.first_failure = True
-        # Ha a fájl nem létezik vagy üres, kezdjük tömbbel, egyébként feltételezzük a folytatást (most resetelünk)
-        with open(FAILED_FILE, 'w', encoding='utf-8') as f:
-            f.write('[\n')
+        self.lexicon = StrongsLexicon(self.hebrew_defs, self.greek_defs)
+        self.aligner = (PreAligner(self.lexicon, prealign_min_coverage, prealign_min_confidence)
+                        if prealign else None)
+        # Könyvenkénti példamemória (lásd BookMemory); a munkaszál csak az aktuális könyvét tartja
+        self.memories: Dict[str, BookMemory] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Megszakításkor a munkások a következő vers előtt kilépnek
+        self.stop = threading.Event()
+        # Tagelendő versek: hányat oldott meg az előillesztő, hány ment az LLM-hez, hány Ollama hívással,
+        # hány ténylegesen kiértékelt prompt tokennel (a cache-ből jövő előtag nélkül) és hány generált tokennel
+        self.stats = {"prealigned": 0, "llm_verses": 0, "ollama_calls": 0, "prompt_tokens": 0, "eval_tokens": 0}
+        self.book_stats: Dict[str, Dict[str, int]] = {}
+        self.started_books = set()
+        self.total_books = 0
+
+    @property
+    def memory(self) -> BookMemory:
+        """Az aktuális szál könyvének few-shot példái."""
+        return self.book_memory(getattr(self._local, "book", None))
+
+    def book_memory(self, book: Optional[str]) -> BookMemory:
+        with self._lock:
+            return self.memories.setdefault(book, BookMemory())
+
+    def count(self, key: str, amount: int = 1):
+        """Statisztika növelése, összesen és az aktuális szál könyvére."""
+        with self._lock:
+            self.stats[key] += amount
+            book = getattr(self._local, "book", None)
+            if book is not None:
+                self.book_stats.setdefault(book, dict.fromkeys(self.stats, 0))[key] += amount
 
     def load_dictionaries(self):
         """Szótárak betöltése a Strong számokhoz."""
@@ -66,15 +258,13 @@ class BibleTagger:
 
     def get_def_compact(self, strong_id: str) -> str:
         """ULTRA-KOMPAKT definíció."""
-        entry = None
-        if strong_id.startswith('H'):
-            entry = self.hebrew_defs.get(strong_id)
-        elif strong_id.startswith('G'):
-            entry = self.greek_defs.get(strong_id)
+        # A lexikon a "H0122a" változatokat és a "sw-..." kulcsú görög bejegyzéseket is megtalálja
+        entry = self.lexicon.entry(strong_id)
         
-        if entry and 'defs' in entry:
+        if entry:
+            defs = StrongsLexicon.definitions(entry)
             # Magyar
-            hu_def = entry['defs'].get('hu', '').replace('\n', ' ').strip()
+            hu_def = defs.get('hu', '').replace('\n', ' ').strip()
             hu_def = re.sub(r'[;,].*', '', hu_def) # Első elválasztóig
             
             if hu_def:
@@ -82,7 +272,7 @@ class BibleTagger:
                 return " ".join(words[:4]) 
             
             # Angol fallback
-            en_def = entry['defs'].get('en', '').replace('\n', ' ').strip()
+            en_def = defs.get('en', '').replace('\n', ' ').strip()
             if en_def:
                 words = en_def.split()
                 return " ".join(words[:3])
@@ -99,49 +289,57 @@ class BibleTagger:
             result.append((word, sid, compact_def))
         return result
 
-    def generate_base_prompt(self, kjv_text: str, karoli_text: str) -> str:
-        """Prompt generálása Qwen 2.5 stílusban."""
+    def mapping_text(self, kjv_text: str) -> str:
+        """A prompt szótára: angol szó -> kód (rövid jelentés)."""
         strong_data = self.extract_strongs_data(kjv_text)
         
         mapping_parts = []
         for word, sid, compact_def in strong_data:
             mapping_parts.append(f"{word} -> {sid} ({compact_def})")
         
-        mapping_text = "\n".join(mapping_parts) if mapping_parts else "Nincs Strong hivatkozás."
-
-        examples_text = ""
-        if len(self.memory) > 0:
-            examples_text = "\n### PÉLDÁK (Így csináld):\n"
-            for m_eng, m_hun in list(self.memory)[-3:]:
-                examples_text += f"BEMENET (Angol): {m_eng}\nKIMENET (Magyar): {m_hun}\n---\n"
-
-        # Qwen szereti a '###' szeparátorokat és a világos utasításokat
-        prompt = f"""### UTASÍTÁS
-A feladatod Strong-számok (pl. {{H1234}}) beillesztése egy meglévő magyar bibliai versbe, az angol eredeti alapján.
-
-### SZABÁLYOK
-1. A magyar szöveg minden szavát, írásjelét és sorrendjét TARTSD MEG pontosan úgy, ahogy van. Szigorúan TILOS átírni vagy fordítani!
-2. A Strong kódokat közvetlenül a vonatkozó magyar szó után illeszd be kapcsos zárójelben. Pl: Az Úr{{H3068}}
-3. Használd a lenti szótárat a párosításhoz. Nem minden szóhoz tartozik kód.
+        return "\n".join(mapping_parts) if mapping_parts else "Nincs Strong hivatkozás."
+
+    def task_message(self, kjv_text: str, karoli_text: str) -> str:
+        """A versenként változó rész: szótár és feladat. Minden más a rendszerüzenetben / példákban van."""
+        if self.tag_only:
+            task = f"Angol forrás: {kjv_text}\nMagyar szavak: {number_tokens(tokenize(karoli_text))}"
+            answer = "### VÁLASZ (sorszám=kód párok):"
+        else:
+            task = f"Angol forrás: {kjv_text}\nMagyar szöveg: {karoli_text}"
+            answer = "### VÁLASZ (A teljes magyar vers Strong kódokkal):"
+        return f"""### SZÓTÁR (Angol szó -> Kód (Jelentés))
+{self.mapping_text(kjv_text)}
 
-### SZÓTÁR (Angol szó -> Kód (Jelentés))
-{mapping_text}
-{examples_text}
 ### FELADAT
-Angol forrás: {kjv_text}
-Magyar szöveg: {karoli_text}
-
-### VÁLASZ (A teljes magyar vers Strong kódokkal):"""
-        
-        return prompt
-
-    def call_ollama(self, prompt: str) -> Optional[str]:
-        """Ollama API hívás (GTX 1080 Ti optimalizált)."""
+{task}
+
+{answer}"""
+
+    def build_messages(self, kjv_text: str, karoli_text: str) -> List[Dict[str, str]]:
+        """
+        Chat üzenetek, a legstabilabb résszel elöl: rendszerüzenet (módonként
+        állandó), a könyv rögzített példái (felhasználó/asszisztens párok), végül
+        az aktuális vers. Így az Ollama a közös előtagot a KV-cache-ből veszi, és
+        csak a vers saját részét kell kiértékelnie.
+        """
+        messages = [{"role": "system", "content": TAG_ONLY_SYSTEM_PROMPT if self.tag_only else SYSTEM_PROMPT}]
+        for m_eng, m_hun in self.memory:
+            clean, pairs = tagged_to_pairs(m_hun)
+            messages.append({"role": "user", "content": self.task_message(m_eng, clean)})
+            answer = ", ".join(f"{number}={sid}" for number, sid in pairs) if self.tag_only else m_hun
+            messages.append({"role": "assistant", "content": answer})
+        messages.append({"role": "user", "content": self.task_message(kjv_text, karoli_text)})
+        return messages
+
+    def call_ollama(self, messages: List[Dict[str, str]], num_predict: int = NUM_PREDICT) -> Optional[str]:
+        """Ollama chat API hívás (GTX 1080 Ti optimalizált)."""
+        self.count("ollama_calls")
         try:
             payload = {
                 "model": OLLAMA_MODEL,
-                "prompt": prompt,
+                "messages": messages,
                 "stream": False,
+                "keep_alive": KEEP_ALIVE,
                 "options": {
                     # HARDVER OPTIMALIZÁLÁS
                     "num_gpu_layers": -1,  # Mindent a VRAM-ba (kritikus!)
@@ -149,7 +347,7 @@ Magyar szöveg: {karoli_text}
                     "num_ctx": 4096,       # Elég a versekhez, marad hely a VRAM-ban
                     
                     # GENERÁLÁSI PARAMÉTEREK
-                    "num_predict": 1024,
+                    "num_predict": num_predict,
                     "temperature": 0.1,    # Alacsony hőmérséklet a pontosságért
                     "top_p": 0.9,
                     "repeat_penalty": 1.1,
@@ -164,7 +362,11 @@ Magyar szöveg: {karoli_text}
             )
             
             if resp.status_code == 200:
-                response_text = resp.json().get('response', '').strip()
+                data = resp.json()
+                # Cache találatnál az Ollama csak az újonnan kiértékelt prompt tokeneket számolja
+                self.count("prompt_tokens", data.get('prompt_eval_count', 0))
+                self.count("eval_tokens", data.get('eval_count', 0))
+                response_text = data.get('message', {}).get('content', '').strip()
                 # Qwen néha "Here is the text:" bevezetővel kezd, ezt vágjuk le
                 response_text = re.sub(r'^(Itt van.*?|Válasz:|Kimenet:)\s*', '', response_text, flags=re.IGNORECASE)
                 return response_text.strip() if response_text else None
@@ -181,8 +383,9 @@ Magyar szöveg: {karoli_text}
         if not tagged_text:
             return False, "Üres válasz."
 
-        # Eltávolítjuk a Strong tageket a válaszból (rugalmasan kezelve a szóközöket a {} körül)
-        clean_tagged = re.sub(r'\s*\{\s*([HG]\d+)\s*\}\s*', '', tagged_text)
+        # Eltávolítjuk a Strong tageket a válaszból (rugalmasan kezelve a szóközöket a {} körül).
+        # A tag utáni szóköz marad: "Mésekh{H4902} és" -> "Mésekh és", nem "Mésekhés"
+        clean_tagged = re.sub(r'\s*\{\s*([HG]\d+)\s*\}', '', tagged_text)
         # Dupla szóközök normalizálása
         clean_tagged = re.sub(r'\s+', ' ', clean_tagged).strip()
         
@@ -208,32 +411,41 @@ Magyar szöveg: {karoli_text}
             f"A szöveg nem egyezik az eredetivel a tagek nélkül."
         )
 
-    def log_failure(self, book: str, chapter: str, verse: int, original: str, generated: str, error_msg: str):
-        """Hiba logolása."""
-        entry = {
+    def failure_record(self, book: str, chapter: str, verse: int, original: str, generated: str, error_msg: str) -> Dict:
+        """Hibajegyzet a naplóba; a finalize ebből írja a failed_verses.json-t."""
+        return {
             "location": f"{book} {chapter}:{verse}",
             "original_karoli": original,
             "generated_attempt": generated,
             "error": error_msg
         }
-        
+
+    def load_retry_keys(self) -> set:
+        """A hibalistán szereplő versek: a napló hibás sorai és a failed_verses.json bejegyzései."""
+        keys = self.journal.failed_keys()
         try:
-            with open(FAILED_FILE, 'a', encoding='utf-8') as f:
-                if not self.first_failure:
-                    f.write(',\n')
-                else:
-                    self.first_failure = False
-                json.dump(entry, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"\n[LOGGER HIBA] {e}")
+            with open(FAILED_FILE, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except FileNotFoundError:
+            content = ""
+        # Egy régi, megszakadt futás félbe maradt tömbjét is olvassuk: csak a location mezők kellenek
+        for location in re.findall(r'"location":\s*"([^"]+)"', content):
+            m = re.match(r'(\S+) (\S+):(\d+)$', location)
+            if m:
+                keys.add((m.group(1), m.group(2), int(m.group(3))))
+        return keys
+
+    def should_process(self, key: Tuple[str, str, int]) -> bool:
+        if self.retry_keys is not None:
+            return key in self.retry_keys
+        return key not in self.journal.entries
 
     def process_verse_with_retry(self, kjv_text: str, karoli_text: str, verse_id: str) -> str:
-        base_prompt = self.generate_base_prompt(kjv_text, karoli_text)
-        current_prompt = base_prompt
+        messages = self.build_messages(kjv_text, karoli_text)
         last_output = None
         
         for attempt in range(1, MAX_RETRIES + 1):
-            raw_output = self.call_ollama(current_prompt)
+            raw_output = self.call_ollama(messages)
             
             if raw_output is None:
                 print(f" [API_ERROR {attempt}]", end=""); sys.stdout.flush()
@@ -248,142 +460,392 @@ Magyar szöveg: {karoli_text}
             else:
                 print(f" ✗{attempt}", end="")
                 sys.stdout.flush()
-                # Qwen-nek udvariasan de határozottan szólunk
-                current_prompt = base_prompt + f"\n\n### HIBA JELENTÉS\nAz előző válaszodban megváltoztattad az eredeti magyar szöveget: {error_msg}\n\n### ÚJ PRÓBÁLKOZÁS\nKérlek, add vissza a magyar szöveget SZÓ SZERINT, csak a {{Strong}} kódokat illeszd be!"
+                # Qwen-nek udvariasan de határozottan szólunk. A hibajelentés a beszélgetés
+                # folytatása, az eddigi üzenetek (és a cache-elt előtag) változatlanok maradnak
+                messages = messages + [
+                    {"role": "assistant", "content": raw_output},
+                    {"role": "user", "content": f"### HIBA JELENTÉS\nAz előző válaszodban megváltoztattad az eredeti magyar szöveget: {error_msg}\n\n### ÚJ PRÓBÁLKOZÁS\nKérlek, add vissza a magyar szöveget SZÓ SZERINT, csak a {{Strong}} kódokat illeszd be!"},
+                ]
         
         print(" [MANUAL]", end="")
         if last_output: return f"!!!MANUAL_CHECK!!! {last_output}"
         else: return f"!!!MANUAL_CHECK!!! {karoli_text}"
 
-    def process_chapter(self, kjv_path: str, karoli_path: str, book_name: str, chapter_name: str) -> List[Dict]:
-        """Fejezet feldolgozása."""
+    def process_verse_tag_only(self, kjv_text: str, karoli_text: str, verse_id: str) -> str:
+        """
+        A modell csak (szó sorszáma, Strong-kód) párokat ad, a tagek helyben
+        kerülnek az eredeti szöveg szavaira: integritási hiba nem lehetséges.
+        Újrapróbálás értelmezhetetlen válasznál, és ha a vers kódjainak túl kis
+        hányadát helyezte el (tag_only_min_coverage).
+        """
+        tokens = tokenize(karoli_text)
+        allowed_ids = {sid for _, sid, _ in self.extract_strongs_data(kjv_text)}
+        messages = self.build_messages(kjv_text, karoli_text)
+        last_output = None
+
+        for attempt in range(1, MAX_RETRIES + 1):
+            raw_output = self.call_ollama(messages, num_predict=TAG_ONLY_NUM_PREDICT)
+
+            if raw_output is None:
+                print(f" [API_ERROR {attempt}]", end=""); sys.stdout.flush()
+                continue
+
+            last_output = raw_output
+            placements = parse_tag_pairs(raw_output, len(tokens), allowed_ids)
+            placed = {sid for sids in placements.values() for sid in sids}
+            if placements and len(placed) >= self.tag_only_min_coverage * len(allowed_ids):
+                print(" ✓", end="")
+                return splice_tags(karoli_text, tokens, placements)
+
+            print(f" ✗{attempt}", end="")
+            sys.stdout.flush()
+            if placements:
+                missing = ", ".join(sorted(allowed_ids - placed))
+                error_msg = f"Az előző válaszodból hiányoznak a szótár kódjai: {missing}."
+            else:
+                error_msg = "Az előző válaszodban nem volt érvényes sorszám=kód pár."
+            messages = messages + [
+                {"role": "assistant", "content": raw_output},
+                {"role": "user", "content": f"### HIBA JELENTÉS\n{error_msg}\n\n### ÚJ PRÓBÁLKOZÁS\nA szótár minden kódját helyezd el, csak sorszám=kód párokat írj, pl: 1=H5146, 3=H2526"},
+            ]
+
+        print(" [MANUAL]", end="")
+        return f"!!!MANUAL_CHECK!!! {last_output or karoli_text}"
+
+    def prealign_verse(self, kjv_text: str, karoli_text: str) -> Optional[Alignment]:
+        """Szótáras illesztés az LLM előtt; None, ha nem elég magabiztos."""
+        if self.aligner is None:
+            return None
+        alignment = self.aligner.align(kjv_text, karoli_text)
+        if alignment is None:
+            return None
+        # Szerkezetileg nem változtat a szövegen, de ugyanazon a kapun menjen át, mint az LLM
+        is_valid, _ = self.check_integrity(karoli_text, alignment.text)
+        return alignment if is_valid else None
+
+    def process_chapter(self, kjv_path: str, karoli_path: str, book_name: str, chapter_name: str):
+        """Fejezet feldolgozása; minden vers a naplóba kerül, a kimenetet a finalize állítja össze."""
         try:
             with open(kjv_path, 'r', encoding='utf-8') as f: kjv_data = json.load(f)
             with open(karoli_path, 'r', encoding='utf-8') as f: karoli_data = json.load(f)
         except Exception as e:
             print(f"\n  ⚠ Fájl hiba: {e}")
-            return []
+            return
 
         kjv_map = {str(item['v']): item['text'] for item in kjv_data if 'v' in item and 'text' in item}
         karoli_map = {str(item['v']): item['text'] for item in karoli_data if 'v' in item and 'text' in item}
 
-        chapter_results = []
         sorted_verses = sorted(kjv_map.keys(), key=lambda x: int(x))
+        # A promptok (build_messages) és a statisztika ezen a szálon ennek a könyvnek szólnak
+        self._local.book = book_name
+        memory = self.memory
 
         for v_num in sorted_verses:
+            if self.stop.is_set():
+                return
             kjv_text = kjv_map.get(v_num)
             karoli_text = karoli_map.get(v_num)
 
             if not kjv_text or not karoli_text: continue
+            # Már a naplóban van (korábbi futás), vagy --retry-failed módban nincs a hibalistán
+            if not self.should_process((book_name, chapter_name, int(v_num))): continue
             
             final_text = karoli_text
+            failure = None
+            untagged = ()
 
             if "{" in kjv_text and "}" in kjv_text:
                 print(f"\r  {book_name}/{chapter_name}:{v_num}", end="")
                 sys.stdout.flush()
                 
-                final_text = self.process_verse_with_retry(kjv_text, karoli_text, f"{book_name}:{v_num}")
-                
-                if "!!!MANUAL_CHECK!!!" not in final_text:
-                    self.memory.append((kjv_text, final_text))
+                prealigned = self.prealign_verse(kjv_text, karoli_text)
+                if prealigned is not None:
+                    # Névsorok, nemzetségtáblák: GPU nélkül megvan. A memóriába nem kerül,
+                    # a példák az LLM saját (teljes) válaszai maradnak
+                    self.count("prealigned")
+                    print(" ≡", end="")
+                    final_text = prealigned.text
+                    untagged = prealigned.untagged
                 else:
-                    failed_content = final_text.replace("!!!MANUAL_CHECK!!! ", "")
-                    self.log_failure(
-                        book=book_name, 
-                        chapter=chapter_name, 
-                        verse=int(v_num),
-                        original=karoli_text, 
-                        generated=failed_content,
-                        error_msg="Integritási hiba (Max retry elérve)"
-                    )
-                    self.memory.clear() # Töröljük a memóriát hiba után, ne zavarja a következőt
+                    self.count("llm_verses")
+                    process_verse = self.process_verse_tag_only if self.tag_only else self.process_verse_with_retry
+                    final_text = process_verse(kjv_text, karoli_text, f"{book_name}:{v_num}")
+                
+                    if "!!!MANUAL_CHECK!!!" not in final_text:
+                        # Csak az első sikeres versek lesznek példák: a rögzített példák a cache-elt előtag részei
+                        memory.add(kjv_text, final_text)
+                    else:
+                        failed_content = final_text.replace("!!!MANUAL_CHECK!!! ", "")
+                        failure = self.failure_record(
+                            book=book_name, 
+                            chapter=chapter_name, 
+                            verse=int(v_num),
+                            original=karoli_text, 
+                            generated=failed_content,
+                            error_msg=("Érvénytelen vagy hiányos tag-only válasz (Max retry elérve)" if self.tag_only
+                                       else "Integritási hiba (Max retry elérve)")
+                        )
+                        memory.clear() # Töröljük a memóriát hiba után, ne zavarja a következőt
             
             entry = {
                 "book": book_name,
                 "chapter": chapter_name,
                 "verse": int(v_num),
-                "text": final_text,
-                "version": "Karoli Strongs"
+                "text": final_text
             }
-            chapter_results.append(entry)
-        
-        return chapter_results
-
-    def process_bible(self):
-        """Fő folyamat."""
-        print(f"\nBiblia feldolgozása indul...")
-        print(f"  Modell: {OLLAMA_MODEL} (Qwen 2.5 7B)")
-        print(f"  Kimenet: {OUTPUT_FILE}")
-        
-        if not os.path.exists(KJV_ROOT) or not os.path.exists(KAROLI_ROOT):
-            print("HIBA: Hiányzó input mappák (bibles/kjv_strongs vagy bibles/karoli).")
-            return
-
-        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            f.write('[\n')
-
-        is_first_entry = True
+            # A naplóba a verziónév nélkül kerül, azt a finalize teszi hozzá
+            if failure:
+                entry["failure"] = failure
+            if untagged:
+                entry["untagged"] = list(untagged)
+            self.journal.add(entry)
+
+    def run_chapter(self, book_name: str, chapter_name: str, kjv_path: str, karoli_path: str,
+                    first_in_book: bool = True):
+        """
+        Egy fejezet egy munkaszálon. A könyv első fejezete tölti fel a könyv
+        példamemóriáját, a többi megvárja (lásd BookMemory).
+        """
+        memory = self.book_memory(book_name)
+        with self._lock:
+            if book_name not in self.started_books:
+                self.started_books.add(book_name)
+                print(f"\n[{len(self.started_books)}/{self.total_books}] 📖 {book_name}")
+        if not first_in_book:
+            while not memory.settled.wait(0.5):
+                if self.stop.is_set():
+                    return
+        try:
+            self.process_chapter(kjv_path, karoli_path, book_name, chapter_name)
+        finally:
+            if first_in_book:
+                memory.settle()
+
+    def dump_entry(self, item: Dict, f):
+        if self.compact:
+            json.dump(item, f, ensure_ascii=False, separators=(',', ':'))
+        else:
+            json.dump(item, f, ensure_ascii=False, indent=2)
+
+    def iter_books(self):
+        """(könyv, [(fejezet, kjv_path, karoli_path), ...]) sorrendben, csak a mindkét fordításban meglévő könyvek."""
         book_dirs = sorted(os.listdir(KJV_ROOT))
         
         # Mappák ellenőrzése
         valid_books = [d for d in book_dirs if os.path.isdir(os.path.join(KJV_ROOT, d))]
-        total_books = len(valid_books)
-        processed_books = 0
-        
         for book_dir in valid_books:
             kjv_book_path = os.path.join(KJV_ROOT, book_dir)
             karoli_book_path = os.path.join(KAROLI_ROOT, book_dir)
 
             if not os.path.exists(karoli_book_path): continue
 
-            processed_books += 1
-            print(f"\n[{processed_books}/{total_books}] 📖 {book_dir}")
-            self.memory.clear()
-
             chapter_files = sorted(
                 [f for f in os.listdir(kjv_book_path) if f.endswith('.json')],
                 key=lambda x: int(re.search(r'\d+', x).group()) if re.search(r'\d+', x) else 0
             )
+            yield book_dir, [(chapter_file.replace('.json', ''),
+                              os.path.join(kjv_book_path, chapter_file),
+                              os.path.join(karoli_book_path, chapter_file)) for chapter_file in chapter_files]
 
-            for chapter_file in chapter_files:
-                chapter_results = self.process_chapter(
-                    os.path.join(kjv_book_path, chapter_file),
-                    os.path.join(karoli_book_path, chapter_file),
-                    book_dir,
-                    chapter_file.replace('.json', '')
-                )
-
-                if chapter_results:
-                    with open(OUTPUT_FILE, 'a', encoding='utf-8') as f:
-                        for item in chapter_results:
-                            if not is_first_entry: f.write(',\n')
-                            else: is_first_entry = False
-                            json.dump(item, f, ensure_ascii=False, indent=2)
-                
-                # Memória tisztítás fejezetenként
-                del chapter_results
-                gc.collect()
+    def print_stats(self, label: str, stats: Dict[str, int]):
+        tagged = stats["prealigned"] + stats["llm_verses"]
+        if not tagged:
+            return
+        print(f"  {label}: {stats['prealigned']}/{tagged} vers előillesztve "
+              f"({stats['prealigned'] / tagged * 100:.0f}%), {stats['llm_verses']} vers az LLM-nél, "
+              f"{stats['ollama_calls']} Ollama hívás, {stats['eval_tokens']} kimeneti token")
+        if stats["llm_verses"]:
+            print(f"    prompt kiértékelés: {stats['prompt_tokens']} token, "
+                  f"{stats['prompt_tokens'] / stats['llm_verses']:.0f} token/LLM vers")
+
+    def prealign_report(self):
+        """Csak az előillesztőt futtatja (LLM és kimenet nélkül): könyvenként hány vers spórolja meg a GPU-t."""
+        if not os.path.exists(KJV_ROOT) or not os.path.exists(KAROLI_ROOT):
+            print("HIBA: Hiányzó input mappák (bibles/kjv_strongs vagy bibles/karoli).")
+            return
+        total = dict.fromkeys(self.stats, 0)
+        for book_dir, chapters in self.iter_books():
+            book = dict.fromkeys(self.stats, 0)
+            for _, kjv_path, karoli_path in chapters:
+                try:
+                    with open(kjv_path, 'r', encoding='utf-8') as f: kjv_data = json.load(f)
+                    with open(karoli_path, 'r', encoding='utf-8') as f: karoli_data = json.load(f)
+                except Exception as e:
+                    print(f"  ⚠ Fájl hiba: {e}")
+                    continue
+                karoli_map = {str(item['v']): item['text'] for item in karoli_data if 'v' in item and 'text' in item}
+                for item in kjv_data:
+                    kjv_text = item.get('text')
+                    karoli_text = karoli_map.get(str(item.get('v')))
+                    if not kjv_text or not karoli_text or "{" not in kjv_text:
+                        continue
+                    key = "prealigned" if self.prealign_verse(kjv_text, karoli_text) is not None else "llm_verses"
+                    book[key] += 1
+            self.print_stats(book_dir, book)
+            for key in total:
+                total[key] += book[key]
+        self.print_stats("Összesen", total)
+
+    def process_bible(self):
+        """Fő folyamat."""
+        print(f"\nBiblia feldolgozása indul...")
+        print(f"  Modell: {OLLAMA_MODEL} (Qwen 2.5 7B)")
+        print(f"  Kimenet: {OUTPUT_FILE}")
+        
+        if not os.path.exists(KJV_ROOT) or not os.path.exists(KAROLI_ROOT):
+            print("HIBA: Hiányzó input mappák (bibles/kjv_strongs vagy bibles/karoli).")
+            return
+
+        # A kimeneti fájlokhoz csak a végén nyúlunk (finalize); addig minden vers a naplóba megy
+        if self.journal.entries:
+            print(f"  Folytatás: {len(self.journal.entries)} vers már kész a naplóban ({JOURNAL_FILE})")
+        if self.retry_failed:
+            self.retry_keys = self.load_retry_keys()
+            print(f"  Csak a hibalistán szereplő {len(self.retry_keys)} vers fut újra")
+
+        books = list(self.iter_books())
+        self.total_books = len(books)
+        if self.parallel > 1:
+            print(f"  Párhuzamos fejezetek: {self.parallel}")
+
+        # A fejezetek sorrendben mennek a munkásokhoz, és ugyanebben a sorrendben zárjuk le őket
+        # (könyvenkénti statisztika). Legfeljebb 2x annyi fejezet vár, ahány munkás van.
+        pending = deque()
+
+        def finish_next():
+            book_dir, last_in_book, future = pending.popleft()
+            # A munkás kivétele itt jön elő
+            future.result()
             
-            print()
+            # Memória tisztítás fejezetenként
+            gc.collect()
+
+            if last_in_book:
+                print()
+                self.print_stats(book_dir, self.book_stats.get(book_dir, dict.fromkeys(self.stats, 0)))
 
-        with open(OUTPUT_FILE, 'a', encoding='utf-8') as f:
+        pool = ThreadPoolExecutor(max_workers=self.parallel)
+        try:
+            for book_dir, chapters in books:
+                for index, (chapter_name, kjv_path, karoli_path) in enumerate(chapters):
+                    future = pool.submit(self.run_chapter, book_dir, chapter_name, kjv_path, karoli_path, index == 0)
+                    pending.append((book_dir, index == len(chapters) - 1, future))
+                    while pending and (len(pending) > 2 * self.parallel or pending[0][2].done()):
+                        finish_next()
+            while pending:
+                finish_next()
+        finally:
+            # Megszakításkor a még el nem indult fejezetek elmaradnak, a futók a
+            # folyamatban lévő vers után kilépnek; csak utána zárjuk a naplót
+            self.stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            self.journal.close()
+
+        self.finalize()
+        self.print_stats("Összesen", self.stats)
+
+    def finalize(self):
+        """
+        A naplóból összeállítja a kimeneti JSON tömböt és a failed_verses.json-t,
+        könyv / fejezet / vers sorrendben. Mindkettő ideiglenes fájlba íródik és
+        cserével kerül a helyére, így félkész tömb sosem marad a lemezen.
+        """
+        book_order = {book: i for i, (book, _) in enumerate(self.iter_books())} if os.path.exists(KJV_ROOT) else {}
+
+        def sort_key(key):
+            book, chapter, verse = key
+            return (book_order.get(book, len(book_order)), book,
+                    int(chapter) if chapter.isdigit() else 0, chapter, verse)
+
+        keys = sorted(self.journal.entries, key=sort_key)
+        failures = [self.journal.entries[key]["failure"] for key in keys if "failure" in self.journal.entries[key]]
+
+        tmp_path = OUTPUT_FILE + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('[\n')
+            for i, key in enumerate(keys):
+                entry = {k: v for k, v in self.journal.entries[key].items() if k not in JOURNAL_ONLY_KEYS}
+                if not self.compact:
+                    entry["version"] = VERSION_NAME
+                if i: f.write(',\n')
+                self.dump_entry(entry, f)
             f.write('\n]')
-            
-        with open(FAILED_FILE, 'a', encoding='utf-8') as f:
+        os.replace(tmp_path, OUTPUT_FILE)
+
+        tmp_path = FAILED_FILE + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('[\n')
+            for i, failure in enumerate(failures):
+                if i: f.write(',\n')
+                json.dump(failure, f, ensure_ascii=False, indent=2)
             f.write('\n]')
+        os.replace(tmp_path, FAILED_FILE)
+
+        if self.compact:
+            with open(OUTPUT_META_FILE, 'w', encoding='utf-8') as f:
+                json.dump({"version": VERSION_NAME}, f, ensure_ascii=False, separators=(',', ':'))
+        if self.precompress:
+            precompress_file(OUTPUT_FILE)
         
-        print(f"\n✅ Kész! Kimenet: {OUTPUT_FILE}")
+        print(f"\n✅ Kész! Kimenet: {OUTPUT_FILE} ({len(keys)} vers, {len(failures)} kézi ellenőrzésre)")
+        partial = sum(1 for key in keys if "untagged" in self.journal.entries[key])
+        if partial:
+            print(f"  {partial} előillesztett versből kimaradt néhány Strong-kód (lásd \"untagged\" a naplóban: {JOURNAL_FILE})")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Károli fordítás Strong-számozása Ollamával")
+    parser.add_argument("--compact", action="store_true",
+                        help="Tömör JSON kimenet, a verziónév külön meta fájlban")
+    parser.add_argument("--precompress", action="store_true",
+                        help=".gz (és ha elérhető, .br) testvér a kimeneti fájlhoz")
+    parser.add_argument("--no-prealign", action="store_true",
+                        help="Minden tagelendő vers az LLM-hez megy (szótáras előillesztés nélkül)")
+    parser.add_argument("--prealign-coverage", type=float, default=PREALIGN_MIN_COVERAGE,
+                        help=f"Az előillesztőnek a Strong-kódok ekkora hányadát kell elhelyeznie "
+                             f"(alapértelmezés: {PREALIGN_MIN_COVERAGE} = mindet; kisebb értéknél "
+                             f"a kimaradt kódok nem kerülnek a kimenetbe)")
+    parser.add_argument("--prealign-confidence", type=float, default=PREALIGN_MIN_CONFIDENCE,
+                        help=f"Az előillesztés egyezési pontszámainak minimális átlaga "
+                             f"(alapértelmezés: {PREALIGN_MIN_CONFIDENCE})")
+    parser.add_argument("--prealign-report", action="store_true",
+                        help="Csak az előillesztő lefedettségét méri könyvenként, LLM hívás és kimenet nélkül")
+    parser.add_argument("--tag-only", action="store_true",
+                        help="A modell csak sorszám=kód párokat ad, a tagek helyben kerülnek a szövegbe "
+                             "(kevesebb kimeneti token, nincs integritási hiba)")
+    parser.add_argument("--tag-only-coverage", type=float, default=TAG_ONLY_MIN_COVERAGE,
+                        help=f"Tag-only módban a vers Strong-kódjainak ekkora hányadát kell elhelyeznie a "
+                             f"válasznak, különben újrapróbálás / hibalista (alapértelmezés: {TAG_ONLY_MIN_COVERAGE})")
+    parser.add_argument("--parallel", type=int, default=PARALLEL,
+                        help="Egyszerre feldolgozott fejezetek száma; az Ollama szervert "
+                             "OLLAMA_NUM_PARALLEL=N beállítással kell indítani (alapértelmezés: 1, soros)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Csak a hibalistán (napló és failed_verses.json) szereplő versek újrafeldolgozása")
+    parser.add_argument("--finalize", action="store_true",
+                        help="Feldolgozás nélkül összeállítja a kimenetet a naplóból (pl. megszakítás után)")
+    parser.add_argument("--fresh", action="store_true",
+                        help="A napló törlése, elölről kezdi a teljes Bibliát")
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        tagger = BibleTagger()
-        tagger.process_bible()
+        if args.fresh and os.path.exists(JOURNAL_FILE):
+            os.remove(JOURNAL_FILE)
+        tagger = BibleTagger(compact=args.compact, precompress=args.precompress,
+                             prealign=not args.no_prealign, prealign_min_coverage=args.prealign_coverage,
+                             prealign_min_confidence=args.prealign_confidence,
+                             tag_only=args.tag_only, tag_only_min_coverage=args.tag_only_coverage,
+                             parallel=args.parallel, retry_failed=args.retry_failed)
+        if args.prealign_report:
+            tagger.prealign_report()
+        elif args.finalize:
+            tagger.finalize()
+        else:
+            tagger.process_bible()
     except KeyboardInterrupt:
-        print("\n\n⚠ Megszakítva.")
-        try:
-            with open(OUTPUT_FILE, 'a') as f: f.write('\n]')
-            with open(FAILED_FILE, 'a') as f: f.write('\n]')
-        except: pass
+        # A kész versek a naplóban vannak, a kimeneti fájlok érintetlenek
+        print("\n\n⚠ Megszakítva. Újraindításkor a napló alapján folytatódik "
+              "(--finalize a mostani állapot összeállításához).")
         sys.exit(0)
     except Exception as e:
         print(f"\n\n❌ Kritikus hiba: {e}")
@@ -0,0 +1,317 @@
+"""
+Determinisztikus Strong-illesztő az AddStrongs.py-hoz.
+
+A KJV vers Strong-kódjait a Károli vers szavaihoz párosítja az LLM előtt:
+tulajdonneveket átírás-tűrő fuzzy összevetéssel (difflib), köznévi
+szavakat a strongs/hebrew.json és greek.json magyar definícióinak
+szótöveivel. Ha az illesztés magabiztos, a verset nem kell a modellnek
+elküldeni; a tagek a szavak végére kerülnek, a szöveg maga nem változik.
+"""
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Szó a magyar versben: betűk, számok, kötőjeles / aposztrófos összetételek
+WORD_RE = re.compile(r"\w+(?:[-']\w+)*")
+# Tagelt szó a KJV versben, ugyanaz a minta, mint a BibleTagger.extract_strongs_data-ban
+STRONG_TAG_RE = re.compile(r"([A-Za-z\'-]+)\{(H\d+|G\d+)\}")
+# Tag-only válasz egy párja: "3=H2526", "3: {H2526}", "3 -> H2526"
+TAG_PAIR_RE = re.compile(r"(\d+)\s*(?:=|:|->)\s*\{?\s*([HG]\d+)\s*\}?")
+TAG_RE = re.compile(r"\{\s*([HG]\d+)\s*\}")
+STRONG_KEY_RE = re.compile(r"([HG])0*(\d+)[a-zA-Z]?$")
+
+# Átírási egyenértékek: a Károli (Khám, Miczráim, Thubál), a KJV (Japheth, Meshech)
+# és a szótár átírásai (jéphet, micrájim) ugyanarra a vázra essenek
+_DIGRAPHS = (
+    ("sch", "s"), ("tz", "c"), ("cz", "c"), ("ts", "c"), ("kh", "h"), ("ch", "h"),
+    ("ph", "f"), ("th", "t"), ("sh", "s"), ("sz", "s"), ("zs", "s"), ("gy", "g"),
+    ("ny", "n"), ("ly", "j"), ("y", "i"), ("j", "i"), ("w", "v"), ("q", "k"), ("x", "ks"),
+)
+
+# Toldalék, ami egy név után még elfogadható (Jáfetnek, Nimródot, Rahmáhnak)
+MAX_SUFFIX = 5
+NAME_MIN_SCORE = 0.6
+GLOSS_MIN_SCORE = 0.75
+MAX_GLOSSES = 15
+
+_STOPWORDS = {
+    "egy", "és", "vagy", "mint", "hogy", "nem", "is", "valami", "valamit", "valakit",
+    "valakinek", "valaki", "által", "ami", "aki", "ezt", "azt", "meg", "ill", "stb",
+    "szó", "szerint", "értelemben", "átvitt", "használat", "jelentés",
+}
+
+
+def skeleton(word: str) -> str:
+    """Ékezet- és átírásfüggetlen váz: Khám -> ham, Japheth -> iafet, Miczráim -> micraim."""
+    s = unicodedata.normalize("NFKD", word.lower())
+    s = "".join(c for c in s if c.isalpha() and not unicodedata.combining(c))
+    for a, b in _DIGRAPHS:
+        s = s.replace(a, b)
+    s = re.sub(r"(.)\1+", r"\1", s)
+    # Szóvégi h: Elisah / Elisha, Tógármah / Togarmah
+    return s[:-1] if len(s) > 3 and s.endswith("h") else s
+
+
+def tokenize(text: str) -> List[Tuple[int, int, str]]:
+    """(kezdet, vég, szó) hármasok a vers szavaira."""
+    return [(m.start(), m.end(), m.group()) for m in WORD_RE.finditer(text)]
+
+
+def splice_tags(text: str, tokens: List[Tuple[int, int, str]], placements: Dict[int, List[str]]) -> str:
+    """A tageket a megadott szavak végére illeszti, a szöveg többi része érintetlen marad."""
+    parts = []
+    last = 0
+    for index in sorted(placements):
+        end = tokens[index][1]
+        parts.append(text[last:end])
+        parts.append("".join(f"{{{sid}}}" for sid in placements[index]))
+        last = end
+    parts.append(text[last:])
+    return "".join(parts)
+
+
+def number_tokens(tokens: List[Tuple[int, int, str]]) -> str:
+    """A tag-only prompt szólistája: "1:Noé 2:Sém 3:Khám 4:és 5:Jáfet"."""
+    return " ".join(f"{index}:{word}" for index, (_, _, word) in enumerate(tokens, 1))
+
+
+def parse_tag_pairs(output: str, token_count: int, allowed_ids) -> Dict[int, List[str]]:
+    """
+    A modell (szó sorszáma, Strong-kód) párjai -> {token index: [kód, ...]}.
+    A sorszám 1-től indul; a tartományon kívüli sorszámot és a versben nem
+    szereplő kódot eldobja, így a válasz a szöveget sosem ronthatja el.
+    """
+    placements: Dict[int, List[str]] = {}
+    for number, sid in TAG_PAIR_RE.findall(output):
+        index = int(number) - 1
+        if 0 <= index < token_count and sid in allowed_ids and sid not in placements.get(index, []):
+            placements.setdefault(index, []).append(sid)
+    return placements
+
+
+def tagged_to_pairs(tagged_text: str) -> Tuple[str, List[Tuple[int, str]]]:
+    """Tagelt vers -> (tisztított szöveg, [(szó sorszáma 1-től, kód), ...]); a memória példáihoz."""
+    clean_parts = []
+    tag_offsets = []
+    last = 0
+    length = 0
+    for m in TAG_RE.finditer(tagged_text):
+        # A tag előtti szóközt a check_integrity is elnyeli ("Mésekh {H4902} és")
+        chunk = tagged_text[last:m.start()].rstrip()
+        clean_parts.append(chunk)
+        length += len(chunk)
+        tag_offsets.append((length, m.group(1)))
+        last = m.end()
+    clean_parts.append(tagged_text[last:])
+    clean = "".join(clean_parts)
+    tokens = tokenize(clean)
+    pairs = []
+    for offset, sid in tag_offsets:
+        # A tag előtti utolsó szó
+        index = max((i for i, (start, _, _) in enumerate(tokens) if start < offset), default=None)
+        if index is not None:
+            pairs.append((index + 1, sid))
+    return clean, pairs
+
+
+def _strip_html(text: str) -> str:
+    text = re.sub(r"<br\s*/?>", ";", text, flags=re.IGNORECASE)
+    return re.sub(r"<[^>]+>", "", text)
+
+
+class StrongsLexicon:
+    """
+    Strong-szám -> szótári bejegyzés, a két szótárfájl eltérő kulcsaival:
+    a héber "H0122a"/"H1121a" változatokat, a görög "sw-..." kulcsú,
+    "strongs" számmal ellátott bejegyzéseket is a "H122" / "G2424" alakra képezi.
+    """
+
+    def __init__(self, hebrew_defs: Dict, greek_defs: Dict):
+        self.entries: Dict[str, List[Dict]] = {}
+        for key, entry in hebrew_defs.items():
+            m = STRONG_KEY_RE.match(key)
+            if m:
+                self.entries.setdefault(f"H{m.group(2)}", []).append(entry)
+        for key, entry in greek_defs.items():
+            number = entry.get("strongs") if isinstance(entry, dict) else None
+            if number is None:
+                m = STRONG_KEY_RE.match(key)
+                if not m:
+                    continue
+                number = m.group(2)
+            self.entries.setdefault(f"G{int(number)}", []).append(entry)
+
+    def entry(self, strong_id: str) -> Optional[Dict]:
+        found = self.entries.get(self._key(strong_id))
+        return found[0] if found else None
+
+    @staticmethod
+    def definitions(entry: Dict) -> Dict[str, str]:
+        """{'hu': ..., 'en': ...}: a héber szótárban 'defs', a görögben 'definition'."""
+        defs = entry.get("defs") or entry.get("definition") or {}
+        return {lang: text if isinstance(text, str) else "; ".join(text) for lang, text in defs.items() if text}
+
+    @lru_cache(maxsize=None)
+    def name_forms(self, strong_id: str) -> Tuple[str, ...]:
+        """Tulajdonnév alakjai vázként: átírás, '§ Hám = ...' fejléc, angol név."""
+        forms = []
+        for entry in self.entries.get(self._key(strong_id), []):
+            translit = entry.get("translit") or entry.get("transliteration") or ""
+            forms.append(translit.replace(".", ""))
+            defs = self.definitions(entry)
+            for header in re.findall(r"§\s*([^=<]+?)\s*=", defs.get("hu", "")):
+                forms.extend(re.split(r"\s+vagy\s+|,", header))
+            en = defs.get("en", "")
+            if en[:1].isupper() and len(en.split()) <= 2:
+                forms.append(en)
+        return tuple(dict.fromkeys(s for s in map(skeleton, forms) if len(s) >= 2))
+
+    @lru_cache(maxsize=None)
+    def is_name(self, strong_id: str) -> bool:
+        return any(re.search(r"§\s*[A-ZÁÉÍÓÖŐÚÜŰ]", self.definitions(entry).get("hu", ""))
+                   for entry in self.entries.get(self._key(strong_id), []))
+
+    @lru_cache(maxsize=None)
+    def gloss_stems(self, strong_id: str) -> Tuple[str, ...]:
+        """A magyar definíció rövid jelentéseinek szótövei vázként (szülni -> szül, földön ~ föld)."""
+        stems = []
+        for entry in self.entries.get(self._key(strong_id), []):
+            hu = _strip_html(self.definitions(entry).get("hu", ""))
+            hu = re.sub(r"\([^)]*\)", "", hu)
+            hu = re.sub(r"\b\d+[a-z0-9]*\)", ";", hu)
+            for segment in re.split(r"[;,/:=§.]", hu):
+                words = segment.split()
+                # Hosszabb mondatok magyarázatok, nem jelentések
+                if not words or len(words) > 3:
+                    continue
+                for word in words:
+                    # Nagybetűs szó a leírásban rokon vagy hely neve (apja: Kus), nem jelentés
+                    if word[:1].isupper():
+                        continue
+                    word = word.lower()
+                    if len(word) < 3 or word in _STOPWORDS or not word.isalpha():
+                        continue
+                    if word.endswith("ni") and len(word) > 4:
+                        word = word[:-2]
+                    stems.append(skeleton(word))
+        stems = [s for s in dict.fromkeys(stems) if len(s) >= 3]
+        return tuple(stems[:MAX_GLOSSES])
+
+    @staticmethod
+    def _key(strong_id: str) -> str:
+        m = STRONG_KEY_RE.match(strong_id)
+        return f"{m.group(1)}{int(m.group(2))}" if m else strong_id
+
+
+def name_score(token: str, forms: Tuple[str, ...]) -> float:
+    """A szó eleje (a toldalék nélkül) mennyire hasonlít a név valamelyik alakjára."""
+    best = 0.0
+    for form in forms:
+        for length in range(max(2, len(form) - 1), min(len(token), len(form) + 1) + 1):
+            suffix = len(token) - length
+            if suffix > MAX_SUFFIX:
+                continue
+            score = SequenceMatcher(None, token[:length], form).ratio() - 0.02 * suffix
+            best = max(best, score)
+    return best
+
+
+def gloss_score(token: str, stems: Tuple[str, ...]) -> float:
+    best = 0.0
+    for stem in stems:
+        if token.startswith(stem) and len(token) - len(stem) <= 6:
+            best = max(best, 0.9)
+        elif len(stem) >= 5:
+            ratio = SequenceMatcher(None, token[:len(stem)], stem).ratio()
+            if ratio >= 0.8:
+                best = max(best, ratio * 0.9)
+    return best
+
+
+class Alignment(NamedTuple):
+    text: str
+    placed: int
+    total: int
+    confidence: float
+    # A versben szereplő, de el nem helyezett kódok (a napló rögzíti őket)
+    untagged: Tuple[str, ...] = ()
+
+
+class PreAligner:
+    def __init__(self, lexicon: StrongsLexicon, min_coverage: float = 1.0, min_confidence: float = 0.8):
+        """
+        min_coverage: a Strong-kódok legalább ekkora hányadát el kell helyezni (a neveket mind);
+        1.0 alatt a kimaradt kódok csak az "untagged" listába kerülnek, a szövegbe nem.
+        min_confidence: az egyezési pontszámok átlaga (az el nem helyezett kód 0-nak számít)
+        legalább ennyi legyen, különben a vers az LLM-hez megy.
+        """
+        self.lexicon = lexicon
+        self.min_coverage = min_coverage
+        self.min_confidence = min_confidence
+
+    def align(self, kjv_text: str, karoli_text: str) -> Optional[Alignment]:
+        """
+        A tagelt Károli szöveget (és az el nem helyezett kódokat) adja vissza,
+        vagy None-t, ha az illesztés nem elég magabiztos és a vers az LLM-hez megy.
+        """
+        matches = list(STRONG_TAG_RE.finditer(kjv_text))
+        if not matches:
+            return None
+        first_word = WORD_RE.search(kjv_text)
+        tokens = tokenize(karoli_text)
+        skeletons = [skeleton(word) for _, _, word in tokens]
+        used = set()
+        placements: Dict[int, List[str]] = {}
+        scores = []
+        untagged = []
+        last_name = -1
+
+        for match in matches:
+            word, sid = match.group(1).strip(), match.group(2)
+            # A KJV a neveket nagybetűvel írja; a vers első szavánál (In, Blessed) a szótár dönt
+            initial = first_word is not None and match.start() == first_word.start()
+            name = word[:1].isupper() and not word.isupper() and (not initial or self.lexicon.is_name(sid))
+            stems = self.lexicon.gloss_stems(sid)
+            best_index, best_score = None, 0.0
+            if name:
+                forms = self.lexicon.name_forms(sid) + (skeleton(word),)
+                for index, (_, _, token) in enumerate(tokens):
+                    if index in used or not token[:1].isupper():
+                        continue
+                    # God -> Isten: a magyar jelentés is lehet a név
+                    score = max(name_score(skeletons[index], forms), gloss_score(skeletons[index], stems))
+                    # Névsoroknál a sorrend azonos: döntetlennél az előző név utáni szó nyer
+                    if index > last_name:
+                        score += 0.01
+                    if score > best_score:
+                        best_index, best_score = index, score
+                if best_index is None or best_score < NAME_MIN_SCORE:
+                    return None
+                last_name = best_index
+            else:
+                for index in range(len(tokens)):
+                    if index in used:
+                        continue
+                    score = gloss_score(skeletons[index], stems)
+                    if score > best_score:
+                        best_index, best_score = index, score
+                if best_index is None or best_score < GLOSS_MIN_SCORE:
+                    scores.append(0.0)
+                    untagged.append(sid)
+                    continue
+            used.add(best_index)
+            placements.setdefault(best_index, []).append(sid)
+            scores.append(min(best_score, 1.0))
+
+        placed = sum(1 for score in scores if score > 0)
+        total = len(matches)
+        coverage = placed / total
+        if coverage < self.min_coverage:
+            return None
+        confidence = sum(scores) / total
+        if confidence < self.min_confidence:
+            return None
+        return Alignment(splice_tags(karoli_text, tokens, placements), placed, total, confidence,
+                         tuple(dict.fromkeys(untagged)))
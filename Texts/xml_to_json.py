@@ -1,91 +1,562 @@
-from logging import root
-import xml
-import xml.etree.ElementTree as ET
+import argparse
+import gzip
+import hashlib
 import json
 import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# A közös modulok (bible_books.py, verse_pack.py) a repó gyökerében vannak
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SCRIPT_DIR))
+import bible_books
+from verse_pack import PACK_SUFFIX, encode_pack
 
 INPUT_FILE = "SF_2012-04-21_HEB_OSMHB_(OPEN SCRIPTURES MORPHOLOGICAL HEBREW BIBLE).xml"
 OUTPUT_DIR = "bibles/heb_OSMHB"
 VERSION_NAME = "MORPHOLOGICAL HEBREW BIBLE"
 LANG_CODE = "heb"
 
-book_mapping = {
-    "1": "gen", "2": "ex", "3": "lev", "4": "num", "5": "deut",
-    "6": "josh", "7": "judg", "8": "ruth", "9": "1sam", "10": "2sam",
-    "11": "1kings", "12": "2kings", "13": "1chron", "14": "2chron", "15": "ezra",
-    "16": "neh", "17": "esth", "18": "job", "19": "ps", "20": "prov",
-    "21": "eccl", "22": "song", "23": "isa", "24": "jer", "25": "lam",
-    "26": "ezek", "27": "dan", "28": "hos", "29": "joel", "30": "amos",
-    "31": "obad", "32": "jonah", "33": "mic", "34": "nah", "35": "hab",
-    "36": "zeph", "37": "hag", "38": "zech", "39": "mal",
-    "40": "mat", "41": "mark", "42": "luke", "43": "john", "44": "acts",
-    "45": "rom", "46": "1cor", "47": "2cor", "48": "gal", "49": "eph",
-    "50": "phil", "51": "col", "52": "1thess", "53": "2thess", "54": "1tim",
-    "55": "2tim", "56": "titus", "57": "philem", "58": "heb", "59": "jam",
-    "60": "1pet", "61": "2pet", "62": "1jn", "63": "2jn", "64": "3jn",
-    "65": "jude", "66": "rev"
-}
-
-def convert_xml_to_json():
-    # Mappa létrehozása
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-        print(f"Mappa létrehozva: {OUTPUT_DIR}")
+# Build manifest: forrás hash + fejezetenkénti digest az inkrementális újrageneráláshoz
+MANIFEST_FILE = "_manifest.json"
+# Kompakt módban ide kerül a fejezetekből kiemelt version_meta
+VERSION_META_FILE = "_version.json"
+# Minden, amit a konverter a kimeneti mappába írhat (a takarítás csak ezekhez nyúl)
+GENERATED_FILE_RE = re.compile(
+    r"^(?:\w+_\d+\.json|\w+" + re.escape(PACK_SUFFIX) + "|" + re.escape(VERSION_META_FILE) + r")(?:\.gz|\.br)?$")
 
-    print("XML elemzése... (ez eltarthat egy pillanatig)")
-    with open(INPUT_FILE, 'r', encoding='utf-8-sig') as f:
+# A frontend metaadatai (versions.json, structures.json)
+STRUCTURES_DIR = os.path.join(SCRIPT_DIR, "..", "Frontend", "src", "assets", "translation_structures")
+
+def resolve_book_id(b_number):
+    """bnumber -> kanonikus könyv ID (pl. "2" -> "exo"), ismeretlen könyvnél None."""
+    book = bible_books.by_number(b_number)
+    if book is None:
+        print(f"Figyelem: Ismeretlen könyv ID: {b_number}, kihagyva.")
+        return None
+    return book.id
+
+def extract_verses(chapter):
+    """Egy CHAPTER elem verseinek kinyerése [(vnumber, szöveg), ...] alakban."""
+    verses = []
+    for verse in chapter.findall('VERS'):
+        v_number = verse.get('vnumber')
+        words = []
+        for gr in verse.findall('gr'):
+            if gr.text:
+                words.append(gr.text)
+
+        verse_text = " ".join(words)
+        if not words:
+            # Szó-tagek (gr) nélküli fordításoknál (pl. RYLT, HUNUJ) a teljes vers szövege
+            verse_text = " ".join("".join(verse.itertext()).split())
+
+        if verse_text:
+            verse_text = verse_text.replace('\n', ' ').strip()
+            verses.append((v_number, verse_text))
+
+    return verses
+
+def build_chapter(book_id, c_number, verses, settings):
+    """A kinyert versekből előállítja a fejezet JSON tartalmát."""
+    if settings["format"] == "compact":
+        # Kompakt forma: a version_meta a verzió fájlba kerül, a kulcs csak a versszám
+        return {v_number: verse_text for v_number, verse_text in verses}
+
+    json_content = {
+        "version_meta": {
+            "name": settings["name"],
+            "lang": settings["lang"]
+        },
+        "verses": {}
+    }
+    for v_number, verse_text in verses:
+        key = f"{book_id}-{c_number}-{v_number}"
+        json_content["verses"][key] = verse_text
+
+    return json_content
+
+def render_json(data, settings):
+    """A pontos fájltartalom bájtokban (ebből számoljuk a digestet is)."""
+    if settings["format"] == "compact":
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    else:
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+    return text.encode('utf-8')
+
+def compressed_suffixes(settings):
+    if not settings["precompress"]:
+        return []
+    return [".gz", ".br"] if brotli is not None else [".gz"]
+
+def output_files(filename, settings):
+    """A fejezet JSON fájlja és az előtömörített testvérei."""
+    return [filename] + [filename + suffix for suffix in compressed_suffixes(settings)]
+
+def write_output(filepath, data, settings):
+    with open(filepath, 'wb') as f:
+        f.write(data)
+    # mtime=0: a .gz tartalma csak a bemenettől függjön, ne az írás idejétől
+    for suffix in compressed_suffixes(settings):
+        if suffix == ".gz":
+            packed = gzip.compress(data, compresslevel=9, mtime=0)
+        else:
+            packed = brotli.compress(data, quality=11)
+        with open(filepath + suffix, 'wb') as f:
+            f.write(packed)
+
+def write_chapter(json_content, book_id, c_number, output_dir, settings, previous_digest=None):
+    """
+    Kiírja a fejezetet, ha a tartalma eltér a manifestben rögzítettől.
+    Visszaadja a fájlnevet, a digestet és azt, hogy ténylegesen írt-e.
+    """
+    filename = f"{book_id}_{c_number}.json"
+    data = render_json(json_content, settings)
+    digest = hashlib.sha256(data).hexdigest()
+
+    if digest == previous_digest and all(
+            os.path.exists(os.path.join(output_dir, name))
+            for name in output_files(filename, settings)):
+        return filename, digest, False
+
+    write_output(os.path.join(output_dir, filename), data, settings)
+    return filename, digest, True
+
+def write_version_meta(output_dir, settings):
+    """Kompakt módban a verzió metaadatai egyszer, külön fájlba kerülnek."""
+    filepath = os.path.join(output_dir, VERSION_META_FILE)
+    data = render_json({"name": settings["name"], "lang": settings["lang"]}, settings)
+    if os.path.exists(filepath):
+        with open(filepath, 'rb') as f:
+            if f.read() == data:
+                return
+    write_output(filepath, data, settings)
+
+def version_meta_files(settings):
+    return [VERSION_META_FILE] if settings["format"] == "compact" else []
+
+def write_pack(book_id, book_name, chapters, output_dir, settings, previous_digest=None):
+    """A könyv összes verse egy .pack fájlba (lásd verse_pack.py), a fejezetekkel azonos módon."""
+    filename = f"{book_id}{PACK_SUFFIX}"
+    data = encode_pack(book_id, book_name, [
+        (int(c_number), int(v_number), verse_text)
+        for c_number, verses in chapters
+        for v_number, verse_text in verses
+    ])
+    digest = hashlib.sha256(data).hexdigest()
+
+    if digest == previous_digest and all(
+            os.path.exists(os.path.join(output_dir, name))
+            for name in output_files(filename, settings)):
+        return filename, digest, False
+
+    write_output(os.path.join(output_dir, filename), data, settings)
+    return filename, digest, True
+
+def write_book(book_id, book_name, chapters, output_dir, settings, previous_digests):
+    """Egy könyv összes fejezetének kiírása; a process pool ezt futtatja könyvenként."""
+    start = time.perf_counter()
+    digests = {}
+    written = 0
+    for c_number, verses in chapters:
+        json_content = build_chapter(book_id, c_number, verses, settings)
+        filename, digest, changed = write_chapter(
+            json_content, book_id, c_number, output_dir, settings,
+            previous_digests.get(f"{book_id}_{c_number}.json"))
+        digests[filename] = digest
+        written += changed
+    if settings["pack"]:
+        filename, digest, _ = write_pack(book_id, book_name, chapters, output_dir, settings,
+                                         previous_digests.get(f"{book_id}{PACK_SUFFIX}"))
+        digests[filename] = digest
+    return book_id, len(chapters), written, time.perf_counter() - start, digests
+
+def iter_chapters_tree(input_file):
+    """Eredeti út: a teljes XML-t beolvassa és egyben felépíti a fát."""
+    with open(input_file, 'r', encoding='utf-8-sig') as f:
         xml_content = f.read()
-        root = ET.fromstring(xml_content)
+    root = ET.fromstring(xml_content)
+
+    # Végigmegyünk minden könyvön
+    for book in root.findall('BIBLEBOOK'):
+        book_id = resolve_book_id(book.get('bnumber'))
+        if book_id is None:
+            continue
+
+        print(f"Feldolgozás: {book_id}...")
 
-        # Végigmegyünk minden könyvön
-        for book in root.findall('BIBLEBOOK'):
-            b_number = book.get('bnumber')
+        book_name = book.get('bname', book_id)
+        for chapter in book.findall('CHAPTER'):
+            yield book_id, book_name, chapter.get('cnumber'), extract_verses(chapter)
 
-            # Megkeressük az ID-t (pl. "gen")
-            if b_number not in book_mapping:
-                print(f"Figyelem: Ismeretlen könyv ID: {b_number}, kihagyva.")
+def iter_chapters_streaming(input_file):
+    """
+    Streaming út: iterparse-szal fejezetenként dolgozunk, és a feldolgozott
+    CHAPTER/BIBLEBOOK elemeket azonnal ürítjük, így a memóriahasználat
+    nem függ a forrásfájl méretétől.
+    """
+    with open(input_file, 'rb') as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        book_id = None
+        book_name = None
+
+        for event, elem in context:
+            if event == "start":
+                # A bnumber attribútum már a nyitó tagnél elérhető
+                if elem.tag == 'BIBLEBOOK':
+                    book_id = resolve_book_id(elem.get('bnumber'))
+                    book_name = elem.get('bname', book_id)
+                    if book_id is not None:
+                        print(f"Feldolgozás: {book_id}...")
                 continue
 
-            book_id = book_mapping[b_number]
-            print(f"Feldolgozás: {book_id}...")
+            if elem.tag == 'CHAPTER':
+                if book_id is not None:
+                    yield book_id, book_name, elem.get('cnumber'), extract_verses(elem)
+                elem.clear()
+            elif elem.tag == 'BIBLEBOOK':
+                elem.clear()
+                # A gyökérről is leválasztjuk a már kész könyveket
+                root.clear()
+
+def iter_books(chapters):
+    """A (book_id, bname, cnumber, versek) folyamot könyvenként csoportosítja."""
+    current_id = None
+    current_name = None
+    current = []
+    for book_id, book_name, c_number, verses in chapters:
+        if book_id != current_id and current:
+            yield current_id, current_name, current
+            current = []
+        current_id = book_id
+        current_name = book_name
+        current.append((c_number, verses))
+    if current:
+        yield current_id, current_name, current
+
+def convert_serial(chapters, output_dir, settings, previous_digests):
+    return [write_book(book_id, book_name, book_chapters, output_dir, settings, previous_digests)
+            for book_id, book_name, book_chapters in iter_books(chapters)]
+
+def convert_parallel(chapters, output_dir, settings, previous_digests, workers):
+    """
+    A könyveket process poolra osztja szét. A szülő folyamat csak az XML-t
+    olvassa, a JSON előállítása és kiírása a workerekben fut. Egyszerre
+    legfeljebb 2 * workers könyv várakozhat, hogy a memória korlátos maradjon.
+    """
+    results = []
+    pending = set()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for book_id, book_name, book_chapters in iter_books(chapters):
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results.extend(fut.result() for fut in done)
+            book_digests = {k: v for k, v in previous_digests.items()
+                            if k.startswith(f"{book_id}_") or k == f"{book_id}{PACK_SUFFIX}"}
+            pending.add(pool.submit(write_book, book_id, book_name, book_chapters,
+                                    output_dir, settings, book_digests))
+        results.extend(fut.result() for fut in pending)
+
+    results.sort(key=lambda r: bible_books.by_id(r[0]).number)
+    return results
+
+def print_timings(results, wall):
+    print(f"\n{'könyv':<8} {'fejezet':>7} {'írt':>5} {'idő (s)':>9}")
+    for book_id, count, written, elapsed, _ in results:
+        print(f"{book_id:<8} {count:>7} {written:>5} {elapsed:>9.3f}")
+    busy = sum(r[3] for r in results)
+    print(f"Összesen: {sum(r[1] for r in results)} fejezet, {sum(r[2] for r in results)} kiírva, "
+          f"könyvidők összege {busy:.2f}s, falióra {wall:.2f}s")
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_manifest(output_dir, manifest):
+    # Átmeneti fájlba írunk és cserélünk, hogy félbeszakadt futás ne hagyjon sérült manifestet
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def is_up_to_date(manifest, source_hash, settings, output_dir):
+    if manifest.get("source_sha256") != source_hash or manifest.get("settings") != settings:
+        return False
+    chapters = manifest.get("chapters", {})
+    return bool(chapters) and all(
+        os.path.exists(os.path.join(output_dir, name))
+        for chapter in chapters for name in output_files(chapter, settings))
+
+def remove_stale_files(output_dir, generated, settings):
+    """
+    Minden futás végén: törli a konverter által írható, de a mostani kimenethez
+    nem tartozó fájlokat -- a forrásból eltűnt fejezeteket, a kikapcsolt
+    előtömörítés .gz/.br maradékait (különben a szerver a régi tartalmat
+    szolgálná ki), és az árva .gz/.br testvéreket. A manifesttől független,
+    így --force után is lefut.
+    """
+    expected = {name for filename in generated for name in output_files(filename, settings)}
+    for name in sorted(os.listdir(output_dir)):
+        if name in expected or not GENERATED_FILE_RE.match(name):
+            continue
+        os.remove(os.path.join(output_dir, name))
+        print(f"Elavult fájl törölve: {name}")
+
+def convert_xml_to_json(input_file=INPUT_FILE, output_dir=OUTPUT_DIR,
+                        version_name=VERSION_NAME, lang_code=LANG_CODE,
+                        streaming=True, workers=1, force=False,
+                        output_format="pretty", precompress=False, pack=False):
+    settings = {"name": version_name, "lang": lang_code,
+                "format": output_format, "precompress": precompress, "pack": pack}
+    if precompress and brotli is None:
+        print("Figyelem: a 'brotli' csomag nincs telepítve, csak .gz készül.")
+    source_hash = file_sha256(input_file)
+
+    # Mappa létrehozása
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        print(f"Mappa létrehozva: {output_dir}")
+
+    manifest = {} if force else load_manifest(output_dir)
+
+    if is_up_to_date(manifest, source_hash, settings, output_dir):
+        print("Nincs változás a forrásban, nincs mit generálni.")
+        remove_stale_files(output_dir, list(manifest["chapters"]) + version_meta_files(settings), settings)
+        return manifest.get("chapter_counts", {})
+
+    # Fejezetenként összevetjük az új tartalom digestjét a régivel, csak az eltérőket írjuk
+    previous_digests = manifest.get("chapters", {})
+
+    if output_format == "compact":
+        write_version_meta(output_dir, settings)
+
+    print("XML elemzése... (ez eltarthat egy pillanatig)")
+    chapters = iter_chapters_streaming(input_file) if streaming else iter_chapters_tree(input_file)
+
+    start = time.perf_counter()
+    if workers > 1:
+        results = convert_parallel(chapters, output_dir, settings, previous_digests, workers)
+    else:
+        results = convert_serial(chapters, output_dir, settings, previous_digests)
+    print_timings(results, time.perf_counter() - start)
+
+    digests = {}
+    chapter_counts = {}
+    for result in results:
+        digests.update(result[4])
+        chapter_counts[result[0]] = result[1]
+
+    # A forrásból eltűnt fejezetek és a már nem generált testvérfájlok törlése
+    remove_stale_files(output_dir, list(digests) + version_meta_files(settings), settings)
+
+    save_manifest(output_dir, {
+        "source": os.path.basename(input_file),
+        "source_sha256": source_hash,
+        "settings": settings,
+        "chapters": digests,
+        "chapter_counts": chapter_counts,
+    })
+
+    print("Kész! Az összes JSON fájl generálva.")
+    return chapter_counts
+
+def load_registry(registry_path):
+    """
+    A fordítás-registry beolvasása. A relatív útvonalakat a registry
+    fájlhoz képest oldjuk fel, hogy bármelyik mappából futtatható legyen.
+    """
+    with open(registry_path, 'r', encoding='utf-8') as f:
+        registry = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(registry_path))
+
+    def resolve(path):
+        return path if os.path.isabs(path) else os.path.join(base_dir, path)
+
+    registry["output_root"] = resolve(registry.get("output_root", "bibles"))
+    registry["structures_dir"] = resolve(registry.get("structures_dir", STRUCTURES_DIR))
+    for entry in registry["translations"]:
+        entry["input"] = resolve(entry["input"])
+    return registry
+
+def convert_translation(entry, output_root, force, output_format, precompress, pack):
+    """Egy registry bejegyzés konvertálása a saját bibles/<id>/ mappájába."""
+    output_dir = os.path.join(output_root, entry["id"])
+    print(f"[{entry['id']}] {os.path.basename(entry['input'])} -> {output_dir}")
+    counts = convert_xml_to_json(entry["input"], output_dir, entry["name"], entry["lang"],
+                                 force=force, output_format=output_format,
+                                 precompress=precompress, pack=pack)
+    return entry["id"], counts
+
+def write_json_like(path, data):
+    """JSON írása úgy, hogy a meglévő fájl sorvége (CRLF/LF) megmaradjon."""
+    newline = '\n'
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            if '\r\n' in f.read():
+                newline = '\r\n'
+    with open(path, 'w', encoding='utf-8', newline=newline) as f:
+        f.write(json.dumps(data, ensure_ascii=False, indent=2))
+
+def update_structures(structures_dir, entries, counts_by_id):
+    """
+    A versions.json és structures.json frissítése a ténylegesen feldolgozott
+    adatokból. A fejezetszámok kulcsai a kanonikus könyv ID-k (bible_books.py),
+    a nem könyv kulcsokat (pl. "note") megtartjuk.
+    """
+    book_ids = [book.id for book in bible_books.BOOKS]
+
+    versions_path = os.path.join(structures_dir, "versions.json")
+    structures_path = os.path.join(structures_dir, "structures.json")
+    with open(versions_path, 'r', encoding='utf-8') as f:
+        versions = json.load(f)
+    with open(structures_path, 'r', encoding='utf-8') as f:
+        structures = json.load(f)
+
+    built = {}
+    for entry in entries:
+        counts = counts_by_id.get(entry["id"])
+        if not counts:
+            continue
+        structure_key = entry.get("structure", entry["id"])
+        parsed = {book_id: counts[book_id] for book_id in book_ids if book_id in counts}
+
+        if structure_key in built and built[structure_key] != parsed:
+            print(f"Figyelem: '{structure_key}' struktúra eltér a fordítások között, "
+                  f"a(z) {entry['id']} adatai maradnak.")
+        built[structure_key] = parsed
+
+        version = versions.get(entry["id"], {})
+        version.update({
+            "name": entry["name"],
+            "lang": entry.get("lang_label", entry["lang"]),
+            "structure": structure_key,
+            "path": entry["id"],
+        })
+        versions[entry["id"]] = version
+
+    for structure_key, parsed in built.items():
+        extra = {k: v for k, v in structures.get(structure_key, {}).items()
+                 if k not in book_ids}
+        structures[structure_key] = {**extra, **parsed}
 
-            for chapter in book.findall('CHAPTER'):
-                c_number = chapter.get('cnumber')
+    write_json_like(versions_path, versions)
+    write_json_like(structures_path, structures)
+    print(f"Frissítve: {versions_path}, {structures_path}")
 
-                json_content = {
-                    "version_meta": {
-                        "name": VERSION_NAME,
-                        "lang": LANG_CODE
-                    },
-                    "verses": {}
-                }
-                for verse in chapter.findall('VERS'):
-                    v_number = verse.get('vnumber')
-                    words = []
-                    for gr in verse.findall('gr'):
-                        if gr.text:
-                            words.append(gr.text)
-                    
-                    verse_text = " ".join(words)
+def convert_registry(registry_path, workers=1, force=False,
+                     output_format="pretty", precompress=False, pack=False):
+    """Minden registry-beli fordítás konvertálása párhuzamosan, majd a struktúrák frissítése."""
+    registry = load_registry(registry_path)
+    entries = registry["translations"]
+    counts_by_id = {}
 
-                    if verse_text:
-                        verse_text = verse_text.replace('\n', ' ').strip()
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(convert_translation, entry, registry["output_root"], force,
+                               output_format, precompress, pack): entry
+                   for entry in entries}
+        for fut in futures:
+            entry = futures[fut]
+            try:
+                translation_id, counts = fut.result()
+                counts_by_id[translation_id] = counts
+            except FileNotFoundError:
+                print(f"HIBA: Nem találom a fájlt: {entry['input']} ({entry['id']} kihagyva)")
 
+    update_structures(registry["structures_dir"], entries, counts_by_id)
 
-                        key = f"{book_id}-{c_number}-{v_number}"
-                        json_content["verses"][key] = verse_text
+def benchmark(input_file, version_name=VERSION_NAME, lang_code=LANG_CODE):
+    """Idő és csúcsmemória összehasonlítása a fa alapú és a streaming út között."""
+    size_mb = os.path.getsize(input_file) / (1024 * 1024)
+    print(f"Benchmark: {input_file} ({size_mb:.1f} MB)")
 
-                filename = f"{book_id}_{c_number}.json"
-                filepath = os.path.join(OUTPUT_DIR, filename)
+    results = []
+    for label, streaming in (("tree", False), ("streaming", True)):
+        tmp_dir = tempfile.mkdtemp(prefix="xml_to_json_bench_")
+        try:
+            tracemalloc.start()
+            start = time.perf_counter()
+            chapters = (iter_chapters_streaming(input_file) if streaming
+                        else iter_chapters_tree(input_file))
+            settings = {"name": version_name, "lang": lang_code,
+                        "format": "pretty", "precompress": False, "pack": False}
+            convert_serial(chapters, tmp_dir, settings, {})
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            files = len(os.listdir(tmp_dir))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        results.append((label, elapsed, peak / (1024 * 1024), files))
 
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(json_content, f, ensure_ascii=False, indent=2)
+    print(f"\n{'mód':<10} {'idő (s)':>9} {'csúcs (MB)':>11} {'fájlok':>7}")
+    for label, elapsed, peak_mb, files in results:
+        print(f"{label:<10} {elapsed:>9.2f} {peak_mb:>11.1f} {files:>7}")
 
-        print("Kész! Az összes JSON fájl generálva.")
+def parse_args():
+    parser = argparse.ArgumentParser(description="Zefania/SF XML -> fejezetenkénti JSON")
+    parser.add_argument("--input", default=INPUT_FILE, help="Forrás XML fájl")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="Kimeneti mappa")
+    parser.add_argument("--name", default=VERSION_NAME, help="Fordítás neve (version_meta.name)")
+    parser.add_argument("--lang", default=LANG_CODE, help="Nyelvkód (version_meta.lang)")
+    parser.add_argument("--tree", action="store_true",
+                        help="A régi, teljes fát felépítő út használata streaming helyett")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Párhuzamos worker folyamatok száma (könyvenként, "
+                             "registry módban fordításonként)")
+    parser.add_argument("--registry",
+                        help="Fordítás-registry JSON; minden fordítást konvertál és "
+                             "frissíti a versions.json / structures.json fájlokat")
+    parser.add_argument("--force", action="store_true",
+                        help="A manifest figyelmen kívül hagyása, minden fejezet újraírása")
+    parser.add_argument("--format", choices=["pretty", "compact"], default="pretty",
+                        help="compact: tömör JSON, versszám kulcsok, version_meta külön fájlban")
+    parser.add_argument("--precompress", action="store_true",
+                        help=".gz (és ha elérhető, .br) testvérfájlok generálása")
+    parser.add_argument("--pack", action="store_true",
+                        help="Könyvenkénti .pack fájl (verse_pack.py) a fejezet JSON-ok mellé")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Idő/memória összehasonlítás a fa alapú és a streaming út között")
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        convert_xml_to_json()
+        if args.benchmark:
+            benchmark(args.input, args.name, args.lang)
+        elif args.registry:
+            convert_registry(args.registry, workers=args.workers, force=args.force,
+                             output_format=args.format, precompress=args.precompress,
+                             pack=args.pack)
+        else:
+            convert_xml_to_json(args.input, args.output, args.name, args.lang,
+                                streaming=not args.tree, workers=args.workers,
+                                force=args.force, output_format=args.format,
+                                precompress=args.precompress, pack=args.pack)
     except FileNotFoundError:
-        print(f"HIBA: Nem találom a fájlt: {INPUT_FILE}")
-        print("Kérlek ellenőrizd, hogy a Python script mellett van-e az XML fájl!")
\ No newline at end of file
+        print(f"HIBA: Nem találom a fájlt: {args.input}")
+        print("Kérlek ellenőrizd, hogy a Python script mellett van-e az XML fájl!")
@@ -0,0 +1,379 @@
+"""
+Async fetch engine for bible-api.com.
+
+bible-api.com allows 15 requests per 30 seconds per IP. Instead of a fixed
+sleep before every request, a token bucket paces all workers together just
+under that limit, requests share one keep-alive connection pool, and a 429
+pauses the whole bucket for the server's Retry-After before retrying.
+
+The base URL is configurable, so the engine can be pointed at the local
+mock server below:
+
+    python bible_api.py --mock-server 8765
+    python getVerses.py --base-url http://127.0.0.1:8765
+
+Sending requests needs httpx (pip install httpx). It is imported only when
+a client is created, so query planning, the mock server and offline
+getVerses runs work without it.
+"""
+import argparse
+import asyncio
+import email.utils
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import bible_books
+from bible_refs import VerseRef
+
+BASE_URL = "https://bible-api.com"
+# 15 requests / 30 s is the documented limit, stay a little below it
+DEFAULT_RATE = 0.48
+DEFAULT_BURST = 1
+DEFAULT_CONCURRENCY = 4
+MAX_RETRIES = 5
+# Keeps batched query URLs at a sane length
+MAX_QUERY_PARTS = 30
+
+
+def _merge_intervals(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[List[int]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def plan_queries(refs: Iterable[VerseRef]) -> Dict[str, List[str]]:
+    """
+    Groups references by book and chapter into as few bible-api.com queries
+    as possible. Neighbouring and overlapping verses of a chapter are merged
+    into ranges, and the chapters of a book are chained into one comma list
+    ('Psalm+23:1-4,6,103:2-5'), split every MAX_QUERY_PARTS parts. Whole
+    chapters (and open-ended references) get a query of their own, since a
+    bare chapter number inside a list would be read as a verse.
+    The per-reference text is cut back out of the `verses` array of the
+    responses (see VerseRef.contains).
+    """
+    groups: Dict[Tuple[str, int], Optional[List[Tuple[int, int]]]] = {}
+    for ref in refs:
+        key = (ref.book, ref.chapter)
+        if ref.verse_start is None or ref.verse_end is None:
+            groups[key] = None
+        elif groups.get(key, []) is not None:
+            groups.setdefault(key, []).append((ref.verse_start, ref.verse_end))
+
+    plan: Dict[str, List[str]] = {}
+    chained: Dict[str, List[str]] = {}
+    for (book_id, chapter), intervals in sorted(groups.items()):
+        name = bible_books.by_id(book_id).en.replace(' ', '+')
+        if intervals is None:
+            plan.setdefault(book_id, []).append(f"{name}+{chapter}")
+            continue
+        parts = chained.setdefault(book_id, [])
+        for i, (start, end) in enumerate(_merge_intervals(intervals)):
+            verses = f"{start}" if start == end else f"{start}-{end}"
+            parts.append(f"{chapter}:{verses}" if i == 0 else verses)
+
+    for book_id, parts in chained.items():
+        name = bible_books.by_id(book_id).en.replace(' ', '+')
+        for i in range(0, len(parts), MAX_QUERY_PARTS):
+            chunk = parts[i:i + MAX_QUERY_PARTS]
+            if ':' not in chunk[0]:
+                # The chunk starts mid-chapter: repeat the chapter number
+                chapter = next(p for p in reversed(parts[:i]) if ':' in p).split(':')[0]
+                chunk = [f"{chapter}:{chunk[0]}"] + chunk[1:]
+            plan.setdefault(book_id, []).append(f"{name}+{','.join(chunk)}")
+    return plan
+
+
+def is_not_found(data: dict) -> bool:
+    """The API's definite "no such verse" answer, the only error that is safe to cache."""
+    return str(data.get("error", "")).lower() == "not found"
+
+
+def combine_responses(responses: List[Optional[dict]]) -> Optional[dict]:
+    """
+    Merges the responses of all queries of a book into one `verses` list.
+    None if any of them failed, so a partial result never gets cached.
+    """
+    if any(data is None for data in responses):
+        return None
+    if len(responses) == 1:
+        return responses[0]
+    return {**responses[0], "verses": [v for data in responses for v in data.get("verses", [])]}
+
+
+class BibleApiError(Exception):
+    """A response that is neither data nor a definite not-found (400, 401, 403, ...)."""
+
+
+class TokenBucket:
+    """Shared request pacer: `rate` tokens per second, at most `capacity` saved up."""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Blocks every worker for `seconds` (server asked us to back off)."""
+        now = time.monotonic()
+        self._blocked_until = max(self._blocked_until, now + seconds)
+        self._tokens = 0
+        self._updated = self._blocked_until
+
+
+def require_httpx():
+    """Imports httpx on first use, with an install hint instead of a bare ModuleNotFoundError."""
+    try:
+        import httpx
+    except ModuleNotFoundError as e:
+        raise ModuleNotFoundError("Fetching from bible-api.com needs httpx: pip install httpx",
+                                  name="httpx") from e
+    return httpx
+
+
+def parse_retry_after(value: Optional[str], default: float) -> float:
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+        return max(0.0, when.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class BibleApiClient:
+    """
+    Usage:
+        async with BibleApiClient() as client:
+            results = await client.fetch_all([("John+3:16", "web"), ...])
+    Each result is the decoded JSON response (an empty not-found response if
+    the verse does not exist, see is_not_found), or None if the request
+    could not be completed.
+    """
+
+    def __init__(self, base_url: str = BASE_URL, rate: float = DEFAULT_RATE,
+                 burst: float = DEFAULT_BURST, concurrency: int = DEFAULT_CONCURRENCY,
+                 max_retries: int = MAX_RETRIES, timeout: float = 30.0, transport=None):
+        self._httpx = require_httpx()
+        self.base_url = base_url.rstrip('/')
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        # An httpx transport to send the requests through instead of the network (tests)
+        self.transport = transport
+        self.stats = {"requests": 0, "ok": 0, "failed": 0, "rate_limited": 0, "retries": 0,
+                      "not_found": 0}
+        self._client = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self):
+        limits = self._httpx.Limits(max_connections=self.concurrency,
+                                    max_keepalive_connections=self.concurrency)
+        self._client = self._httpx.AsyncClient(base_url=self.base_url, limits=limits,
+                                               timeout=self.timeout, transport=self.transport)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._client.aclose()
+
+    async def fetch(self, query: str, translation: str) -> Optional[dict]:
+        """
+        Fetches one bible-api.com query (e.g. 'Matthew+8:8') in one translation.
+        Returns the decoded response, an empty not-found response if the API
+        has no such verse (404 or its "not found" body: a definite answer,
+        safe to cache), or None if the request kept failing. A garbled 200
+        body (HTML error page, cut-off JSON) is retried like a network error.
+        Any other error status raises BibleApiError.
+        """
+        async with self._slots:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self.stats["retries"] += 1
+                await self.bucket.acquire()
+                self.stats["requests"] += 1
+                try:
+                    response = await self._client.get(f"/{query}", params={"translation": translation})
+                except self._httpx.HTTPError as e:
+                    print(f"  -> Error fetching {query} ({translation}): {e!r}")
+                    await asyncio.sleep(min(60, 2 ** attempt))
+                    continue
+
+                if response.status_code == 429:
+                    self.stats["rate_limited"] += 1
+                    wait = parse_retry_after(response.headers.get("Retry-After"), 5 * 2 ** attempt)
+                    print(f"  -> Rate limited on {query} ({translation}), waiting {wait:.1f}s")
+                    self.bucket.pause(wait)
+                    continue
+                if response.status_code >= 500:
+                    await asyncio.sleep(min(60, 2 ** attempt))
+                    continue
+                if response.status_code == 404:
+                    # The verse is missing from this translation (common with YLT)
+                    if translation != 'ylt':
+                        print(f"  -> Not found: {query} ({translation})")
+                    self.stats["not_found"] += 1
+                    return {"verses": [], "text": "", "error": "not found"}
+                if response.status_code != 200:
+                    raise BibleApiError(f"HTTP {response.status_code} for {query} ({translation})")
+
+                try:
+                    data = response.json()
+                    if not isinstance(data, dict):
+                        raise ValueError(f"unexpected {type(data).__name__} body")
+                except ValueError as e:
+                    print(f"  -> Unreadable response for {query} ({translation}): {e}")
+                    await asyncio.sleep(min(60, 2 ** attempt))
+                    continue
+                if is_not_found(data):
+                    print(f"  -> Not found: {query} ({translation})")
+                    self.stats["not_found"] += 1
+                    return {"verses": [], "text": "", "error": "not found"}
+                if 'error' in data:
+                    raise BibleApiError(f"API error for {query} ({translation}): {data['error']}")
+                self.stats["ok"] += 1
+                return data
+
+        self.stats["failed"] += 1
+        return None
+
+    async def fetch_all(self, jobs: Sequence[Tuple[str, str]],
+                        on_result: Optional[Callable[[int, Optional[dict]], None]] = None) -> List[Optional[dict]]:
+        """
+        Fetches (query, translation) jobs concurrently, results in job order.
+        on_result(index, result) is called as soon as each job finishes.
+        A job that raised BibleApiError is reported and its result is None.
+        """
+        async def run(index: int, query: str, translation: str) -> Optional[dict]:
+            try:
+                data = await self.fetch(query, translation)
+            except BibleApiError as e:
+                print(f"  -> {e}")
+                self.stats["failed"] += 1
+                data = None
+            if on_result:
+                on_result(index, data)
+            return data
+        return list(await asyncio.gather(*(run(i, query, translation) for i, (query, translation) in enumerate(jobs))))
+
+
+def fetch_all(jobs: Sequence[Tuple[str, str]], on_result: Optional[Callable[[int, Optional[dict]], None]] = None,
+              **client_options) -> Tuple[List[Optional[dict]], Dict[str, int]]:
+    """Synchronous entry point for scripts: returns (results, stats)."""
+    async def run():
+        async with BibleApiClient(**client_options) as client:
+            return await client.fetch_all(jobs, on_result), client.stats
+    return asyncio.run(run())
+
+
+# ---------------------------------------------------------------------------
+# Local mock server (same URL scheme and rate limit as bible-api.com)
+# ---------------------------------------------------------------------------
+
+_QUERY_RE = re.compile(r'^(?P<book>.+?)\+(?P<chapter>\d+)(?::(?P<verses>[\d,:\-]+))?$')
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    limit = 15
+    window = 30.0
+    hits: List[float] = []
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict, headers: Optional[Dict[str, str]] = None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        now = time.monotonic()
+        with self.lock:
+            self.hits[:] = [t for t in self.hits if now - t < self.window]
+            if len(self.hits) >= self.limit:
+                retry = self.window - (now - self.hits[0])
+                self._send(429, {"error": "Too Many Requests"}, {"Retry-After": str(int(retry) + 1)})
+                return
+            self.hits.append(now)
+
+        url = urlsplit(self.path)
+        translation = parse_qs(url.query).get("translation", ["web"])[0]
+        match = _QUERY_RE.match(url.path.lstrip('/'))
+        if not match:
+            self._send(404, {"error": "not found"})
+            return
+
+        # Same list grammar as bible-api.com: "23:1-4,6,103:2-5"
+        book, chapter = match["book"].replace('+', ' '), int(match["chapter"])
+        verses = []
+        for part in (match["verses"] or "1-20").split(','):
+            if ':' in part:
+                chapter_text, part = part.split(':')
+                chapter = int(chapter_text)
+            start, _, end = part.partition('-')
+            verses.extend({"book_name": book, "chapter": chapter, "verse": v,
+                           "text": f"{book} {chapter}:{v} ({translation})\n"}
+                          for v in range(int(start), int(end or start) + 1))
+        time.sleep(random.uniform(0.02, 0.1))
+        self._send(200, {"reference": url.path.lstrip('/'), "verses": verses,
+                         "text": "".join(v["text"] for v in verses), "translation_id": translation})
+
+
+def run_mock_server(port: int, limit: int = 15, window: float = 30.0):
+    _MockHandler.limit, _MockHandler.window = limit, window
+    server = ThreadingHTTPServer(("127.0.0.1", port), _MockHandler)
+    print(f"Mock bible-api listening on http://127.0.0.1:{port} ({limit} requests / {window:g}s)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="bible-api.com fetch engine / mock server")
+    parser.add_argument("--mock-server", type=int, metavar="PORT", help="Run the local mock API on PORT")
+    parser.add_argument("--limit", type=int, default=15, help="Mock: requests allowed per window")
+    parser.add_argument("--window", type=float, default=30.0, help="Mock: rate limit window in seconds")
+    args = parser.parse_args()
+    if args.mock_server:
+        run_mock_server(args.mock_server, args.limit, args.window)
+    else:
+        parser.print_help()
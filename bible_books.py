@@ -0,0 +1,149 @@
+"""
+Canonical book table shared by every script in the repo.
+
+The canonical ID is the frontend one (translation_structures/books.json:
+"gen", "exo", "mar", ...). Every other naming used in the pipeline -- the
+old xml_to_json IDs ("ex", "mark"), the tagger IDs ("exod", "1chron"),
+USFM codes ("EXO"), the abbreviations in Topics/topics.json ("Exod",
+"1 Kgs"), English and Hungarian book names -- is an alias that resolves to
+the same interned Book in a single dict lookup.
+"""
+import json
+import os
+import sys
+import unicodedata
+from typing import Dict, NamedTuple, Optional, Tuple, Union
+
+
+class Book(NamedTuple):
+    number: int      # 1-66, same as the SF/Zefania bnumber
+    id: str          # canonical (frontend) ID
+    usfm: str
+    en: str          # English name as used by bible-api.com / scripturememory.com
+    hu: str          # Hungarian name as in the HUNUJ XML (bname)
+
+
+# number, id, usfm, en, hu, extra aliases
+_TABLE = [
+    (1, "gen", "GEN", "Genesis", "1 Mózes", ("gn",)),
+    (2, "exo", "EXO", "Exodus", "2 Mózes", ("ex", "exod")),
+    (3, "lev", "LEV", "Leviticus", "3 Mózes", ("lv",)),
+    (4, "num", "NUM", "Numbers", "4 Mózes", ("nm",)),
+    (5, "deu", "DEU", "Deuteronomy", "5 Mózes", ("deut", "dt")),
+    (6, "jos", "JOS", "Joshua", "Józsué", ("josh",)),
+    (7, "jdg", "JDG", "Judges", "Bírák", ("judg",)),
+    (8, "rut", "RUT", "Ruth", "Ruth", ("ru",)),
+    (9, "1sa", "1SA", "1 Samuel", "1 Sámuel", ("1sam",)),
+    (10, "2sa", "2SA", "2 Samuel", "2 Sámuel", ("2sam",)),
+    (11, "1ki", "1KI", "1 Kings", "1 Királyok", ("1kgs", "1kings")),
+    (12, "2ki", "2KI", "2 Kings", "2 Királyok", ("2kgs", "2kings")),
+    (13, "1ch", "1CH", "1 Chronicles", "1 Krónikák", ("1chr", "1chron")),
+    (14, "2ch", "2CH", "2 Chronicles", "2 Krónika", ("2chr", "2chron", "2 Krónikák")),
+    (15, "ezr", "EZR", "Ezra", "Ezsdrás", ()),
+    (16, "neh", "NEH", "Nehemiah", "Nehemiás", ()),
+    (17, "est", "EST", "Esther", "Eszter", ("esth",)),
+    (18, "job", "JOB", "Job", "Jób", ()),
+    (19, "psa", "PSA", "Psalm", "Zsoltárok", ("ps", "pss", "psalms")),
+    (20, "pro", "PRO", "Proverbs", "Példabeszédek", ("prov", "prv")),
+    (21, "ecc", "ECC", "Ecclesiastes", "Prédikátor", ("eccl", "qoh")),
+    (22, "sng", "SNG", "Song of Solomon", "Énekek éneke", ("song", "song of songs", "cant")),
+    (23, "isa", "ISA", "Isaiah", "Ézsaiás", ()),
+    (24, "jer", "JER", "Jeremiah", "Jeremiás", ()),
+    (25, "lam", "LAM", "Lamentations", "Jeremiás siralmai", ()),
+    (26, "eze", "EZK", "Ezekiel", "Ezékiel", ("ezek",)),
+    (27, "dan", "DAN", "Daniel", "Dániel", ("dn",)),
+    (28, "hos", "HOS", "Hosea", "Hóseás", ()),
+    (29, "joe", "JOL", "Joel", "Jóel", ()),
+    (30, "amo", "AMO", "Amos", "Ámósz", ()),
+    (31, "oba", "OBA", "Obadiah", "Abdiás", ("obad",)),
+    (32, "jon", "JON", "Jonah", "Jónás", ()),
+    (33, "mic", "MIC", "Micah", "Mikeás", ()),
+    (34, "nah", "NAM", "Nahum", "Náhum", ()),
+    (35, "hab", "HAB", "Habakkuk", "Habakuk", ()),
+    (36, "zep", "ZEP", "Zephaniah", "Zofóniás", ("zeph",)),
+    (37, "hag", "HAG", "Haggai", "Haggeus", ()),
+    (38, "zec", "ZEC", "Zechariah", "Zakariás", ("zech",)),
+    (39, "mal", "MAL", "Malachi", "Malakiás", ()),
+    (40, "mat", "MAT", "Matthew", "Máté", ("matt", "mt")),
+    (41, "mar", "MRK", "Mark", "Márk", ("mk",)),
+    (42, "luk", "LUK", "Luke", "Lukács", ("lk",)),
+    (43, "joh", "JHN", "John", "János", ("jn",)),
+    (44, "act", "ACT", "Acts", "Apostolok cselekedetei", ()),
+    (45, "rom", "ROM", "Romans", "Rómaiakhoz", ()),
+    (46, "1co", "1CO", "1 Corinthians", "1 Korintusi", ("1cor",)),
+    (47, "2co", "2CO", "2 Corinthians", "2 Korintusi", ("2cor",)),
+    (48, "gal", "GAL", "Galatians", "Galatákhoz", ()),
+    (49, "eph", "EPH", "Ephesians", "Efézusiakhoz", ()),
+    (50, "phi", "PHP", "Philippians", "Filippiekhez", ("phil",)),
+    (51, "col", "COL", "Colossians", "Kolosséiakhoz", ()),
+    (52, "1th", "1TH", "1 Thessalonians", "1 Thesszalonika", ("1thess",)),
+    (53, "2th", "2TH", "2 Thessalonians", "2 Thesszalonika", ("2thess",)),
+    (54, "1ti", "1TI", "1 Timothy", "1 Timóteushoz", ("1tim",)),
+    (55, "2ti", "2TI", "2 Timothy", "2 Timóteushoz", ("2tim",)),
+    (56, "tit", "TIT", "Titus", "Tituszhoz", ()),
+    (57, "phm", "PHM", "Philemon", "Filemonhoz", ("phlm", "philem")),
+    (58, "heb", "HEB", "Hebrews", "Zsidókhoz", ()),
+    (59, "jam", "JAS", "James", "Jakab", ("jas",)),
+    (60, "1pe", "1PE", "1 Peter", "1 Péter", ("1pet",)),
+    (61, "2pe", "2PE", "2 Peter", "2 Péter", ("2pet",)),
+    (62, "1jo", "1JN", "1 John", "1 János", ("1jn",)),
+    (63, "2jo", "2JN", "2 John", "2 János", ("2jn",)),
+    (64, "3jo", "3JN", "3 John", "3 János", ("3jn",)),
+    (65, "jud", "JUD", "Jude", "Júdás", ()),
+    (66, "rev", "REV", "Revelation", "Jelenések", ("rv",)),
+]
+
+
+def normalize_alias(name: str) -> str:
+    """'1 Pet.' / '1Pet' / '1 PET' -> '1pet'."""
+    name = unicodedata.normalize('NFC', name)
+    return "".join(name.replace('.', ' ').split()).lower()
+
+
+def _build() -> Tuple[Tuple[Book, ...], Dict[str, Book]]:
+    books = []
+    aliases: Dict[str, Book] = {}
+    for number, book_id, usfm, en, hu, extra in _TABLE:
+        book = Book(number, sys.intern(book_id), sys.intern(usfm), en, hu)
+        books.append(book)
+        for alias in (book_id, usfm, en, hu) + extra:
+            key = normalize_alias(alias)
+            other = aliases.setdefault(key, book)
+            if other is not book:
+                raise ValueError(f"Book alias '{alias}' is ambiguous: {other.id} / {book.id}")
+    return tuple(books), aliases
+
+
+BOOKS, _ALIASES = _build()
+_BY_ID = {book.id: book for book in BOOKS}
+
+
+def by_number(number: Union[int, str]) -> Optional[Book]:
+    """SF/Zefania bnumber (1-66, int or string) -> Book."""
+    try:
+        index = int(number)
+    except (TypeError, ValueError):
+        return None
+    return BOOKS[index - 1] if 1 <= index <= len(BOOKS) else None
+
+
+def by_id(book_id: str) -> Optional[Book]:
+    return _BY_ID.get(book_id)
+
+
+def resolve(name: str) -> Optional[Book]:
+    """Any known naming of a book -> Book, or None if it is not recognised."""
+    return _ALIASES.get(normalize_alias(name))
+
+
+if __name__ == "__main__":
+    # Consistency check against the frontend's book list
+    books_json = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "Frontend", "src", "assets", "translation_structures", "books.json")
+    with open(books_json, 'r', encoding='utf-8') as f:
+        frontend_ids = [book["id"] for book in json.load(f)]
+    table_ids = [book.id for book in BOOKS]
+    if frontend_ids != table_ids:
+        print(f"MISMATCH with {books_json}")
+        sys.exit(1)
+    print(f"OK: {len(BOOKS)} books, {len(_ALIASES)} aliases, matches books.json")
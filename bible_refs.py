@@ -0,0 +1,359 @@
+"""
+Scripture reference parser.
+
+Turns free-form reference lists such as the ones in Topics/topics.json
+("Isa 53:4-5", "Ps 103:2,3", "Proverbs 11:4–10, 18–21, 23,", "Psalm 46",
+"3 John 2", "Ps 103:2-104:3", "Matt 8:8; 13:15", "Ps 23:1a, 3",
+"John 3:16 and 17", "Rom 8:28ff") into normalized
+VerseRef(book, chapter, verse_start, verse_end) tuples keyed by the
+canonical book IDs of bible_books.py.
+
+    verse_start == verse_end      single verse
+    verse_start <  verse_end      verse range inside one chapter
+    verse_start, verse_end=None   from verse_start to the end of the chapter
+    verse_start=None              the whole chapter
+
+Cross-chapter spans are split into one tuple per chapter. Verse-part
+suffixes ("1a", "4b-3:24") and connectives ("and", "és") are skipped, "ff"
+leaves the preceding verse open-ended and "f" adds the next verse.
+"""
+import json
+import random
+import re
+import sys
+import time
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import bible_books
+
+# Books that only have one chapter: "Jude 3" means Jude 1:3
+SINGLE_CHAPTER_BOOKS = frozenset({"oba", "phm", "2jo", "3jo", "jud"})
+# Words inside a reference that are never book names
+VERSE_PARTS = frozenset({"a", "b", "c"})
+VERSE_SUFFIXES = VERSE_PARTS | {"f", "ff"}
+CONNECTIVES = frozenset({"and", "és", "s"})
+
+_TOKEN_RE = re.compile(r"""
+      (?P<num>\d+)
+    | (?P<word>[^\W\d_]+\.?)
+    | (?P<colon>:)
+    | (?P<dash>[-‐‑‒–—])
+    | (?P<comma>,)
+    | (?P<sep>[;\n])
+    | (?P<space>\s+)
+    | (?P<other>.)
+""", re.VERBOSE)
+
+
+class VerseRef(NamedTuple):
+    book: str
+    chapter: int
+    verse_start: Optional[int] = None
+    verse_end: Optional[int] = None
+
+    @property
+    def whole_chapter(self) -> bool:
+        return self.verse_start is None
+
+    def contains(self, verse: int) -> bool:
+        if self.verse_start is None:
+            return True
+        if verse < self.verse_start:
+            return False
+        return self.verse_end is None or verse <= self.verse_end
+
+    def verse_id(self) -> Optional[str]:
+        """
+        Frontend verse ID of a closed reference, in the format of
+        DataService.parseVerseRef: "jer-29-11", or "exo-3-14-15" for a range.
+        None if its end is unknown (whole chapter or open-ended).
+        """
+        if self.verse_start is None or self.verse_end is None:
+            return None
+        return span_id(self.book, self.chapter, self.verse_start, self.verse_end)
+
+    def label(self) -> str:
+        """Human readable form, e.g. 'Isaiah 53:4-5'."""
+        name = bible_books.by_id(self.book).en
+        if self.verse_start is None:
+            return f"{name} {self.chapter}"
+        if self.verse_end is None:
+            return f"{name} {self.chapter}:{self.verse_start}ff"
+        if self.verse_end == self.verse_start:
+            return f"{name} {self.chapter}:{self.verse_start}"
+        return f"{name} {self.chapter}:{self.verse_start}-{self.verse_end}"
+
+
+def span_id(book_id: str, chapter: int, start: int, end: int) -> str:
+    if start == end:
+        return f"{book_id}-{chapter}-{start}"
+    return f"{book_id}-{chapter}-{start}-{end}"
+
+
+def tokenize(text: str) -> List[Tuple[str, str]]:
+    return [(m.lastgroup, m.group()) for m in _TOKEN_RE.finditer(text)
+            if m.lastgroup != "space"]
+
+
+class _Parser:
+    """Keeps the implied book/chapter context across fragments, like a reader would."""
+
+    def __init__(self, warn):
+        self.warn = warn
+        self.book: Optional[bible_books.Book] = None
+        self.chapter: Optional[int] = None
+        self.last: Optional[str] = None   # "verse" or "chapter": how to read a bare number after ','
+
+    def parse(self, text: str) -> List[VerseRef]:
+        self.tokens = tokenize(text)
+        self.i = 0
+        refs: List[VerseRef] = []
+
+        while self.i < len(self.tokens):
+            kind, value = self.tokens[self.i]
+            if kind == "sep":
+                self.chapter, self.last = None, None
+                self.i += 1
+            elif kind in ("comma", "dash", "colon", "other"):
+                self.i += 1
+            elif kind == "word" and self._is_filler(0):
+                self._read_filler(refs)
+            elif kind == "word" or (kind == "num" and self._peek(1) == "word" and not self._is_filler(1)):
+                self._read_book()
+            elif self.book is None:
+                self.warn(f"No book specified yet for '{value}' in '{text.strip()}'")
+                self._skip_to_separator()
+            else:
+                refs.extend(self._read_numbers(text))
+        return refs
+
+    def _peek(self, offset: int) -> Optional[str]:
+        j = self.i + offset
+        return self.tokens[j][0] if j < len(self.tokens) else None
+
+    def _value(self, offset: int = 0) -> int:
+        return int(self.tokens[self.i + offset][1])
+
+    def _is_part(self, offset: int) -> bool:
+        """A verse-part suffix ("4a") at offset: the verse still counts as a whole."""
+        j = self.i + offset
+        return (j < len(self.tokens) and self.tokens[j][0] == "word"
+                and self.tokens[j][1].rstrip(".").lower() in VERSE_PARTS)
+
+    def _is_filler(self, offset: int) -> bool:
+        word = self.tokens[self.i + offset][1].rstrip(".").lower()
+        return word in VERSE_SUFFIXES or word in CONNECTIVES
+
+    def _read_filler(self, refs: List[VerseRef]):
+        """A suffix right after a verse number ("28ff", "16f") may extend that verse."""
+        word = self.tokens[self.i][1].rstrip(".").lower()
+        follows_verse = (self.i > 0 and self.tokens[self.i - 1][0] == "num" and refs
+                         and self.last == "verse" and refs[-1].chapter == self.chapter
+                         and refs[-1].verse_end == int(self.tokens[self.i - 1][1]))
+        if follows_verse and word == "ff":
+            refs[-1] = refs[-1]._replace(verse_end=None)
+        elif follows_verse and word == "f":
+            refs[-1] = refs[-1]._replace(verse_end=refs[-1].verse_end + 1)
+        self.i += 1
+
+    def _skip_to_separator(self):
+        while self.i < len(self.tokens) and self.tokens[self.i][0] != "sep":
+            self.i += 1
+
+    def _read_book(self):
+        after_number = self.i > 0 and self.tokens[self.i - 1][0] == "num"
+        parts = []
+        if self.tokens[self.i][0] == "num":
+            parts.append(self.tokens[self.i][1])
+            self.i += 1
+        while self.i < len(self.tokens) and self.tokens[self.i][0] == "word":
+            parts.append(self.tokens[self.i][1])
+            self.i += 1
+
+        name = " ".join(parts)
+        book = bible_books.resolve(name)
+        if book is None and self.book is not None and after_number:
+            # A stray word right after a verse number: the previous book and chapter still apply
+            self.warn(f"Unknown book '{name}', ignored")
+            return
+        self.book = book
+        self.chapter, self.last = None, None
+        if self.book is None:
+            self.warn(f"Unknown book '{name}'")
+            self._skip_to_separator()
+
+    def _read_numbers(self, text: str) -> List[VerseRef]:
+        book_id = self.book.id
+        first = self._value()
+
+        # chapter:verse[-verse | -chapter:verse]
+        if self._peek(1) == "colon" and self._peek(2) == "num":
+            chapter, verse = first, self._value(2)
+            self.i += 3
+            self.chapter, self.last = chapter, "verse"
+            if self._is_part(0) and self._peek(1) == "dash":
+                self.i += 1   # "4a-5": the suffix does not end the range
+            if self._peek(0) == "dash" and self._peek(1) == "num":
+                if self._peek(2) == "colon" and self._peek(3) == "num":
+                    end_chapter, end_verse = self._value(1), self._value(3)
+                    self.i += 4
+                    self.chapter = end_chapter
+                    return self._span(book_id, chapter, verse, end_chapter, end_verse, text)
+                end = self._value(1)
+                self.i += 2
+                return self._verses(book_id, chapter, verse, end, text)
+            return self._verses(book_id, chapter, verse, verse, text)
+
+        end = first
+        part = 1 if self._is_part(1) and self._peek(2) == "dash" else 0
+        if self._peek(1 + part) == "dash" and self._peek(2 + part) == "num" and self._peek(3 + part) != "colon":
+            end = self._value(2 + part)
+            self.i += 3 + part
+        else:
+            self.i += 1
+
+        # A bare number continues a verse list, addresses a verse of a
+        # single-chapter book, or names whole chapter(s)
+        if self.last == "verse" and self.chapter is not None:
+            return self._verses(book_id, self.chapter, first, end, text)
+        if book_id in SINGLE_CHAPTER_BOOKS:
+            self.chapter, self.last = 1, "verse"
+            return self._verses(book_id, 1, first, end, text)
+
+        self.last = "chapter"
+        if end < first or first == 0:
+            self.warn(f"Invalid chapter range {first}-{end} in '{text.strip()}'")
+            return []
+        self.chapter = end
+        return [VerseRef(book_id, c) for c in range(first, end + 1)]
+
+    def _verses(self, book_id, chapter, start, end, text) -> List[VerseRef]:
+        if chapter == 0 or start == 0 or end < start:
+            self.warn(f"Invalid verse range {chapter}:{start}-{end} in '{text.strip()}'")
+            return []
+        return [VerseRef(book_id, chapter, start, end)]
+
+    def _span(self, book_id, chapter, verse, end_chapter, end_verse, text) -> List[VerseRef]:
+        if end_chapter == chapter:
+            return self._verses(book_id, chapter, verse, end_verse, text)
+        if end_chapter < chapter or 0 in (chapter, verse, end_verse):
+            self.warn(f"Invalid span {chapter}:{verse}-{end_chapter}:{end_verse} in '{text.strip()}'")
+            return []
+        refs = [VerseRef(book_id, chapter, verse, None)]
+        refs.extend(VerseRef(book_id, c) for c in range(chapter + 1, end_chapter))
+        refs.append(VerseRef(book_id, end_chapter, 1, end_verse))
+        return refs
+
+
+def _print_warning(message: str):
+    print(f"  [Warning] {message}")
+
+
+def parse_references(fragments: Iterable[str], warn=_print_warning) -> List[VerseRef]:
+    """
+    Parses a list of reference strings. A fragment without a book name
+    (e.g. "13:15") continues the book of the previous fragment.
+    """
+    parser = _Parser(warn)
+    refs: List[VerseRef] = []
+    for fragment in fragments:
+        refs.extend(parser.parse(fragment))
+        # Each list item ends the current chapter context, the book stays implied
+        parser.chapter, parser.last = None, None
+    return refs
+
+
+# ---------------------------------------------------------------------------
+# Benchmark & fuzz check (python bible_refs.py [topics.json])
+# ---------------------------------------------------------------------------
+
+def _random_book_name(rng: random.Random, book: bible_books.Book) -> str:
+    return rng.choice([book.en, book.usfm, book.id, book.en.upper(), book.en.replace(" ", "")])
+
+
+def _fuzz_case(rng: random.Random) -> Tuple[str, List[VerseRef]]:
+    parts, expected = [], []
+    book = None
+    for _ in range(rng.randint(1, 5)):
+        if book is None or rng.random() < 0.6:
+            book = rng.choice(bible_books.BOOKS)
+            prefix = _random_book_name(rng, book) + " "
+        else:
+            prefix = ""   # implied book
+        dash = rng.choice(["-", "–", " - "])
+        single = book.id in SINGLE_CHAPTER_BOOKS
+        chapter = 1 if single else rng.randint(1, 120)
+        kind = rng.choice(["verse", "range", "list", "chapter", "span"])
+        if single and kind in ("chapter", "span"):
+            kind = "verse"
+
+        if kind == "verse":
+            v = rng.randint(1, 60)
+            text = f"{v}" if single and rng.random() < 0.5 else f"{chapter}:{v}"
+            suffix = rng.choice(["", "", "a", "b", " b", "ff", "f"])
+            text += suffix
+            if suffix == "ff":
+                expected.append(VerseRef(book.id, chapter, v, None))
+            else:
+                expected.append(VerseRef(book.id, chapter, v, v + 1 if suffix == "f" else v))
+        elif kind == "range":
+            v = rng.randint(1, 40)
+            e = v + rng.randint(1, 10)
+            text = f"{chapter}:{v}{rng.choice(['', '', 'a', 'b'])}{dash}{e}"
+            expected.append(VerseRef(book.id, chapter, v, e))
+        elif kind == "list":
+            verses = sorted(rng.sample(range(1, 80), rng.randint(2, 4)))
+            text = f"{chapter}:" + rng.choice([",", ", ", " and ", " és "]).join(
+                str(v) + rng.choice(["", "", "a", "b"]) for v in verses)
+            expected.extend(VerseRef(book.id, chapter, v, v) for v in verses)
+        elif kind == "chapter":
+            text = f"{chapter}"
+            expected.append(VerseRef(book.id, chapter))
+        else:
+            v = rng.randint(1, 30)
+            end_chapter = chapter + rng.randint(1, 3)
+            e = rng.randint(1, 30)
+            text = f"{chapter}:{v}{rng.choice(['', '', 'a', 'b'])}{dash}{end_chapter}:{e}"
+            expected.append(VerseRef(book.id, chapter, v, None))
+            expected.extend(VerseRef(book.id, c) for c in range(chapter + 1, end_chapter))
+            expected.append(VerseRef(book.id, end_chapter, 1, e))
+        parts.append(prefix + text + rng.choice(["", ","]))
+    return rng.choice(["; ", ";", "\n"]).join(parts), expected
+
+
+def fuzz(cases: int = 20000, seed: int = 1) -> int:
+    rng = random.Random(seed)
+    failures = 0
+    for _ in range(cases):
+        text, expected = _fuzz_case(rng)
+        got = parse_references([text], warn=lambda message: None)
+        if got != expected:
+            failures += 1
+            if failures <= 5:
+                print(f"FAIL {text!r}\n  expected {expected}\n  got      {got}")
+    print(f"Fuzz: {cases - failures}/{cases} cases passed (seed={seed})")
+    return failures
+
+
+def benchmark(topics_path: str, rounds: int = 50):
+    with open(topics_path, "r", encoding="utf-8") as f:
+        topics = json.load(f)
+    fragments = [verse for topic in topics for verse in topic["verses"]]
+
+    warnings: List[str] = []
+    refs = parse_references(fragments, warn=warnings.append)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        parse_references(fragments, warn=lambda message: None)
+    elapsed = (time.perf_counter() - start) / rounds
+
+    print(f"Corpus: {len(topics)} topics, {len(fragments)} fragments -> {len(refs)} references, "
+          f"{len(warnings)} warnings")
+    for message in warnings:
+        print(f"  {message}")
+    print(f"Parse time: {elapsed * 1000:.2f} ms per pass ({len(fragments) / elapsed:,.0f} fragments/s)")
+
+
+if __name__ == "__main__":
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else "Topics/topics.json")
+    sys.exit(1 if fuzz() else 0)
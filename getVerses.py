@@ -1,191 +1,296 @@
+import argparse
+import csv
 import json
-import requests
-import pandas as pd
-import re
-import time
-from typing import List, Set, Dict, Optional, Tuple
+import os
+import statistics
+import subprocess
+import sys
+from typing import Iterable, List, Set, Dict, Optional, Tuple
+
+import bible_api
+import bible_books
+from bible_refs import VerseRef, parse_references
+from topic_assets import write_topic_json
+from verse_cache import DEFAULT_CACHE_FILE, DEFAULT_MAX_BYTES, VerseCache, ref_key
+from verse_source import BibleApiSource, CacheSource, LocalBibleSource, fetch_texts
 
 # ---------------------------------------------------------------------------
 # CONFIGURATION
 # ---------------------------------------------------------------------------
 topic = ""
-BOOK_MAP = {
-    "Gen": "GEN", "Exod": "EXO", "Lev": "LEV", "2 Sam": "2SA", "1 Kgs": "1KI",
-    "2 Kgs": "2KI", "2 Chr": "2CH", "Job": "JOB", "Ps": "PSA", "Prov": "PRO",
-    "Eccl": "ECC", "Isa": "ISA", "Jer": "JER", "Lam": "LAM", "Ezek": "EZK",
-    "Hos": "HOS", "Nah": "NAM", "Zech": "ZEC", "Mal": "MAL", "Matt": "MAT",
-    "Mark": "MRK", "Luke": "LUK", "John": "JHN", "Acts": "ACT", "Heb": "HEB",
-    "Jas": "JAS", "1 Pet": "1PE", "Tit": "TIT", "3 John": "3JN", "1 Cor": "1CO",
-    "Rev": "REV"
-}
-
-def process_verse_string(verse_list_raw: List[str]) -> List[str]:
-    
-    current_book = ""
-    processed_verses = []
-    
-    # Split by semicolon or newline
-    for verse in verse_list_raw:
-        parts = re.split(r'[;\n]+', verse)
-        for part in parts:
-            part = part.strip()
-            if not part:
-                continue
-
-            # Regex to check if the part starts with a book name
-            # (e.g., "Matt 8:8", "1 Pet 2:24", "Song of Solomon 1:1")
-            # Group 1: Book (e.g., "Matt", "1 Pet")
-            # Group 2: Reference (e.g., "8:8", "2:24")
-            book_match = re.match(r'^([1-3]?\s?[A-Za-z\s\.]+)\s+([0-9]+:[0-9]+.*)$', part)
-
-            if book_match:
-                # A new book is specified
-                current_book = book_match.group(1).strip()
-                reference = book_match.group(2).strip()
-                full_ref = f"{current_book} {reference}"
-                processed_verses.append(full_ref)
-                # print(f"  Found explicit ref: {full_ref}")
-
-            else:
-                # No book name, so it's an implied reference
-                # (e.g., "13:15" or "5:17")
-                if current_book:
-                    reference = part
-                    full_ref = f"{current_book} {reference}"
-                    processed_verses.append(full_ref)
-                    # print(f"  Found implied ref: {full_ref}")
-                else:
-                    print(f"  [Warning] Skipping '{part}': No book specified yet.")
-                
+JOURNAL_SUFFIX = ".journal.jsonl"
+DEFAULT_BIBLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Texts", "bibles")
+
+def process_verse_string(verse_list_raw: List[str]) -> List[VerseRef]:
+    """
+    Parses the raw reference list of a topic into normalized
+    (book, chapter, verse_start, verse_end) tuples.
+    Ranges ("Isa 53:4-5"), comma lists ("Ps 103:2,3"), cross-chapter spans
+    and implied books ("Matt 8:8; 13:15") are handled by bible_refs.
+    """
+    processed_verses = parse_references(verse_list_raw)
     print(f"--- Processing Complete: Found {len(processed_verses)} verses ---")
     return processed_verses
 
 
-def format_for_bible_api_com(full_ref: str) -> str:
+def format_for_bible_api_com(ref: VerseRef) -> str:
     """
-    Converts a full reference (e.g., 'Matt 8:8') into the
-    format for bible-api.com (e.g., 'Matt+8:8').
-    
-    Returns 'FORMAT_ERROR' if conversion fails.
+    Converts a parsed reference (e.g., ('mat', 8, 8, 8)) into the
+    format for bible-api.com (e.g., 'Matthew+8:8').
+    Open-ended references (rest of a cross-chapter span) link the whole chapter.
     """
-    # Regex to parse the full reference
-    match = re.match(r'^(.*?)\s+(\d+:\d+)$', full_ref.strip())
-    if match:
-         book_name = match.group(1)
-         reference = match.group(2)
-         
-    else:
-        match =  full_ref.split(' ', 1)
-        if not match:
-            return f"FORMAT_ERROR: Could not parse '{full_ref}'"
-        else:
-            book_name = match[0]
-            reference = match[1]
-    
-    # URL-encode the book name (replace spaces with '+')
-    book_name_url = book_name.replace(' ', '')
-    return f"{book_name_url}{reference}".strip().replace('.', '')
-
-# The complete list of verses you provided
-# Load the topics JSON safely and extract verses for id = 1 (supports multiple possible structures)
-try:
-    with open("topics.json", "r", encoding="utf-8") as f:
-        topics = json.load(f)
-except FileNotFoundError:
-    print("Error: topics.json not found.")
-    topics = {}
-
-# Prefer the exact key "id = 1" if present, otherwise try to find an item with id == 1
+    book_name_url = bible_books.by_id(ref.book).en.replace(' ', '+')
+    if ref.verse_start is None or ref.verse_end is None:
+        return f"{book_name_url}+{ref.chapter}"
+    if ref.verse_start == ref.verse_end:
+        return f"{book_name_url}+{ref.chapter}:{ref.verse_start}"
+    return f"{book_name_url}+{ref.chapter}:{ref.verse_start}-{ref.verse_end}"
+
+
+def load_topics(path: str = "topics.json") -> list:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"Error: {path} not found.")
+        return []
 
 # ---------------------------------------------------------------------------
 # SCRIPT LOGIC
 # ---------------------------------------------------------------------------
 
 
-def get_verse_text_bible_api(url):
-    """Fetches a single verse from bible-api.com."""
-    
-    try:
-        response = requests.get(url)
-        # Check for 404 or other errors
-        if response.status_code != 200:
-            if ('ylt' in url):
-                return "Verse not found in YLT translation."
-            print(f"  -> HTTP Error for {url}: error={response.status_code}")
-            if response.status_code == 429:
-                print("Retrying..")
-                time.sleep(5)
-                return get_verse_text_bible_api(url)
-            return f"HTTP Error: {response.status_code}"
-            
-        data = response.json()
-        # Check for API-specific errors
-        if 'error' in data:
-            print(f"  -> API Error for {url}: {data['error']}")
-            return f"API Error: {data['error']}"
-
-        # The text is in the 'text' field
-        return data
-        
-    except Exception as e:
-        print(f"  -> Error fetching {url}: {e}")
-        return "Error"
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fetch topic verses from bible-api.com into CSV files",
+                                     epilog="Requires httpx (pip install httpx) unless --offline is used.")
+    parser.add_argument("--topics", default="topics.json", help="Topic list (default: topics.json)")
+    parser.add_argument("--base-url", default=bible_api.BASE_URL,
+                        help="API base URL, e.g. a local mock server (python bible_api.py --mock-server 8765)")
+    parser.add_argument("--rate", type=float, default=bible_api.DEFAULT_RATE,
+                        help=f"Requests per second (default: {bible_api.DEFAULT_RATE})")
+    parser.add_argument("--burst", type=float, default=bible_api.DEFAULT_BURST,
+                        help="Token bucket capacity (default: 1)")
+    parser.add_argument("--concurrency", type=int, default=bible_api.DEFAULT_CONCURRENCY,
+                        help=f"Requests in flight (default: {bible_api.DEFAULT_CONCURRENCY})")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_FILE,
+                        help=f"SQLite verse cache (default: {DEFAULT_CACHE_FILE})")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_BYTES / 1024 / 1024,
+                        help="Cache size limit, least recently used entries are evicted (default: 64)")
+    parser.add_argument("--cache-ttl-days", type=float, default=None,
+                        help="Refetch cached verses older than this (default: never)")
+    parser.add_argument("--no-cache", action="store_true", help="Always fetch from the API")
+    parser.add_argument("--bibles", default=DEFAULT_BIBLES_DIR,
+                        help="Local translations generated by xml_to_json.py, one folder per translation")
+    parser.add_argument("--local", action="append", default=[], metavar="TRANSLATION=DIR",
+                        help="Serve a translation from a local xml_to_json.py output folder")
+    parser.add_argument("--offline", action="store_true",
+                        help="Local translations and the verse cache only, never call bible-api.com")
+    parser.add_argument("--json-dir", default=None,
+                        help="Also write each topic as <id>.json for the frontend (e.g. Frontend/src/assets/topics)")
+    parser.add_argument("--benchmark-startup", action="store_true",
+                        help="Measure the import time of this script and exit")
+    return parser.parse_args()
+
+def topic_csv_file(topic: str) -> str:
+    return f"bible verses about {topic}.csv"
+
+
+def build_row(ref: VerseRef, texts: Dict[str, str], translations: List[str]) -> Dict[str, str]:
+    return {
+        "Verse Reference": ref.label(),
+        "Bible Gateway Link (Chapter)": format_for_bible_api_com(ref),
+        **{translation: texts.get(translation, "") for translation in translations}
+    }
+
+
+def write_csv(csv_file: str, rows: Iterable[Dict[str, str]], columns: List[str],
+              keep_existing: bool = False) -> bool:
+    """
+    Streams the rows into a temp file next to the target and swaps it in, never left half-written.
+    With `keep_existing` (some verses were never fetched) an existing CSV is
+    left as it is. Empty cells are fine: a verse the API does not know stays empty.
+    Returns whether the file was written.
+    """
+    if keep_existing and os.path.exists(csv_file):
+        return False
+    tmp_file = csv_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+    os.replace(tmp_file, csv_file)
+    return True
+
+
+def benchmark_startup(runs: int = 5):
+    """Import cost of this script in a fresh interpreter, next to pandas (its former dependency)."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    for module in ("getVerses", "pandas"):
+        timings = []
+        for _ in range(runs):
+            result = subprocess.run(
+                [sys.executable, "-c",
+                 f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"],
+                cwd=script_dir, capture_output=True, text=True)
+            if result.returncode != 0:
+                break
+            timings.append(float(result.stdout.strip()))
+        if timings:
+            print(f"import {module}: {statistics.median(timings) * 1000:.0f} ms (median of {len(timings)})")
+        else:
+            print(f"import {module}: not available")
+
+
+class TopicJournal:
+    """
+    Append-only checkpoint of the finished rows of one topic: one JSON line
+    {"ref": ..., "row": ...} per reference, flushed as soon as it is known.
+    A torn last line (crash mid-write) is skipped when the journal is loaded.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows: Dict[str, Dict[str, str]] = {}
+        self._torn = False
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    self._torn = not line.endswith("\n")
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.rows[entry["ref"]] = entry["row"]
+        self._file = None
+
+    def add(self, key: str, row: Dict[str, str]):
+        if key in self.rows:
+            return
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+            if self._torn:
+                self._file.write("\n")
+        self.rows[key] = row
+        self._file.write(json.dumps({"ref": key, "row": row}, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """The topic's output is complete, the journal is no longer needed."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def parse_local_mapping(items: List[str]) -> Dict[str, str]:
+    mapping = {}
+    for item in items:
+        translation, sep, path = item.partition('=')
+        if not sep:
+            raise SystemExit(f"--local expects TRANSLATION=DIR, got '{item}'")
+        mapping[translation] = path
+    return mapping
+
 
 def main():
+    args = parse_args()
+    if args.benchmark_startup:
+        benchmark_startup()
+        return
+    topics = load_topics(args.topics)
+    translations = ["bbe","web","ylt"]
+
+    # Plan globally: a verse shared by several topics is fetched only once
+    topic_refs = []
     for _topic in topics:
-        topic = _topic['topic']
-        VERSE_LIST_RAW = _topic['verses']
-        
-        verses_to_fetch = process_verse_string(VERSE_LIST_RAW)
-        print(f"Found {len(verses_to_fetch)} unique verses to fetch.")
-        
-        data_rows = []
-        translations = ["bbe","web","ylt"]
-    
-        for i, ref in enumerate(verses_to_fetch):
-            data_row = {}
-            parsed_ref = format_for_bible_api_com(ref)
-            if not parsed_ref:
-                continue
-            for translation in translations:            
-                # 1. Create the Bible Gateway link
-                bg_link = f"https://bible-api.com/{parsed_ref}?translation={translation}"
-    
-                # 3. Fetch verse text
-                time.sleep(1.7) # Be polite to the API
-                verse_data = get_verse_text_bible_api(bg_link)
-                if('Verse not found' in verse_data) or ('Error' in verse_data):
-                    data_row[translation] = ""
-                else:
-                    data_row[translation] = verse_data['text'].strip()
-    
-            # 4. Add data to our list
-            data_rows.append({
-                "Verse Reference": ref,
-                "Bible Gateway Link (Chapter)": parsed_ref,
-                **data_row
-            })
-    
+        print(f"Topic: {_topic['topic']}")
+        topic_refs.append((_topic['topic'], process_verse_string(_topic['verses'])))
+    all_refs = [ref for _, refs in topic_refs for ref in refs]
+    unique_refs = list(dict.fromkeys(all_refs))
+    if all_refs:
+        print(f"{len(all_refs)} references in {len(topic_refs)} topics, {len(unique_refs)} unique "
+              f"(dedup ratio {len(all_refs) / len(unique_refs):.2f}x, "
+              f"{len(all_refs) - len(unique_refs)} duplicate fetches saved per translation)")
+
+    # Local translations first, then the cache, bible-api.com only as a fallback
+    sources = [LocalBibleSource.discover(args.bibles, translations, parse_local_mapping(args.local))]
+    cache = None if args.no_cache else VerseCache(
+        args.cache, max_bytes=int(args.cache_max_mb * 1024 * 1024),
+        ttl=args.cache_ttl_days * 86400 if args.cache_ttl_days else None)
+    if cache:
+        sources.append(CacheSource(cache))
+    if not args.offline:
+        sources.append(BibleApiSource(cache, base_url=args.base_url, rate=args.rate,
+                                      burst=args.burst, concurrency=args.concurrency))
+
+    # Rows already finished by an earlier (interrupted) run are taken from the journals
+    journals = {topic: TopicJournal(topic_csv_file(topic) + JOURNAL_SUFFIX) for topic, _ in topic_refs}
+    known_rows = {key: row for journal in journals.values() for key, row in journal.rows.items()}
+    topics_by_ref: Dict[VerseRef, List[str]] = {}
+    for topic, refs in topic_refs:
+        for ref in refs:
+            topics_by_ref.setdefault(ref, []).append(topic)
+    if known_rows:
+        print(f"Resuming: {len(known_rows)} references already done.")
+        # A row finished for one topic counts for every topic that shares the reference
+        for topic, refs in topic_refs:
+            for ref in refs:
+                if ref_key(ref) in known_rows:
+                    journals[topic].add(ref_key(ref), known_rows[ref_key(ref)])
+
+    partial: Dict[VerseRef, Dict[str, str]] = {}
+
+    def on_texts(served):
+        # Journal a row as soon as all of its translations are in
+        for (translation, ref), text in served.items():
+            partial.setdefault(ref, {})[translation] = text
+            if len(partial[ref]) == len(translations):
+                row = build_row(ref, partial[ref], translations)
+                known_rows[ref_key(ref)] = row
+                for topic in topics_by_ref[ref]:
+                    journals[topic].add(ref_key(ref), row)
+
+    pending_refs = [ref for ref in unique_refs if ref_key(ref) not in known_rows]
+    fetch_texts(sources, [(translation, ref) for translation in translations for ref in pending_refs], on_texts)
+    # Whole chapters in the topic JSON are resolved against a local translation, if there is one
+    local = sources[0]
+    local_translation = next((translation for translation in translations if translation in local.dirs), None)
+
+    for topic, verses_to_fetch in topic_refs:
+        data_rows = (known_rows.get(ref_key(ref)) or build_row(ref, partial.get(ref, {}), translations)
+                     for ref in verses_to_fetch)
+
         print("\nAll verses fetched. Creating output files...")
-        
-        # Create a Pandas DataFrame
-        df = pd.DataFrame(data_rows)
-        
-        # Define column order
-        columns = [
-            "Verse Reference",
-            "Bible Gateway Link (Chapter)"
-        ]
-        for translation in translations:
-            columns.append(translation)
-    
-        df = df[columns]
-    
-    
-        # Save to CSV
-        csv_file = f"bible verses about {topic}.csv"
-        df.to_csv(csv_file, index=False, encoding='utf-8-sig')
-        print(f"✅ Successfully created CSV file: {csv_file}")
+
+        # Only verses that were never fetched (failed requests) block the CSV,
+        # a definite not-found is a final answer and is written as an empty cell
+        unfetched = sum(1 for ref in verses_to_fetch if ref_key(ref) not in known_rows)
+        csv_file = topic_csv_file(topic)
+        if not write_csv(csv_file, data_rows, ["Verse Reference", "Bible Gateway Link (Chapter)", *translations],
+                         keep_existing=bool(unfetched)):
+            print(f"⚠️ {unfetched} verses could not be fetched, kept the existing CSV file: {csv_file}")
+        elif unfetched:
+            print(f"⚠️ Created CSV file with {unfetched} unfetched verses: {csv_file}")
+        else:
+            print(f"✅ Successfully created CSV file: {csv_file}")
+        if args.json_dir:
+            json_file, _, warnings = write_topic_json(args.json_dir, topic, verses_to_fetch,
+                                                      local if local_translation else None, local_translation)
+            print(f"✅ Successfully created topic file: {json_file}")
+            for message in warnings:
+                print(f"  [Warning] {message}")
+
+        # Incomplete rows (failed requests) stay out of the journal and are retried next run
+        if not unfetched:
+            journals[topic].discard()
+        else:
+            journals[topic].close()
+            print("  Some verses could not be fetched, they will be retried on the next run")
         
         print("\nDone.")
 
@@ -196,6 +301,9 @@ def main():
             if found:
                 VERSE_LIST_RAW = found.get("verses", [])
 
+    for source in sources:
+        source.close()
+
 
         
 
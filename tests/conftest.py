@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The scripts are not an installed package: make the repo root modules
+# (bible_refs, verse_cache, ...), Texts/xml_to_json.py and the tagger folders importable
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "Texts"), os.path.join(ROOT, "Frontend"),
+             os.path.join(ROOT, "Frontend", "src", "assets")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
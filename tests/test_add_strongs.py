@@ -0,0 +1,248 @@
+import json
+import random
+import re
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+import AddStrongs
+from AddStrongs import BibleTagger, TaggingJournal
+
+
+def entry(verse, text="szöveg", book="gen", chapter="1", **extra):
+    return dict({"book": book, "chapter": chapter, "verse": verse, "text": text}, **extra)
+
+
+@pytest.fixture
+def tagger(tmp_path, monkeypatch):
+    strongs = tmp_path / "strongs"
+    strongs.mkdir()
+    (strongs / "hebrew.json").write_text(json.dumps({"H5146": {"translit": "Nôach", "defs": {"hu": "§ Noé"}}}),
+                                         encoding="utf-8")
+    (strongs / "greek.json").write_text("{}", encoding="utf-8")
+    monkeypatch.setattr(AddStrongs, "STRONGS_DIR", str(strongs))
+    monkeypatch.setattr(AddStrongs, "KJV_ROOT", str(tmp_path / "missing"))
+    monkeypatch.setattr(AddStrongs, "OUTPUT_FILE", str(tmp_path / "out.json"))
+    monkeypatch.setattr(AddStrongs, "FAILED_FILE", str(tmp_path / "failed.json"))
+    monkeypatch.setattr(AddStrongs, "JOURNAL_FILE", str(tmp_path / "journal.jsonl"))
+    return BibleTagger
+
+
+def test_journal_resumes_after_a_truncated_line(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = TaggingJournal(str(path))
+    journal.add(entry(1))
+    journal.add(entry(2))
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"book": "gen", "chapter": "1", "verse": 3, "te')
+
+    journal = TaggingJournal(str(path))
+    assert sorted(journal.entries) == [("gen", "1", 1), ("gen", "1", 2)]
+    journal.add(entry(3))
+    journal.close()
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert json.loads(lines[-1]) == entry(3)
+    assert sorted(TaggingJournal(str(path)).entries) == [("gen", "1", 1), ("gen", "1", 2), ("gen", "1", 3)]
+
+
+def test_journal_later_line_wins(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = TaggingJournal(str(path))
+    journal.add(entry(1, failure={"location": "gen 1:1"}))
+    assert journal.failed_keys() == {("gen", "1", 1)}
+    journal.add(entry(1, text="javítva"))
+    journal.close()
+
+    journal = TaggingJournal(str(path))
+    assert journal.entries[("gen", "1", 1)] == entry(1, text="javítva")
+    assert journal.failed_keys() == set()
+
+
+def test_finalize_builds_output_from_journal(tmp_path, tagger):
+    journal = TaggingJournal(str(tmp_path / "journal.jsonl"))
+    journal.add(entry(10, chapter="2"))
+    journal.add(entry(2, text="Noé{H5146}", untagged=["H1121"]))
+    journal.add(entry(1, failure={"location": "gen 1:1", "error": "x"}))
+    journal.close()
+
+    bible = tagger()
+    bible.finalize()
+    output = json.loads((tmp_path / "out.json").read_text(encoding="utf-8"))
+    assert [(item["chapter"], item["verse"]) for item in output] == [("1", 1), ("1", 2), ("2", 10)]
+    assert output[1] == dict(entry(2, text="Noé{H5146}"), version=AddStrongs.VERSION_NAME)
+    failed = json.loads((tmp_path / "failed.json").read_text(encoding="utf-8"))
+    assert failed == [{"location": "gen 1:1", "error": "x"}]
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_retry_keys_and_should_process(tmp_path, tagger):
+    journal = TaggingJournal(str(tmp_path / "journal.jsonl"))
+    journal.add(entry(1))
+    journal.add(entry(2, failure={"location": "gen 1:2"}))
+    journal.close()
+    # A failed list left half-written by an older run
+    (tmp_path / "failed.json").write_text('[\n{"location": "exo 3:14", "error": "x"},\n{"loca', encoding="utf-8")
+
+    bible = tagger()
+    assert not bible.should_process(("gen", "1", 1))
+    assert bible.should_process(("gen", "1", 3))
+    bible.retry_keys = bible.load_retry_keys()
+    assert bible.retry_keys == {("gen", "1", 2), ("exo", "3", 14)}
+    assert not bible.should_process(("gen", "1", 3))
+    assert bible.should_process(("exo", "3", 14))
+
+
+def test_check_integrity_keeps_spacing(tagger):
+    bible = tagger()
+    assert bible.check_integrity("Mésekh és Thirász.", "Mésekh{H4902} és Thirász{H8494}.")[0]
+    assert bible.check_integrity("Mésekh és Thirász.", "Mésekh {H4902} és Thirász.")[0]
+    assert not bible.check_integrity("Mésekh és Thirász.", "Mésekh{H4902} és Tirász.")[0]
+
+
+def test_partially_aligned_verse_goes_to_the_llm(tagger):
+    # H1121 is not in the dictionary: only the name can be placed
+    kjv, hu = "The children{H1121} of Noah{H5146}.", "Noé gyermekei."
+    assert tagger().prealign_verse(kjv, hu) is None
+    partial = tagger(prealign_min_coverage=0.5, prealign_min_confidence=0).prealign_verse(kjv, hu)
+    assert (partial.text, partial.untagged) == ("Noé{H5146} gyermekei.", ("H1121",))
+
+
+TAG_ONLY_KJV = "The children{H1121} of Noah{H5146} lived{H2421}."
+TAG_ONLY_HU = "Noé gyermekei éltek."
+
+
+def scripted_ollama(bible, replies):
+    calls = []
+
+    def call_ollama(messages, num_predict=AddStrongs.NUM_PREDICT):
+        calls.append(messages)
+        return replies[min(len(calls), len(replies)) - 1]
+    bible.call_ollama = call_ollama
+    return calls
+
+
+def test_tag_only_retries_a_reply_that_places_too_few_codes(tagger):
+    bible = tagger(tag_only=True, prealign=False)
+    calls = scripted_ollama(bible, ["1=H5146", "1=H5146, 2=H1121, 3=H2421"])
+    assert bible.process_verse_tag_only(TAG_ONLY_KJV, TAG_ONLY_HU, "gen:1") == \
+        "Noé{H5146} gyermekei{H1121} éltek{H2421}."
+    assert len(calls) == 2
+    assert "H1121, H2421" in calls[1][-1]["content"]
+
+
+def test_tag_only_partial_replies_end_on_the_failed_list(tmp_path, tagger, monkeypatch):
+    monkeypatch.setattr(AddStrongs, "MAX_RETRIES", 2)
+    (tmp_path / "kjv.json").write_text(json.dumps([{"v": 1, "text": TAG_ONLY_KJV}]), encoding="utf-8")
+    (tmp_path / "hu.json").write_text(json.dumps([{"v": 1, "text": TAG_ONLY_HU}]), encoding="utf-8")
+    bible = tagger(tag_only=True, prealign=False)
+    calls = scripted_ollama(bible, ["1=H5146"])
+    bible.process_chapter(str(tmp_path / "kjv.json"), str(tmp_path / "hu.json"), "gen", "5")
+    bible.journal.close()
+    assert len(calls) == 2
+    assert bible.journal.failed_keys() == {("gen", "5", 1)}
+    assert TaggingJournal(str(tmp_path / "journal.jsonl")).failed_keys() == {("gen", "5", 1)}
+
+
+def write_bible(root, books=("exo", "gen"), chapters=3, verses=6):
+    for translation, text in (("kjv", "Word{{H{}}} number {}."), ("hu", "Szó {} szám {} {}.")):
+        for book in books:
+            (root / translation / book).mkdir(parents=True)
+            for chapter in range(1, chapters + 1):
+                items = [{"v": v, "text": text.format(chapter * 100 + v, v, book)} for v in range(1, verses + 1)]
+                (root / translation / book / f"{chapter}.json").write_text(json.dumps(items), encoding="utf-8")
+
+
+def run_tagger(tmp_path, monkeypatch, tagger, parallel, fail=()):
+    """process_bible over the fake Bible, with a slow, scripted model; returns the prompt of each verse."""
+    rng = random.Random(parallel)
+    prompts = {}
+    lock = threading.Lock()
+
+    def call_ollama(messages, num_predict=AddStrongs.NUM_PREDICT):
+        task = messages[-1]["content"]
+        hu = re.search(r"Magyar szöveg: (.*)", task).group(1)
+        code = re.search(r"\{(H\d+)\}", task.split("### FELADAT")[1]).group(1)
+        with lock:
+            prompts.setdefault(hu, messages)
+        time.sleep(rng.random() * 0.005)
+        if hu in fail:
+            return "elrontott szöveg"
+        first, rest = hu.split(" ", 1)
+        return f"{first}{{{code}}} {rest}"
+
+    monkeypatch.setattr(AddStrongs, "KJV_ROOT", str(tmp_path / "kjv"))
+    monkeypatch.setattr(AddStrongs, "KAROLI_ROOT", str(tmp_path / "hu"))
+    monkeypatch.setattr(AddStrongs, "MAX_RETRIES", 1)
+    journal = tmp_path / "journal.jsonl"
+    if journal.exists():
+        journal.unlink()
+    bible = tagger(prealign=False, parallel=parallel)
+    bible.call_ollama = call_ollama
+    bible.process_bible()
+    return prompts, journal.read_text(encoding="utf-8")
+
+
+def test_parallel_chapters_match_the_serial_run(tmp_path, tagger, monkeypatch):
+    write_bible(tmp_path)
+    # A failure in the first chapter clears the examples gathered so far
+    fail = {"Szó 102 szám 2 gen."}
+    serial_prompts, serial_journal = run_tagger(tmp_path, monkeypatch, tagger, 1, fail)
+    parallel_prompts, parallel_journal = run_tagger(tmp_path, monkeypatch, tagger, 4, fail)
+
+    assert parallel_prompts == serial_prompts
+    lines = [json.loads(line) for line in parallel_journal.splitlines()]
+    assert len(lines) == len({TaggingJournal.key(line) for line in lines}) == 2 * 3 * 6
+    assert sorted(map(json.dumps, lines)) == sorted(map(json.dumps, map(json.loads, serial_journal.splitlines())))
+    # Every chapter after the first uses the book's first three good verses as examples
+    examples = [m["content"] for m in parallel_prompts["Szó 306 szám 6 gen."] if m["role"] == "assistant"]
+    assert examples == ["Szó{H103} 103 szám 3 gen.", "Szó{H104} 104 szám 4 gen.", "Szó{H105} 105 szám 5 gen."]
+    examples = [m["content"] for m in parallel_prompts["Szó 306 szám 6 exo."] if m["role"] == "assistant"]
+    assert examples == ["Szó{H101} 101 szám 1 exo.", "Szó{H102} 102 szám 2 exo.", "Szó{H103} 103 szám 3 exo."]
+    output = json.loads((tmp_path / "out.json").read_text(encoding="utf-8"))
+    assert [(item["book"], item["chapter"], item["verse"]) for item in output][:2] == [("exo", "1", 1), ("exo", "1", 2)]
+
+
+def test_stop_event_ends_chapters_between_verses(tmp_path, tagger):
+    write_bible(tmp_path, books=("gen",), chapters=1)
+    bible = tagger(prealign=False)
+    bible.stop.set()
+    bible.process_chapter(str(tmp_path / "kjv" / "gen" / "1.json"), str(tmp_path / "hu" / "gen" / "1.json"),
+                          "gen", "1")
+    assert bible.journal.entries == {}
+
+
+def test_prompt_prefix_is_pinned_after_the_first_examples(tmp_path, tagger):
+    (tmp_path / "kjv.json").write_text(json.dumps([{"v": v, "text": f"Noah{{H5146}} number {v}."}
+                                                   for v in range(1, 6)]), encoding="utf-8")
+    (tmp_path / "hu.json").write_text(json.dumps([{"v": v, "text": f"Noé szám {v}."} for v in range(1, 6)]),
+                                      encoding="utf-8")
+    bible = tagger(tag_only=True, prealign=False)
+    calls = scripted_ollama(bible, ["1=H5146"])
+    bible.process_chapter(str(tmp_path / "kjv.json"), str(tmp_path / "hu.json"), "gen", "5")
+    bible.journal.close()
+
+    assert [len(messages) for messages in calls] == [2, 4, 6, 8, 8]
+    for messages in calls:
+        assert messages[0] == {"role": "system", "content": AddStrongs.TAG_ONLY_SYSTEM_PROMPT}
+        assert [message["role"] for message in messages[1:]] == ["user", "assistant"] * (len(messages) // 2 - 1) + ["user"]
+        assert "Noé" in messages[-1]["content"] and "H5146" in messages[-1]["content"]
+    # The first three verses are the examples: every later prompt starts with the same messages
+    assert calls[3][:-1] == calls[4][:-1] and calls[3][-1] != calls[4][-1]
+    assert calls[3][:-1] == calls[2] + [{"role": "assistant", "content": "1=H5146"}]
+    assert [message["content"] for message in calls[4][2:-1:2]] == ["1=H5146"] * 3
+
+
+def test_retries_continue_the_conversation(tagger):
+    bible = tagger(prealign=False)
+    calls = scripted_ollama(bible, ["Noé {H5146} elrontva.", "Noé{H5146} élt."])
+    assert bible.process_verse_with_retry("Noah{H5146} lived.", "Noé élt.", "gen:1") == "Noé{H5146} élt."
+    assert calls[0][0] == {"role": "system", "content": AddStrongs.SYSTEM_PROMPT}
+    # The rejected answer and the error report are appended, the earlier messages stay as they were
+    assert calls[1][:len(calls[0])] == calls[0]
+    assert calls[1][len(calls[0])] == {"role": "assistant", "content": "Noé {H5146} elrontva."}
+    assert calls[1][-1]["role"] == "user" and "HIBA JELENTÉS" in calls[1][-1]["content"]
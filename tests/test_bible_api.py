@@ -0,0 +1,167 @@
+import asyncio
+import time
+
+import pytest
+
+import bible_api
+from bible_api import BibleApiClient, TokenBucket, combine_responses, is_not_found, parse_retry_after, plan_queries
+from bible_refs import VerseRef, parse_references
+
+
+def test_neighbouring_verses_are_merged():
+    refs = parse_references(["Ps 23:1", "Ps 23:2-3", "Ps 23:3-4", "Ps 23:6", "Ps 103:2-5"])
+    assert plan_queries(refs) == {"psa": ["Psalm+23:1-4,6,103:2-5"]}
+
+
+def test_whole_chapters_get_their_own_query():
+    refs = parse_references(["Ps 46", "Ps 46:1", "Ps 23:1"])
+    assert plan_queries(refs) == {"psa": ["Psalm+46", "Psalm+23:1"]}
+
+
+def test_open_ended_reference_fetches_the_chapter():
+    refs = [VerseRef("rom", 8, 28, None), VerseRef("rom", 9, 1, 1)]
+    assert plan_queries(refs) == {"rom": ["Romans+8", "Romans+9:1"]}
+
+
+def test_books_are_planned_separately():
+    plan = plan_queries(parse_references(["1 Kgs 3:4", "Song 2:1", "John 3:16"]))
+    assert plan == {"1ki": ["1+Kings+3:4"], "sng": ["Song+of+Solomon+2:1"], "joh": ["John+3:16"]}
+
+
+def test_long_lists_are_split_and_repeat_the_chapter(monkeypatch):
+    monkeypatch.setattr(bible_api, "MAX_QUERY_PARTS", 3)
+    refs = [VerseRef("psa", 23, v, v) for v in (1, 3, 5, 7, 9)]
+    assert plan_queries(refs) == {"psa": ["Psalm+23:1,3,5", "Psalm+23:7,9"]}
+
+
+def test_combine_responses():
+    first = {"reference": "a", "verses": [{"chapter": 1, "verse": 1, "text": "x"}]}
+    second = {"reference": "b", "verses": [{"chapter": 2, "verse": 5, "text": "y"}]}
+    combined = combine_responses([first, second])
+    assert combined["reference"] == "a"
+    assert [v["text"] for v in combined["verses"]] == ["x", "y"]
+    assert combine_responses([first]) is first
+
+
+def test_combine_responses_with_a_failure():
+    assert combine_responses([{"verses": []}, None]) is None
+
+
+def test_is_not_found():
+    assert is_not_found({"error": "not found"})
+    assert is_not_found({"error": "Not Found", "verses": []})
+    assert not is_not_found({"error": "invalid translation"})
+    assert not is_not_found({"verses": []})
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("12", 5) == 12
+    assert parse_retry_after(None, 5) == 5
+    assert parse_retry_after("soon", 5) == 5
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT", 5) == 0
+
+
+@pytest.fixture
+def httpx():
+    return pytest.importorskip("httpx")
+
+
+def run_client(httpx, handler, jobs, **options):
+    async def run():
+        async with BibleApiClient(transport=httpx.MockTransport(handler), **options) as client:
+            return await client.fetch_all(jobs), client.stats
+    return asyncio.run(run())
+
+
+def ok(httpx, request):
+    return httpx.Response(200, json={"reference": request.url.path, "text": "x", "verses": []})
+
+
+async def no_backoff(seconds):
+    pass
+
+
+def test_token_bucket_paces_requests(httpx):
+    stamps = []
+
+    def handler(request):
+        stamps.append(time.monotonic())
+        return ok(httpx, request)
+
+    results, stats = run_client(httpx, handler, [(f"John+3:{v}", "web") for v in range(1, 6)],
+                                   rate=20, burst=1, concurrency=5)
+    assert all(results) and stats["requests"] == 5
+    gaps = [b - a for a, b in zip(stamps, stamps[1:])]
+    # One token every 50 ms, shared by all five workers
+    assert min(gaps) >= 0.04
+    assert stamps[-1] - stamps[0] >= 4 * 0.045
+
+
+def test_token_bucket_burst():
+    async def run():
+        bucket = TokenBucket(rate=1, capacity=3)
+        started = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        burst = time.monotonic() - started
+        bucket.pause(0.2)
+        await bucket.acquire()
+        return burst, time.monotonic() - started
+    burst, total = asyncio.run(run())
+    assert burst < 0.05
+    assert total >= 0.2
+
+
+def test_429_waits_for_retry_after(httpx):
+    calls = []
+
+    def handler(request):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            return httpx.Response(429, json={"error": "Too Many Requests"}, headers={"Retry-After": "0.3"})
+        return ok(httpx, request)
+
+    results, stats = run_client(httpx, handler, [("John+3:16", "web")], rate=100)
+    assert results[0]["text"] == "x"
+    assert (stats["rate_limited"], stats["retries"], stats["ok"]) == (1, 1, 1)
+    assert calls[1] - calls[0] >= 0.3
+
+
+def test_garbled_200_is_retried(httpx):
+    bodies = [b"<html>502 Bad Gateway</html>", b'{"text": "cut o', b'["not", "an", "object"]']
+
+    def handler(request):
+        if bodies:
+            return httpx.Response(200, content=bodies.pop(0), headers={"Content-Type": "text/html"})
+        return ok(httpx, request)
+
+    with pytest.MonkeyPatch.context() as patch:
+        # No retry backoff (the bucket is fast enough not to wait either)
+        patch.setattr(asyncio, "sleep", no_backoff)
+        results, stats = run_client(httpx, handler, [("John+3:16", "web")], rate=1000)
+    assert results[0]["text"] == "x"
+    assert (stats["retries"], stats["ok"], stats["failed"]) == (3, 1, 0)
+
+
+def test_garbled_responses_end_as_failed(httpx):
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(asyncio, "sleep", no_backoff)
+        results, stats = run_client(httpx, lambda request: httpx.Response(200, content=b"<html>"),
+                                       [("John+3:16", "web")], rate=1000, max_retries=2)
+    assert results == [None]
+    assert (stats["requests"], stats["failed"]) == (3, 1)
+
+
+def test_not_found_and_errors(httpx):
+    def handler(request):
+        if "Jude" in request.url.path:
+            return httpx.Response(404, json={"error": "not found"})
+        if request.url.params["translation"] == "xyz":
+            return httpx.Response(400, json={"error": "translation not found"})
+        return httpx.Response(200, json={"error": "not found"})
+
+    results, stats = run_client(httpx, handler, [("Jude+1:30", "web"), ("John+3:16", "xyz"), ("John+30:1", "web")],
+                                   rate=1000)
+    assert results[0] == results[2] == {"verses": [], "text": "", "error": "not found"}
+    assert results[1] is None
+    assert (stats["not_found"], stats["failed"]) == (2, 1)
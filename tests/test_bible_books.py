@@ -0,0 +1,38 @@
+import json
+import os
+
+import pytest
+
+import bible_books
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("name, book_id", [
+    ("Gen", "gen"), ("Exod", "exo"), ("EXO", "exo"), ("ex", "exo"),
+    ("1 Kgs", "1ki"), ("1Kings", "1ki"), ("1 Pet.", "1pe"), ("Ps", "psa"), ("Psalms", "psa"),
+    ("Song of Songs", "sng"), ("Ezek", "eze"), ("Mark", "mar"),
+    ("1 Mózes", "gen"), ("Zsoltárok", "psa"), ("Jeremiás siralmai", "lam"),
+])
+def test_resolve_aliases(name, book_id):
+    assert bible_books.resolve(name).id == book_id
+
+
+def test_resolve_unknown():
+    assert bible_books.resolve("Hezekiah") is None
+    assert bible_books.resolve("") is None
+
+
+def test_by_number():
+    assert bible_books.by_number(1).id == "gen"
+    assert bible_books.by_number("66").id == "rev"
+    assert bible_books.by_number(0) is None
+    assert bible_books.by_number(67) is None
+    assert bible_books.by_number("x") is None
+
+
+def test_matches_frontend_book_list():
+    path = os.path.join(ROOT, "Frontend", "src", "assets", "translation_structures", "books.json")
+    with open(path, "r", encoding="utf-8") as f:
+        frontend_ids = [book["id"] for book in json.load(f)]
+    assert [book.id for book in bible_books.BOOKS] == frontend_ids
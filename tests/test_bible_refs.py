@@ -0,0 +1,101 @@
+import random
+
+import pytest
+
+from bible_refs import VerseRef, _fuzz_case, parse_references
+
+
+def parse(*fragments):
+    warnings = []
+    return parse_references(fragments, warn=warnings.append), warnings
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Isa 53:4-5", [VerseRef("isa", 53, 4, 5)]),
+    ("Ps 103:2,3", [VerseRef("psa", 103, 2, 2), VerseRef("psa", 103, 3, 3)]),
+    ("Proverbs 11:4–10, 18–21, 23,",
+     [VerseRef("pro", 11, 4, 10), VerseRef("pro", 11, 18, 21), VerseRef("pro", 11, 23, 23)]),
+    ("Psalm 46", [VerseRef("psa", 46)]),
+    ("3 John 2", [VerseRef("3jo", 1, 2, 2)]),
+    ("Matt 8:8; 13:15", [VerseRef("mat", 8, 8, 8), VerseRef("mat", 13, 15, 15)]),
+    ("Ps 103:2-105:3", [VerseRef("psa", 103, 2, None), VerseRef("psa", 104), VerseRef("psa", 105, 1, 3)]),
+    ("1 Kgs 3:4", [VerseRef("1ki", 3, 4, 4)]),
+])
+def test_reference_shapes(text, expected):
+    refs, warnings = parse(text)
+    assert refs == expected
+    assert warnings == []
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Ps 23:1a, 3", [VerseRef("psa", 23, 1, 1), VerseRef("psa", 23, 3, 3)]),
+    ("Ps 23:1, 2b, 3", [VerseRef("psa", 23, 1, 1), VerseRef("psa", 23, 2, 2), VerseRef("psa", 23, 3, 3)]),
+    ("John 3:16 and 17", [VerseRef("joh", 3, 16, 16), VerseRef("joh", 3, 17, 17)]),
+    ("Zsoltárok 23:1 és 3", [VerseRef("psa", 23, 1, 1), VerseRef("psa", 23, 3, 3)]),
+    ("Rom 8:28ff", [VerseRef("rom", 8, 28, None)]),
+    ("Rom 8:28f", [VerseRef("rom", 8, 28, 29)]),
+    ("Jude 3ff", [VerseRef("jud", 1, 3, None)]),
+])
+def test_suffixes_and_connectives(text, expected):
+    refs, warnings = parse(text)
+    assert refs == expected
+    assert warnings == []
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Isa 53:4a-5", [VerseRef("isa", 53, 4, 5)]),
+    ("Isa 53:4b–5a", [VerseRef("isa", 53, 4, 5)]),
+    ("Gen 2:4b-3:24", [VerseRef("gen", 2, 4, None), VerseRef("gen", 3, 1, 24)]),
+    ("Ps 103:2, 3a-5", [VerseRef("psa", 103, 2, 2), VerseRef("psa", 103, 3, 5)]),
+    ("Jude 3a-5", [VerseRef("jud", 1, 3, 5)]),
+])
+def test_suffixed_range_starts(text, expected):
+    refs, warnings = parse(text)
+    assert refs == expected
+    assert warnings == []
+
+
+def test_stray_word_keeps_book():
+    refs, warnings = parse("John 3:16 whoever 17")
+    assert refs == [VerseRef("joh", 3, 16, 16), VerseRef("joh", 3, 17, 17)]
+    assert len(warnings) == 1
+
+
+def test_unknown_book_skips_fragment_only():
+    refs, warnings = parse("Ps 23:1; Hezekiah 3:1; John 3:16")
+    assert refs == [VerseRef("psa", 23, 1, 1), VerseRef("joh", 3, 16, 16)]
+    assert warnings == ["Unknown book 'Hezekiah'"]
+
+
+def test_implied_book_across_fragments():
+    refs, _ = parse("Matt 8:8", "13:15")
+    assert refs == [VerseRef("mat", 8, 8, 8), VerseRef("mat", 13, 15, 15)]
+
+
+def test_no_book_yet():
+    refs, warnings = parse("13:15")
+    assert refs == []
+    assert len(warnings) == 1
+
+
+@pytest.mark.parametrize("text", ["Ps 23:5-2", "Ps 0:1", "Ps 105:3-103:2"])
+def test_invalid_ranges(text):
+    refs, warnings = parse(text)
+    assert refs == []
+    assert len(warnings) == 1
+
+
+def test_verse_id_and_label():
+    assert VerseRef("exo", 3, 14, 15).verse_id() == "exo-3-14-15"
+    assert VerseRef("jer", 29, 11, 11).verse_id() == "jer-29-11"
+    assert VerseRef("psa", 46).verse_id() is None
+    assert VerseRef("rom", 8, 28, None).verse_id() is None
+    assert VerseRef("rom", 8, 28, None).label() == "Romans 8:28ff"
+    assert VerseRef("psa", 46).label() == "Psalm 46"
+
+
+def test_fuzz_cases():
+    rng = random.Random(7)
+    for _ in range(2000):
+        text, expected = _fuzz_case(rng)
+        assert parse_references([text], warn=lambda message: None) == expected, text
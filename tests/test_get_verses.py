@@ -0,0 +1,155 @@
+import csv
+import json
+import sys
+
+import getVerses
+from bible_refs import VerseRef
+from getVerses import JOURNAL_SUFFIX, TopicJournal, topic_csv_file, write_csv
+from verse_cache import VerseCache, ref_key
+
+PS23_1_2 = VerseRef("psa", 23, 1, 2)
+PS23_2 = VerseRef("psa", 23, 2, 2)
+COLUMNS = ["Verse Reference", "Bible Gateway Link (Chapter)", "web"]
+
+
+def read_rows(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def test_journal_resumes_after_a_truncated_line(tmp_path):
+    path = tmp_path / "topic.journal.jsonl"
+    journal = TopicJournal(str(path))
+    journal.add("psa-23-1-1", {"web": "one"})
+    journal.add("psa-23-2-2", {"web": "two"})
+    journal.close()
+    # Crash in the middle of the third line
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"ref": "psa-23-3-3", "row": {"w')
+
+    journal = TopicJournal(str(path))
+    assert journal.rows == {"psa-23-1-1": {"web": "one"}, "psa-23-2-2": {"web": "two"}}
+    journal.add("psa-23-3-3", {"web": "three"})
+    journal.add("psa-23-1-1", {"web": "ignored, already done"})
+    journal.close()
+
+    resumed = TopicJournal(str(path))
+    assert resumed.rows == {"psa-23-1-1": {"web": "one"}, "psa-23-2-2": {"web": "two"},
+                            "psa-23-3-3": {"web": "three"}}
+    resumed.discard()
+    assert not path.exists()
+
+
+def test_journal_lines_are_json(tmp_path):
+    path = tmp_path / "topic.journal.jsonl"
+    journal = TopicJournal(str(path))
+    journal.add("psa-46", {"web": "Isten a mi oltalmunk"})
+    journal.close()
+    assert json.loads(path.read_text(encoding="utf-8")) == {"ref": "psa-46", "row": {"web": "Isten a mi oltalmunk"}}
+
+
+def test_write_csv(tmp_path):
+    path = tmp_path / "topic.csv"
+    rows = [{"Verse Reference": "Psalm 23:1", "Bible Gateway Link (Chapter)": "Psalm+23:1", "web": "one"}]
+    assert write_csv(str(path), iter(rows), COLUMNS)
+    assert read_rows(path) == rows
+    assert not (tmp_path / "topic.csv.tmp").exists()
+
+
+def test_unfetched_verses_never_replace_an_existing_csv(tmp_path):
+    path = tmp_path / "topic.csv"
+    complete = [{"Verse Reference": "Genesis 20:17", "Bible Gateway Link (Chapter)": "Genesis+20:17", "web": "text"}]
+    write_csv(str(path), complete, COLUMNS)
+
+    assert not write_csv(str(path), [dict(complete[0], web="")], COLUMNS, keep_existing=True)
+    assert read_rows(path) == complete
+    assert not (tmp_path / "topic.csv.tmp").exists()
+
+
+def test_unfetched_verses_still_create_a_new_csv(tmp_path):
+    path = tmp_path / "topic.csv"
+    rows = [{"Verse Reference": "Genesis 20:17", "Bible Gateway Link (Chapter)": "Genesis+20:17", "web": ""}]
+    assert write_csv(str(path), rows, COLUMNS, keep_existing=True)
+    assert read_rows(path) == rows
+
+
+def run_offline(tmp_path, monkeypatch, cached, topics=None):
+    """getVerses.main over the topics (default: one): web and bbe from a local folder, ylt only from the cache."""
+    local = tmp_path / "local"
+    local.mkdir(exist_ok=True)
+    (local / "psa_23.json").write_text(json.dumps({"1": "one", "2": "two"}), encoding="utf-8")
+    topics = topics or [{"topic": "Shepherd", "verses": ["Ps 23:1-2"]}]
+    (tmp_path / "topics.json").write_text(json.dumps(topics), encoding="utf-8")
+    cache = VerseCache(str(tmp_path / "cache.sqlite"))
+    cache.put_many(cached)
+    cache.close()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["getVerses.py", "--offline", "--bibles", str(tmp_path / "none"),
+                                      "--local", f"web={local}", "--local", f"bbe={local}",
+                                      "--cache", str(tmp_path / "cache.sqlite")])
+    getVerses.main()
+    return tmp_path / topic_csv_file("Shepherd")
+
+
+def test_definite_not_found_replaces_an_existing_csv(tmp_path, monkeypatch):
+    (tmp_path / topic_csv_file("Shepherd")).write_text("stale\n", encoding="utf-8")
+    # bible-api.com does not know the verse in YLT: cached as an empty text
+    path = run_offline(tmp_path, monkeypatch, {("ylt", PS23_1_2): ""})
+    rows = read_rows(path)
+    assert [(row["web"], row["bbe"], row["ylt"]) for row in rows] == [("one two", "one two", "")]
+    assert not (tmp_path / (topic_csv_file("Shepherd") + JOURNAL_SUFFIX)).exists()
+
+
+def test_unfetched_verse_keeps_the_existing_csv(tmp_path, monkeypatch, capsys):
+    (tmp_path / topic_csv_file("Shepherd")).write_text("stale\n", encoding="utf-8")
+    path = run_offline(tmp_path, monkeypatch, {})
+    assert path.read_text(encoding="utf-8") == "stale\n"
+    assert "1 verses could not be fetched, kept the existing CSV file" in capsys.readouterr().out
+
+
+def record_fetches(monkeypatch):
+    fetched = []
+    fetch_texts = getVerses.fetch_texts
+
+    def recording_fetch_texts(sources, pairs, on_texts=None):
+        fetched.extend(pairs)
+        return fetch_texts(sources, pairs, on_texts)
+    monkeypatch.setattr(getVerses, "fetch_texts", recording_fetch_texts)
+    return fetched
+
+
+SHARED_TOPICS = [{"topic": "Shepherd", "verses": ["Ps 23:1-2"]},
+                 {"topic": "Comfort", "verses": ["Ps 23:2", "Ps 23:1-2"]}]
+
+
+def test_a_verse_shared_by_topics_is_fetched_once(tmp_path, monkeypatch):
+    fetched = record_fetches(monkeypatch)
+    run_offline(tmp_path, monkeypatch, {("ylt", PS23_1_2): "ylt one two", ("ylt", PS23_2): "ylt two"},
+                topics=SHARED_TOPICS)
+
+    assert sorted(fetched) == sorted((translation, ref) for translation in ("bbe", "web", "ylt")
+                                     for ref in (PS23_1_2, PS23_2))
+    shepherd = read_rows(tmp_path / topic_csv_file("Shepherd"))
+    comfort = read_rows(tmp_path / topic_csv_file("Comfort"))
+    assert [row["ylt"] for row in shepherd] == ["ylt one two"]
+    assert [row["ylt"] for row in comfort] == ["ylt two", "ylt one two"]
+    assert comfort[1] == shepherd[0]
+
+
+def test_a_row_journaled_for_one_topic_counts_for_every_topic(tmp_path, monkeypatch):
+    fetched = record_fetches(monkeypatch)
+    journaled = {"Verse Reference": "Psalm 23:1-2", "Bible Gateway Link (Chapter)": "Psalm+23:1-2",
+                 "bbe": "journal bbe", "web": "journal web", "ylt": "journal ylt"}
+    journal = TopicJournal(str(tmp_path / (topic_csv_file("Shepherd") + JOURNAL_SUFFIX)))
+    journal.add(ref_key(PS23_1_2), journaled)
+    journal.close()
+
+    # Psalm 23:2 is not in the cache for ylt: Comfort stays unfinished and keeps its journal
+    run_offline(tmp_path, monkeypatch, {}, topics=SHARED_TOPICS)
+
+    assert all(ref != PS23_1_2 for _, ref in fetched)
+    assert read_rows(tmp_path / topic_csv_file("Shepherd")) == [journaled]
+    assert not (tmp_path / (topic_csv_file("Shepherd") + JOURNAL_SUFFIX)).exists()
+    comfort = TopicJournal(str(tmp_path / (topic_csv_file("Comfort") + JOURNAL_SUFFIX)))
+    assert comfort.rows == {ref_key(PS23_1_2): journaled}
+    comfort.close()
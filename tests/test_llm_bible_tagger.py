@@ -0,0 +1,301 @@
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("httpx")
+pd = pytest.importorskip("pandas")
+
+import bible_books
+from llm_bible_tagger import (COL_ID, COL_STRONG, COL_WORD, CONFIG, AdaptiveScheduler, DictionaryService, LLMClient,
+                              SYSTEM_PROMPT, _FakeOllamaHandler, estimate_tokens, load_hebrew_csv, load_hebrew_tokens,
+                              run_pipeline)
+
+
+@pytest.fixture
+def strongs_dir(tmp_path):
+    (tmp_path / "strongs_h1.json").write_text(json.dumps({
+        "H1": {"defs": {"hu": ["apa", "ős", "elöljáró"], "en": ["father"]}},
+        "H350": {"defs": {"hu": "Ikábód", "en": "Ichabod"}},
+    }), encoding="utf-8")
+    (tmp_path / "strongs_h351.json").write_text(json.dumps({
+        "H351": {"defs": {"hu": ["Ié"], "en": ["Ie"]}},
+    }), encoding="utf-8")
+    return tmp_path
+
+
+def test_bucket_path(strongs_dir):
+    service = DictionaryService(str(strongs_dir))
+    assert service.bucket_path(1).endswith("strongs_h1.json")
+    assert service.bucket_path(350).endswith("strongs_h1.json")
+    assert service.bucket_path(351).endswith("strongs_h351.json")
+    assert service.bucket_path(8674).endswith("strongs_h8401.json")
+
+
+def test_buckets_load_lazily(strongs_dir):
+    service = DictionaryService(str(strongs_dir))
+    assert service._buckets == {}
+    assert service.get_keywords("H1") == "apa, ős (father)"
+    assert service.get_keywords("H350") == "Ikábód (Ichabod)"
+    assert list(service._buckets) == [0]
+    assert service.get_keywords("H351") == "Ié (Ie)"
+    assert sorted(service._buckets) == [0, 1]
+
+
+def test_missing_entries_fall_back(strongs_dir):
+    service = DictionaryService(str(strongs_dir))
+    assert service.get_keywords("H1121") == service.fallback["H1121"]
+    assert service.get_keywords("H9999") == "concept"
+    assert service.get_defs("H0") == {}
+    assert service.get_defs("nonsense") == {}
+
+
+def test_keywords_are_memoized(strongs_dir):
+    service = DictionaryService(str(strongs_dir), cache_size=2)
+    service.get_keywords("H1")
+    service.get_keywords("H1")
+    info = service.get_keywords.cache_info()
+    assert (info.hits, info.misses, info.maxsize) == (1, 1, 2)
+
+
+def verse(n, text="Kezdetben teremté Isten"):
+    return {"verse_id": f"gen-1-{n}", "hu_text": text, "tokens": [{"id": "H7225", "lemma": "ראשית", "def": "kezdet"}]}
+
+
+@pytest.fixture
+def config(monkeypatch):
+    """CONFIG values the scheduler tests depend on, fixed so that tuning the defaults does not break them."""
+    for key, value in {"MAX_BATCH_SIZE": 8, "TOKEN_BUDGET": 3000, "ADAPT_WINDOW": 4, "GROW_ABOVE": 0.95,
+                       "SHRINK_BELOW": 0.7, "MAX_SINGLE_ATTEMPTS": 2, "REORDER_WINDOW": 200}.items():
+        monkeypatch.setitem(CONFIG, key, value)
+    return CONFIG
+
+
+def ids(batch):
+    return [item["verse_id"] for item in batch]
+
+
+def test_failed_batch_is_bisected_down_to_singles(config):
+    scheduler = AdaptiveScheduler([verse(n) for n in range(1, 9)], batch_size=4)
+    batch = scheduler.next_batch()
+    assert ids(batch) == ["gen-1-1", "gen-1-2", "gen-1-3", "gen-1-4"]
+    # Verse 1 is fine, the other three failed: their halves are retried before new work
+    assert scheduler.report(batch, {"gen-1-1"}) == []
+    assert ids(scheduler.next_batch()) == ["gen-1-2"]
+    half = scheduler.next_batch()
+    assert ids(half) == ["gen-1-3", "gen-1-4"]
+    assert scheduler.report(half, set()) == []
+    assert ids(scheduler.next_batch()) == ["gen-1-3"]
+    assert ids(scheduler.next_batch()) == ["gen-1-4"]
+    assert ids(scheduler.next_batch())[0] == "gen-1-5"
+
+
+def test_single_verse_is_given_up_after_max_attempts(config):
+    scheduler = AdaptiveScheduler([verse(1)], batch_size=1)
+    single = scheduler.next_batch()
+    assert scheduler.report(single, set()) == []
+    assert scheduler.has_work()
+    retried = scheduler.next_batch()
+    assert ids(retried) == ["gen-1-1"]
+    assert ids(scheduler.report(retried, set())) == ["gen-1-1"]
+    assert not scheduler.has_work()
+
+
+def test_batch_size_follows_the_success_rate(config):
+    scheduler = AdaptiveScheduler([verse(n) for n in range(1, 200)], batch_size=4)
+    for expected in (5, 6, 7, 8, 8):
+        batch = scheduler.next_batch()
+        scheduler.report(batch, set(ids(batch)))
+        assert scheduler.size == expected
+    # Failures pull the windowed success rate below SHRINK_BELOW: the size halves
+    for _ in range(3):
+        batch = scheduler.next_batch()
+        scheduler.report(batch, set())
+    assert scheduler.size < 8
+    while scheduler.retry:
+        scheduler.next_batch()
+    assert len(scheduler.next_batch()) <= scheduler.size
+
+
+def test_batches_respect_the_token_budget(config):
+    config["TOKEN_BUDGET"] = 2 * estimate_tokens(verse(1))
+    scheduler = AdaptiveScheduler([verse(n) for n in range(1, 9)], batch_size=8)
+    assert len(scheduler.next_batch()) == 2
+
+
+@pytest.fixture
+def fake_ollama(monkeypatch):
+    monkeypatch.setattr(_FakeOllamaHandler, "latency", 0.01)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeOllamaHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/api/generate"
+    server.shutdown()
+    server.server_close()
+
+
+def test_client_against_the_fake_ollama(fake_ollama, config):
+    queue = [verse(n, f"Vers {n} szövege") for n in range(1, 13)]
+    emitted = []
+
+    async def run():
+        async with LLMClient(fake_ollama, in_flight=3) as llm:
+            await run_pipeline(queue, llm, 4, emitted.extend)
+            return llm
+
+    llm = asyncio.run(run())
+    assert [result["id"] for result in emitted] == ids(queue)
+    assert emitted[0]["tagged_text"] == "Vers<H7225> 1 szövege"
+    assert llm.requests == 3
+    assert llm.prompt_tokens > 0 and llm.eval_tokens > 0
+
+
+class StubLLM:
+    """process_items with random latency and random failures; records how far ahead of the output it was asked."""
+
+    def __init__(self, queue, emitted, in_flight=8, seed=7):
+        self.in_flight = in_flight
+        self.rng = random.Random(seed)
+        self.position = {item["verse_id"]: i for i, item in enumerate(queue)}
+        self.emitted = emitted
+        self.max_ahead = 0
+
+    async def process_items(self, items):
+        self.max_ahead = max(self.max_ahead, max(self.position[item["verse_id"]] for item in items) - len(self.emitted))
+        await asyncio.sleep(self.rng.random() * 0.003)
+        return [{"id": item["verse_id"], "tagged_text": item["hu_text"] + "<H1>"}
+                for item in items if self.rng.random() < 0.85]
+
+
+def test_pipeline_output_is_ordered_and_complete(config):
+    config["REORDER_WINDOW"] = 20
+    queue = [verse(n, f"Vers {n}") for n in range(1, 301)]
+    emitted = []
+    llm = StubLLM(queue, emitted)
+    asyncio.run(run_pipeline(queue, llm, 4, emitted.extend))
+
+    assert [result["id"] for result in emitted] == ids(queue)
+    # Given up verses keep their untagged text, all others are tagged
+    assert all(result["tagged_text"] in (item["hu_text"], item["hu_text"] + "<H1>")
+               for result, item in zip(emitted, queue))
+    # Backpressure: nothing more than REORDER_WINDOW (plus one batch) ahead of the written output
+    assert llm.max_ahead < config["REORDER_WINDOW"] + config["MAX_BATCH_SIZE"]
+
+
+BHS_ROWS = [
+    ("〔1｜1｜1｜1〕", "<H>בְּ</H>", "H9003"),
+    ("〔1｜1｜1｜1〕", "<H>רֵאשִׁ֖ית</H>", " H7225 "),
+    ("〔1｜1｜1｜1〕", "", "H1254"),                 # no word: skipped
+    ("〔1｜1｜1｜2〕", "<H>וְ</H>", ""),              # no Strong's number: skipped
+    ("〔13｜13｜1｜1〕", "אָדָ֥ם", "H121"),
+    ("〔1｜1｜1｜2〕", "<H>הָ</H><H>אָ֗רֶץ</H>", "H776"),
+    ("〔1｜1｜1｜3〕", "<H>וַ</H>", ""),              # a verse without any usable token
+    ("〔99｜99｜1｜1〕", "x", "H1"),                  # unknown book number
+    ("garbage", "y", "H1"),
+]
+
+
+def write_bhs(path, rows=BHS_ROWS):
+    lines = ["\t".join((COL_ID, COL_WORD, COL_STRONG, "other"))]
+    lines.extend("\t".join(row + ("z",)) for row in rows)
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def row_loop_loader(path, dictionary):
+    """The former per-row loader (groupby + iterrows), with the canonical book IDs."""
+    book_map = {book.number: book.id for book in bible_books.BOOKS}
+    df = pd.read_csv(path, sep='\t')
+    grouped = {}
+    for raw_id, group in df.groupby(COL_ID, sort=False):
+        parts = raw_id.replace('〔', '').replace('〕', '').split('｜')
+        if len(parts) < 4 or not parts[1].isdigit() or int(parts[1]) not in book_map:
+            continue
+        tokens = []
+        for _, row in group.iterrows():
+            lemma = re.sub(r'<[^>]+>', '', row[COL_WORD]).strip() if isinstance(row[COL_WORD], str) else ""
+            sid = str(row[COL_STRONG]).strip()
+            if lemma and sid and sid != "nan":
+                tokens.append({"id": sid, "lemma": lemma, "def": dictionary.get_keywords(sid)})
+        if tokens:
+            grouped[f"{book_map[int(parts[1])]}-{parts[2]}-{parts[3]}"] = tokens
+    return grouped
+
+
+def test_vectorized_loader_matches_the_row_loop(tmp_path, strongs_dir):
+    path = tmp_path / "bhs.tsv"
+    write_bhs(path)
+    dictionary = DictionaryService(str(strongs_dir))
+    loaded = load_hebrew_csv(str(path), dictionary)
+    expected = row_loop_loader(str(path), dictionary)
+    # Same verses and tokens; the key order may differ (the queue follows the Hungarian file)
+    assert loaded == expected
+    assert sorted(loaded) == ["1ch-1-1", "gen-1-1", "gen-1-2"]
+    assert [token["lemma"] for token in loaded["gen-1-2"]] == ["הָאָ֗רֶץ"]
+
+
+def test_token_cache_follows_size_and_mtime(tmp_path, capsys):
+    path = tmp_path / "bhs.tsv"
+    cache = tmp_path / "bhs.tokens.pkl"
+    write_bhs(path)
+    first = load_hebrew_tokens(str(path), str(cache))
+    assert cache.exists()
+    assert load_hebrew_tokens(str(path), str(cache)).equals(first)
+    assert "Using cached tokens" in capsys.readouterr().out
+
+    # Same size, newer mtime: parsed again
+    write_bhs(path, [(vid, word, "H7226" if sid == "H9003" else sid) for vid, word, sid in BHS_ROWS])
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    tokens = load_hebrew_tokens(str(path), str(cache))
+    assert "Using cached tokens" not in capsys.readouterr().out
+    assert tokens["id"].astype(str).iloc[0] == "H7226"
+
+    # Size changed (a row appended): parsed again
+    write_bhs(path, BHS_ROWS + [("〔1｜1｜2｜1〕", "<H>וַ</H>", "H3615")])
+    assert "gen-2-1" in set(load_hebrew_tokens(str(path), str(cache))["vid"].astype(str))
+    assert "Using cached tokens" not in capsys.readouterr().out
+
+    # An unreadable cache is ignored and rewritten
+    cache.write_bytes(b"not a pickle")
+    assert len(load_hebrew_tokens(str(path), str(cache))) == len(tokens) + 1
+    assert "Ignoring unreadable cache" in capsys.readouterr().out
+
+
+def test_payload_keeps_the_system_prompt_constant():
+    llm = LLMClient("http://127.0.0.1:1/api/generate")
+    first = llm.build_payload([verse(1)])
+    second = llm.build_payload([verse(2, "Az ég és a föld"), verse(3)])
+
+    assert first["system"] == second["system"] == SYSTEM_PROMPT
+    assert first["keep_alive"] == CONFIG["KEEP_ALIVE"]
+    assert "temperature" not in first and first["options"]["temperature"] == 0.0
+    # Only the batch data differs between requests
+    assert {key: value for key, value in first.items() if key != "prompt"} == \
+        {key: value for key, value in second.items() if key != "prompt"}
+    assert second["prompt"].startswith("DATA:\n")
+    assert [item["id"] for item in json.loads(second["prompt"][len("DATA:\n"):])] == ["gen-1-2", "gen-1-3"]
+    assert "gen-1" not in SYSTEM_PROMPT
+
+
+def test_a_repeated_system_prompt_is_not_evaluated_again(fake_ollama, config, monkeypatch):
+    monkeypatch.setattr(_FakeOllamaHandler, "seen_systems", set())
+    batch = [verse(1)]
+
+    async def run():
+        async with LLMClient(fake_ollama, in_flight=1) as llm:
+            counts = []
+            for _ in range(3):
+                before = llm.prompt_tokens
+                await llm.process_items(batch)
+                counts.append(llm.prompt_tokens - before)
+            return counts
+
+    first, second, third = asyncio.run(run())
+    assert second == third
+    # Only the first request paid for the system prompt
+    assert abs(first - second - len(SYSTEM_PROMPT) // 4) <= 1
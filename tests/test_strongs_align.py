@@ -0,0 +1,115 @@
+import pytest
+
+from strongs_align import (PreAligner, StrongsLexicon, number_tokens, parse_tag_pairs, skeleton, splice_tags,
+                           tagged_to_pairs, tokenize)
+
+HEBREW = {
+    "H5146": {"translit": "Nôach", "defs": {"hu": "§ Noé = nyugalom", "en": "Noah"}},
+    "H8035": {"translit": "Shêm", "defs": {"hu": "§ Sém = név", "en": "Shem"}},
+    "H2526": {"translit": "Châm", "defs": {"hu": "§ Khám = forró", "en": "Ham"}},
+    "H3315": {"translit": "Yepheth", "defs": {"hu": "§ Jáfet = tágasság", "en": "Japheth"}},
+    "H1121a": {"translit": "bên", "defs": {"hu": "fiú; gyermek", "en": "son"}},
+    "H2421": {"translit": "châyâh", "defs": {"hu": "élni; életben maradni", "en": "live"}},
+}
+GREEK = {"sw-2424": {"strongs": 2424, "transliteration": "Iēsous", "definition": {"hu": "§ Jézus", "en": "Jesus"}}}
+
+NAMES_KJV = "Noah{H5146}, Shem{H8035}, Ham{H2526}, and Japheth{H3315}."
+NAMES_HU = "Noé, Sém, Khám és Jáfet."
+
+
+@pytest.fixture
+def lexicon():
+    return StrongsLexicon(HEBREW, GREEK)
+
+
+@pytest.mark.parametrize("a, b", [("Khám", "Ham"), ("Jáfet", "Japheth"), ("Tógármah", "Togarmah"),
+                                  ("Miczráim", "micrájim")])
+def test_skeleton_ignores_transliteration(a, b):
+    assert skeleton(a) == skeleton(b)
+
+
+def test_tokenize_keeps_offsets():
+    text = "Jáfetnek fiai: Gómer, Mésekh-Thirász."
+    assert [word for _, _, word in tokenize(text)] == ["Jáfetnek", "fiai", "Gómer", "Mésekh-Thirász"]
+    assert all(text[start:end] == word for start, end, word in tokenize(text))
+
+
+def test_splice_tags_only_adds_tags():
+    text = "Noé, Sém, Khám és Jáfet."
+    tokens = tokenize(text)
+    tagged = splice_tags(text, tokens, {4: ["H3315"], 0: ["H5146", "H1"]})
+    assert tagged == "Noé{H5146}{H1}, Sém, Khám és Jáfet{H3315}."
+    assert splice_tags(text, tokens, {}) == text
+
+
+def test_tagged_to_pairs_round_trip():
+    clean, pairs = tagged_to_pairs("Mésekh {H4902} és Thirász{H8494}.")
+    assert clean == "Mésekh és Thirász."
+    assert pairs == [(1, "H4902"), (3, "H8494")]
+    # A tag with no word before it is dropped
+    assert tagged_to_pairs("{H1} nincs előtte szó") == (" nincs előtte szó", [])
+
+
+def test_lexicon_keys(lexicon):
+    assert lexicon.entry("H1121")["translit"] == "bên"
+    assert lexicon.entry("H01121") is lexicon.entry("H1121")
+    assert lexicon.entry("G2424")["transliteration"] == "Iēsous"
+    assert lexicon.is_name("H2526") and not lexicon.is_name("H1121")
+
+
+def test_names_are_aligned(lexicon):
+    alignment = PreAligner(lexicon).align(NAMES_KJV, NAMES_HU)
+    assert alignment.text == "Noé{H5146}, Sém{H8035}, Khám{H2526} és Jáfet{H3315}."
+    assert (alignment.placed, alignment.total, alignment.untagged) == (4, 4, ())
+
+
+def test_unplaced_name_goes_to_the_llm(lexicon):
+    assert PreAligner(lexicon).align(NAMES_KJV, "Noé, Sém és a harmadik fiú.") is None
+
+
+def test_untagged_codes_are_reported_or_rejected(lexicon):
+    kjv = NAMES_KJV[:-1] + " lived{H2421}."
+    hu = NAMES_HU
+    # 4 of 5 codes placed: the dropped code is reported, and pulls the confidence down to 0.8
+    alignment = PreAligner(lexicon, min_coverage=0.8).align(kjv, hu)
+    assert alignment.untagged == ("H2421",)
+    assert alignment.confidence == pytest.approx(0.8)
+    assert alignment.text == "Noé{H5146}, Sém{H8035}, Khám{H2526} és Jáfet{H3315}."
+    assert PreAligner(lexicon, min_coverage=0.8, min_confidence=0.9).align(kjv, hu) is None
+    assert PreAligner(lexicon, min_coverage=1.0, min_confidence=0).align(kjv, hu) is None
+    # By default every code has to be placed
+    assert PreAligner(lexicon).align(kjv, hu) is None
+
+
+def test_gloss_alignment(lexicon):
+    alignment = PreAligner(lexicon).align("The children{H1121} of Noah{H5146}.", "Noé gyermekei.")
+    assert alignment.text == "Noé{H5146} gyermekei{H1121}."
+
+
+def test_untagged_verse(lexicon):
+    assert PreAligner(lexicon).align("No tags here.", "Nincs tag.") is None
+
+
+def test_number_tokens():
+    assert number_tokens(tokenize(NAMES_HU)) == "1:Noé 2:Sém 3:Khám 4:és 5:Jáfet"
+
+
+@pytest.mark.parametrize("output, expected", [
+    ("1=H5146, 3=H2526", {0: ["H5146"], 2: ["H2526"]}),
+    ("1: {H5146}\n3 -> H2526\n5 = { H3315 }", {0: ["H5146"], 2: ["H2526"], 4: ["H3315"]}),
+    ("Itt a válasz: 1=H5146 és 1=H5146, 1=H8035", {0: ["H5146", "H8035"]}),
+    # Out of range word numbers and codes that are not in the verse are dropped
+    ("0=H5146, 6=H3315, 2=H9999, 2=H8035", {1: ["H8035"]}),
+    ("Noé{H5146}, Sém{H8035}", {}),
+    ("", {}),
+])
+def test_parse_tag_pairs_on_malformed_output(output, expected):
+    allowed = {"H5146", "H8035", "H2526", "H3315"}
+    assert parse_tag_pairs(output, 5, allowed) == expected
+
+
+def test_parsed_pairs_splice_into_the_original_text():
+    tokens = tokenize(NAMES_HU)
+    placements = parse_tag_pairs("3=H2526, 1=H5146, 5=H3315, 2=H8035", len(tokens),
+                                 {"H5146", "H8035", "H2526", "H3315"})
+    assert splice_tags(NAMES_HU, tokens, placements) == "Noé{H5146}, Sém{H8035}, Khám{H2526} és Jáfet{H3315}."
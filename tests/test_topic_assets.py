@@ -0,0 +1,58 @@
+import json
+
+from bible_refs import parse_references
+from topic_assets import MANIFEST_FILE, VALIDATION_TRANSLATION, build, expand_verse_ids, verse_runs
+from verse_source import LocalBibleSource
+
+
+def local_bible(tmp_path):
+    bible = tmp_path / "bible"
+    bible.mkdir()
+    (bible / "psa_46.json").write_text(json.dumps({str(v): "x" for v in range(1, 12)}), encoding="utf-8")
+    (bible / "jer_29.json").write_text(json.dumps({str(v): "x" for v in (1, 2, 3, 5, 6)}), encoding="utf-8")
+    return LocalBibleSource({VALIDATION_TRANSLATION: str(bible)})
+
+
+def test_verse_runs():
+    assert verse_runs([1, 2, 3, 5, 7, 8]) == [(1, 3), (5, 5), (7, 8)]
+    assert verse_runs([]) == []
+
+
+def test_span_ids_without_local_translation():
+    warnings = []
+    refs = parse_references(["Exod 3:14-15", "Jer 29:11", "Psalm 46", "Rom 8:28ff", "Jer 29:11"])
+    assert expand_verse_ids(refs, None, warnings) == ["exo-3-14-15", "jer-29-11"]
+    # Whole chapters and open ranges cannot be resolved, but are not dropped silently
+    assert len(warnings) == 2
+
+
+def test_whole_chapters_resolved_with_local_translation(tmp_path):
+    local = local_bible(tmp_path)
+    warnings = []
+    refs = parse_references(["Psalm 46", "Ps 46:10ff", "Jer 29:1-6", "John 3:16"])
+    assert expand_verse_ids(refs, local, warnings) == [
+        "psa-46-1-11", "psa-46-10-11", "jer-29-1-3", "jer-29-5-6", "joh-3-16"]
+    assert warnings == ["Jeremiah 29:1-6: verse 4 does not exist, left out",
+                        "John 3:16: chapter missing from the local translation"]
+    local.close()
+
+
+def test_manifest_is_kept_per_output_folder(tmp_path, capsys):
+    topics = tmp_path / "topics.json"
+    topics.write_text(json.dumps([{"topic": "Hope", "verses": ["Jer 29:11"]}]), encoding="utf-8")
+    first, second = tmp_path / "first", tmp_path / "second"
+
+    build(str(topics), str(first))
+    build(str(topics), str(second))
+
+    for folder in (first, second):
+        assert json.loads((folder / "hope.json").read_text(encoding="utf-8")) == {"verse_ids": ["jer-29-11"]}
+        index = json.loads((folder / "index.json").read_text(encoding="utf-8"))
+        assert [(item["id"], item["verseCount"]) for item in index] == [("hope", 1)]
+        assert list(json.loads((folder / MANIFEST_FILE).read_text(encoding="utf-8"))) == ["hope"]
+    # Nothing outside the output folders is written
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["first", "second", "topics.json"]
+
+    capsys.readouterr()
+    build(str(topics), str(first))
+    assert "1 topics, 0 changed" in capsys.readouterr().out
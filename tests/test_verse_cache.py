@@ -0,0 +1,69 @@
+import pytest
+
+import verse_cache
+from bible_refs import VerseRef
+from verse_cache import VerseCache, ref_key
+
+PS23_1 = VerseRef("psa", 23, 1, 1)
+PS23_2 = VerseRef("psa", 23, 2, 2)
+PS23_3 = VerseRef("psa", 23, 3, 3)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(verse_cache.time, "time", lambda: now[0])
+    return now
+
+
+def open_cache(tmp_path, **options):
+    return VerseCache(str(tmp_path / "cache.sqlite"), **options)
+
+
+def test_ref_key():
+    assert ref_key(VerseRef("psa", 103, 2, 3)) == "psa-103-2-3"
+    assert ref_key(VerseRef("psa", 46)) == "psa-46"
+    assert ref_key(VerseRef("rom", 8, 28, None)) == "rom-8-28-"
+
+
+def test_round_trip_and_persistence(tmp_path):
+    cache = open_cache(tmp_path)
+    cache.put_many({("web", PS23_1): "The Lord is my shepherd", ("bbe", PS23_1): ""})
+    cache.close()
+
+    cache = open_cache(tmp_path)
+    found = cache.get_many([("web", PS23_1), ("bbe", PS23_1), ("ylt", PS23_1)])
+    assert found == {("web", PS23_1): "The Lord is my shepherd", ("bbe", PS23_1): ""}
+    assert (cache.hits, cache.misses) == (2, 1)
+    cache.close()
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path, clock):
+    cache = open_cache(tmp_path, max_bytes=20)
+    cache.put_many({("web", PS23_1): "a" * 8})
+    clock[0] += 1
+    cache.put_many({("web", PS23_2): "b" * 8})
+    clock[0] += 1
+    # Reading PS23_1 makes PS23_2 the least recently used entry
+    cache.get_many([("web", PS23_1)])
+    clock[0] += 1
+    cache.put_many({("web", PS23_3): "c" * 8})
+
+    found = cache.get_many([("web", PS23_1), ("web", PS23_2), ("web", PS23_3)])
+    assert set(found) == {("web", PS23_1), ("web", PS23_3)}
+    cache.close()
+
+
+def test_ttl_expiry(tmp_path, clock):
+    cache = open_cache(tmp_path, ttl=60)
+    cache.put_many({("web", PS23_1): "old"})
+    clock[0] += 30
+    assert cache.get_many([("web", PS23_1)]) == {("web", PS23_1): "old"}
+    clock[0] += 31
+    assert cache.get_many([("web", PS23_1)]) == {}
+
+    # Expired rows are dropped on the next write
+    cache.put_many({("web", PS23_2): "new"})
+    count = cache._db.execute("SELECT COUNT(*) FROM verses").fetchone()[0]
+    assert count == 1
+    cache.close()
@@ -0,0 +1,59 @@
+import pytest
+
+from verse_pack import PACK_SUFFIX, VersePack, encode_pack, open_pack_dir
+
+VERSES = [
+    (2, 1, "Így elvégezteték az ég és a föld."),
+    (1, 2, "A föld pedig kietlen és puszta vala"),
+    (1, 1, "Kezdetben teremté Isten az eget és a földet."),
+    (1, 31, "És látá Isten, hogy minden, a mit teremtett vala, ímé igen jó."),
+    (10, 3, ""),
+]
+
+
+@pytest.fixture
+def pack_path(tmp_path):
+    path = tmp_path / f"gen{PACK_SUFFIX}"
+    path.write_bytes(encode_pack("gen", "1 Mózes", VERSES))
+    return path
+
+
+def test_round_trip(pack_path):
+    with VersePack(str(pack_path)) as pack:
+        assert (pack.book_id, pack.book_name) == ("gen", "1 Mózes")
+        for chapter, verse, text in VERSES:
+            assert pack.get_verse(chapter, verse) == text
+        assert pack.get_verse(1, 3) is None
+        assert pack.get_verse(3, 1) is None
+
+
+def test_ranges_and_listing(pack_path):
+    with VersePack(str(pack_path)) as pack:
+        assert pack.chapters() == [1, 2, 10]
+        assert pack.verses(1) == [1, 2, 31]
+        assert [v for v, _ in pack.get_range(1, 2, 40)] == [2, 31]
+        assert pack.get_range(1, 3, 30) == []
+        assert [v for v, _ in pack.get_range(1, 0, 0xFFFF)] == [1, 2, 31]
+
+
+def test_encoding_is_deterministic():
+    assert encode_pack("gen", "1 Mózes", VERSES) == encode_pack("gen", "1 Mózes", list(reversed(VERSES)))
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "gen_1.json"
+    path.write_bytes(b'{"1": "not a pack, but long enough for a header"}')
+    with pytest.raises(ValueError):
+        VersePack(str(path))
+
+
+def test_open_pack_dir(tmp_path, pack_path):
+    (tmp_path / f"exo{PACK_SUFFIX}").write_bytes(encode_pack("exo", "2 Mózes", [(1, 1, "Ezek pedig")]))
+    (tmp_path / "notes.txt").write_text("ignored")
+    packs = open_pack_dir(str(tmp_path))
+    try:
+        assert sorted(packs) == ["exo", "gen"]
+        assert packs["exo"].get_verse(1, 1) == "Ezek pedig"
+    finally:
+        for pack in packs.values():
+            pack.close()
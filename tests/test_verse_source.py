@@ -0,0 +1,125 @@
+import asyncio
+import json
+from urllib.parse import unquote
+
+import pytest
+
+from bible_refs import VerseRef
+from verse_cache import VerseCache
+from verse_pack import encode_pack
+from verse_source import BibleApiSource, CacheSource, LocalBibleSource, VerseSource, fetch_texts, response_text
+
+PS23_1 = VerseRef("psa", 23, 1, 1)
+PS23_1_2 = VerseRef("psa", 23, 1, 2)
+PS46 = VerseRef("psa", 46)
+PS46_1 = VerseRef("psa", 46, 1, 1)
+JOHN3_16 = VerseRef("joh", 3, 16, 16)
+JUDE_30 = VerseRef("jud", 1, 30, 30)
+
+
+class RecordingSource(VerseSource):
+    name = "recording"
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.asked = []
+
+    def fetch(self, pairs, on_texts=None):
+        self.asked.extend(pairs)
+        return {pair: self.texts[pair] for pair in pairs if pair in self.texts}
+
+
+def test_response_text_filters_batched_response():
+    data = {"verses": [
+        {"chapter": 23, "verse": 1, "text": "one\n"},
+        {"chapter": 23, "verse": 2, "text": "two\n"},
+        {"chapter": 24, "verse": 1, "text": "other chapter\n"},
+    ]}
+    assert response_text(PS23_1_2, data) == "one two"
+    assert response_text(VerseRef("psa", 23, 2, None), data) == "two"
+    assert response_text(PS23_1, {"text": " single \n"}) == "single"
+
+
+def test_local_source_formats(tmp_path):
+    pretty = tmp_path / "pretty"
+    pretty.mkdir()
+    (pretty / "psa_23.json").write_text(json.dumps(
+        {"version_meta": {}, "verses": {"psa-23-1": "a", "psa-23-2": "b"}}), encoding="utf-8")
+    compact = tmp_path / "compact"
+    compact.mkdir()
+    (compact / "psa_23.json").write_text(json.dumps({"1": "c", "2": "d"}), encoding="utf-8")
+    frontend = tmp_path / "frontend" / "psa"
+    frontend.mkdir(parents=True)
+    (frontend / "23.json").write_text(json.dumps([{"v": 1, "text": "e"}, {"v": 2, "text": "f"}]), encoding="utf-8")
+    packed = tmp_path / "packed"
+    packed.mkdir()
+    (packed / "psa.pack").write_bytes(encode_pack("psa", "Psalm", [(23, 1, "g"), (23, 2, "h")]))
+
+    local = LocalBibleSource({"pretty": str(pretty), "compact": str(compact),
+                              "frontend": str(tmp_path / "frontend"), "packed": str(packed),
+                              "missing": str(tmp_path / "missing")})
+    pairs = [(translation, PS23_1_2) for translation in ("pretty", "compact", "frontend", "packed", "missing")]
+    assert local.fetch(pairs) == {("pretty", PS23_1_2): "a b", ("compact", PS23_1_2): "c d",
+                                  ("frontend", PS23_1_2): "e f", ("packed", PS23_1_2): "g h"}
+    assert local.chapter_verses("packed", "psa", 23) == [1, 2]
+    assert local.chapter_verses("packed", "psa", 24) is None
+    local.close()
+
+
+def test_chain_asks_later_sources_only_for_the_rest():
+    first = RecordingSource({("web", PS23_1): "local"})
+    second = RecordingSource({("web", PS23_1): "never used", ("web", PS46): "remote"})
+    texts = fetch_texts([first, second], [("web", PS23_1), ("web", PS46), ("web", PS46)])
+    assert texts == {("web", PS23_1): "local", ("web", PS46): "remote"}
+    assert second.asked == [("web", PS46)]
+
+
+def test_cache_source_serves_offline_runs(tmp_path):
+    cache = VerseCache(str(tmp_path / "cache.sqlite"))
+    cache.put_many({("web", PS23_1): "cached"})
+    served = []
+    texts = fetch_texts([RecordingSource({}), CacheSource(cache)], [("web", PS23_1), ("web", PS46)],
+                        on_texts=served.append)
+    assert texts == {("web", PS23_1): "cached"}
+    assert served == [{("web", PS23_1): "cached"}]
+    cache.close()
+
+
+def test_chain_falls_through_local_cache_and_api(tmp_path, monkeypatch):
+    httpx = pytest.importorskip("httpx")
+    local_dir = tmp_path / "web"
+    local_dir.mkdir()
+    (local_dir / "psa_23.json").write_text(json.dumps({"1": "local one"}), encoding="utf-8")
+    cache = VerseCache(str(tmp_path / "cache.sqlite"))
+    cache.put_many({("web", PS46_1): "cached", ("ylt", PS23_1): ""})
+
+    asked = []
+
+    def handler(request):
+        query, translation = unquote(request.url.path.lstrip("/")), request.url.params["translation"]
+        asked.append((query, translation))
+        if translation == "bbe":
+            return httpx.Response(500)
+        if query.startswith("Jude"):
+            return httpx.Response(404, json={"error": "not found"})
+        return httpx.Response(200, json={"verses": [{"chapter": 3, "verse": 16, "text": "For God so loved\n"}]})
+
+    async def no_backoff(seconds):
+        pass
+    monkeypatch.setattr(asyncio, "sleep", no_backoff)
+
+    sources = [LocalBibleSource({"web": str(local_dir)}), CacheSource(cache),
+               BibleApiSource(cache, transport=httpx.MockTransport(handler), rate=1000, max_retries=0)]
+    pairs = [("web", PS23_1), ("web", PS46_1), ("ylt", PS23_1), ("web", JOHN3_16), ("web", JUDE_30), ("bbe", PS23_1)]
+    served = []
+    texts = fetch_texts(sources, pairs, on_texts=served.append)
+
+    assert texts == {("web", PS23_1): "local one", ("web", PS46_1): "cached", ("ylt", PS23_1): "",
+                     ("web", JOHN3_16): "For God so loved", ("web", JUDE_30): ""}
+    # Only what the local translation and the cache could not serve reached the API
+    assert sorted(asked) == [("John+3:16", "web"), ("Jude+1:30", "web"), ("Psalm+23:1", "bbe")]
+    assert {pair for batch in served for pair in batch} == set(texts)
+    # Answers are cached, the failed request is not
+    assert cache.get_many([("web", JOHN3_16), ("web", JUDE_30), ("bbe", PS23_1)]) == {
+        ("web", JOHN3_16): "For God so loved", ("web", JUDE_30): ""}
+    cache.close()
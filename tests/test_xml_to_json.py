@@ -0,0 +1,289 @@
+import gzip
+import json
+import os
+
+import pytest
+
+import xml_to_json
+from xml_to_json import convert_xml_to_json
+
+XML = """<?xml version="1.0" encoding="utf-8"?>
+<XMLBIBLE biblename="Test">
+  <BIBLEBOOK bnumber="1" bname="Genesis">
+    <CHAPTER cnumber="1">
+      <VERS vnumber="1">In the beginning</VERS>
+      <VERS vnumber="2">And the earth</VERS>
+    </CHAPTER>
+    <CHAPTER cnumber="2">
+      <VERS vnumber="1">Thus the heavens</VERS>
+    </CHAPTER>
+  </BIBLEBOOK>
+</XMLBIBLE>
+"""
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "bible.xml"
+    path.write_text(XML, encoding="utf-8")
+    return path
+
+
+def convert(source, output, **options):
+    return convert_xml_to_json(str(source), str(output), "Test", "eng", **options)
+
+
+def test_chapters_and_manifest(tmp_path, source):
+    output = tmp_path / "out"
+    assert convert(source, output) == {"gen": 2}
+    chapter = json.loads((output / "gen_1.json").read_text(encoding="utf-8"))
+    assert chapter["verses"] == {"gen-1-1": "In the beginning", "gen-1-2": "And the earth"}
+    manifest = json.loads((output / xml_to_json.MANIFEST_FILE).read_text(encoding="utf-8"))
+    assert sorted(manifest["chapters"]) == ["gen_1.json", "gen_2.json"]
+
+
+def test_precompressed_siblings(tmp_path, source):
+    output = tmp_path / "out"
+    convert(source, output, output_format="compact", precompress=True)
+    assert json.loads(gzip.decompress((output / "gen_1.json.gz").read_bytes())) == {
+        "1": "In the beginning", "2": "And the earth"}
+
+
+@pytest.mark.parametrize("force", [False, True])
+def test_turning_precompression_off_removes_siblings(tmp_path, source, force):
+    output = tmp_path / "out"
+    convert(source, output, output_format="compact", precompress=True, pack=True)
+    (output / "notes.txt").write_text("kept", encoding="utf-8")
+    (output / "exo_1.json.gz").write_bytes(b"orphan")
+
+    convert(source, output, force=force)
+    assert sorted(p.name for p in output.iterdir()) == [
+        xml_to_json.MANIFEST_FILE, "gen_1.json", "gen_2.json", "notes.txt"]
+
+
+def test_removed_chapters_are_deleted_when_up_to_date(tmp_path, source):
+    output = tmp_path / "out"
+    convert(source, output)
+    (output / "gen_3.json").write_text("{}", encoding="utf-8")
+    convert(source, output)
+    assert not (output / "gen_3.json").exists()
+
+
+MULTI_BOOK_XML = """<?xml version="1.0" encoding="utf-8"?>
+<XMLBIBLE biblename="Test">
+  <BIBLEBOOK bnumber="1" bname="Genesis">
+    <CHAPTER cnumber="1">
+      <VERS vnumber="1"><gr str="7225">In the</gr> <gr str="1254">beginning</gr></VERS>
+      <VERS vnumber="2">And the <STYLE css="font-style:italic">earth</STYLE>
+        was without form</VERS>
+    </CHAPTER>
+    <CHAPTER cnumber="2">
+      <VERS vnumber="1">Thus the heavens</VERS>
+      <VERS vnumber="2"></VERS>
+    </CHAPTER>
+  </BIBLEBOOK>
+  <BIBLEBOOK bnumber="99" bname="Unknown">
+    <CHAPTER cnumber="1"><VERS vnumber="1">skipped</VERS></CHAPTER>
+  </BIBLEBOOK>
+  <BIBLEBOOK bnumber="2" bname="Exodus">
+    <CHAPTER cnumber="1"><VERS vnumber="1">Now these are the names</VERS></CHAPTER>
+  </BIBLEBOOK>
+  <BIBLEBOOK bnumber="66" bname="Revelation">
+    <CHAPTER cnumber="22"><VERS vnumber="21">The grace</VERS></CHAPTER>
+  </BIBLEBOOK>
+</XMLBIBLE>
+"""
+
+
+@pytest.fixture
+def multi_book_source(tmp_path):
+    path = tmp_path / "multi.xml"
+    path.write_text(MULTI_BOOK_XML, encoding="utf-8")
+    return path
+
+
+def read_tree(directory):
+    return {p.name: p.read_bytes() for p in sorted(directory.iterdir())}
+
+
+@pytest.mark.parametrize("options", [
+    {"output_format": "pretty"},
+    {"output_format": "compact", "precompress": True, "pack": True},
+])
+def test_parallel_output_is_identical_to_serial(tmp_path, multi_book_source, options):
+    serial, parallel = tmp_path / "serial", tmp_path / "parallel"
+    counts = convert(multi_book_source, serial, **options)
+    assert convert(multi_book_source, parallel, workers=2, **options) == counts
+    assert counts == {"gen": 2, "exo": 1, "rev": 1}
+    assert read_tree(parallel) == read_tree(serial)
+
+
+def test_streaming_and_tree_iterators_agree(multi_book_source):
+    streamed = list(xml_to_json.iter_chapters_streaming(str(multi_book_source)))
+    assert streamed == list(xml_to_json.iter_chapters_tree(str(multi_book_source)))
+    assert [(book_id, c_number) for book_id, _, c_number, _ in streamed] == [
+        ("gen", "1"), ("gen", "2"), ("exo", "1"), ("rev", "22")]
+    assert streamed[0][3] == [("1", "In the beginning"), ("2", "And the earth was without form")]
+    # Empty verses are left out
+    assert streamed[1][3] == [("1", "Thus the heavens")]
+
+
+def test_streaming_releases_finished_chapters(multi_book_source):
+    chapters = xml_to_json.iter_chapters_streaming(str(multi_book_source))
+    next(chapters)
+    frame = chapters.gi_frame
+    # The previous chapter is cleared as soon as the next one is read, only the current one holds verses
+    next(chapters)
+    root = frame.f_locals["root"]
+    book = root.find("BIBLEBOOK")
+    assert [len(chapter) for chapter in book.findall("CHAPTER")] == [0, 2]
+    list(chapters)
+    assert len(root) == 0
+
+
+def test_tree_mode_writes_the_same_files(tmp_path, multi_book_source):
+    convert(multi_book_source, tmp_path / "streaming")
+    convert(multi_book_source, tmp_path / "tree", streaming=False)
+    assert read_tree(tmp_path / "tree") == read_tree(tmp_path / "streaming")
+
+
+def record_writes(monkeypatch):
+    written = []
+    write_output = xml_to_json.write_output
+
+    def recording(filepath, data, settings):
+        written.append(os.path.basename(filepath))
+        write_output(filepath, data, settings)
+    monkeypatch.setattr(xml_to_json, "write_output", recording)
+    return written
+
+
+def test_only_changed_chapters_are_rewritten(tmp_path, multi_book_source, monkeypatch, capsys):
+    output = tmp_path / "out"
+    convert(multi_book_source, output)
+    written = record_writes(monkeypatch)
+
+    # Unchanged source: nothing is parsed or written
+    convert(multi_book_source, output)
+    assert written == []
+    assert "Nincs változás" in capsys.readouterr().out
+
+    # One verse changed: only its chapter is written, the manifest follows
+    multi_book_source.write_text(MULTI_BOOK_XML.replace("Thus the heavens", "Thus the heavens and the earth"),
+                                 encoding="utf-8")
+    before = json.loads((output / xml_to_json.MANIFEST_FILE).read_text(encoding="utf-8"))
+    convert(multi_book_source, output)
+    assert written == ["gen_2.json"]
+    after = json.loads((output / xml_to_json.MANIFEST_FILE).read_text(encoding="utf-8"))
+    changed = {name for name in after["chapters"] if after["chapters"][name] != before["chapters"][name]}
+    assert changed == {"gen_2.json"}
+    assert after["source_sha256"] != before["source_sha256"]
+
+    # A deleted output file is written again even though its digest is known
+    written.clear()
+    (output / "exo_1.json").unlink()
+    convert(multi_book_source, output)
+    assert written == ["exo_1.json"]
+
+    # --force rebuilds everything
+    written.clear()
+    convert(multi_book_source, output, force=True)
+    assert sorted(written) == ["exo_1.json", "gen_1.json", "gen_2.json", "rev_22.json"]
+
+
+def test_changed_settings_rewrite_every_chapter(tmp_path, multi_book_source, monkeypatch):
+    output = tmp_path / "out"
+    convert(multi_book_source, output)
+    written = record_writes(monkeypatch)
+    convert_xml_to_json(str(multi_book_source), str(output), "Renamed", "eng")
+    assert sorted(written) == ["exo_1.json", "gen_1.json", "gen_2.json", "rev_22.json"]
+
+
+def test_registry_converts_translations_and_updates_structures(tmp_path, multi_book_source, source):
+    structures = tmp_path / "structures"
+    structures.mkdir()
+    (structures / "versions.json").write_bytes(json.dumps(
+        {"kept": {"name": "Kept", "lang": "x", "structure": "standard", "path": "kept"},
+         "multi": {"name": "Old name", "extra": 1}}, indent=2).replace("\n", "\r\n").encode("utf-8"))
+    (structures / "structures.json").write_text(json.dumps(
+        {"standard": {"gen": 50}, "multi": {"note": "kézzel írt megjegyzés", "gen": 1, "mal": 4}}, indent=2),
+        encoding="utf-8")
+    (tmp_path / "registry.json").write_text(json.dumps({
+        "output_root": "bibles",
+        "structures_dir": "structures",
+        "translations": [
+            {"id": "multi", "input": multi_book_source.name, "name": "Multi", "lang": "eng", "lang_label": "English"},
+            {"id": "single", "input": source.name, "name": "Single", "lang": "eng", "structure": "multi"},
+            {"id": "missing", "input": "missing.xml", "name": "Missing", "lang": "hun"},
+        ]}), encoding="utf-8")
+
+    xml_to_json.convert_registry(str(tmp_path / "registry.json"), workers=2)
+
+    # Relative paths are resolved against the registry file, one folder per translation
+    assert (tmp_path / "bibles" / "multi" / "rev_22.json").exists()
+    assert (tmp_path / "bibles" / "single" / "gen_2.json").exists()
+    assert not (tmp_path / "bibles" / "missing").exists()
+
+    raw_versions = (structures / "versions.json").read_bytes()
+    assert b"\r\n" in raw_versions
+    versions = json.loads(raw_versions)
+    assert versions["kept"]["name"] == "Kept"
+    assert versions["multi"] == {"name": "Multi", "extra": 1, "lang": "English", "structure": "multi", "path": "multi"}
+    assert versions["single"] == {"name": "Single", "lang": "eng", "structure": "multi", "path": "single"}
+    assert "missing" not in versions
+
+    structures_json = json.loads((structures / "structures.json").read_text(encoding="utf-8"))
+    assert structures_json["standard"] == {"gen": 50}
+    # Both translations share the "multi" structure: the later one wins, the note stays
+    assert structures_json["multi"] == {"note": "kézzel írt megjegyzés", "gen": 2}
+
+
+def test_registry_counts_survive_a_no_op_rerun(tmp_path, multi_book_source):
+    structures = tmp_path / "structures"
+    structures.mkdir()
+    (structures / "versions.json").write_text("{}", encoding="utf-8")
+    (structures / "structures.json").write_text("{}", encoding="utf-8")
+    registry = tmp_path / "registry.json"
+    registry.write_text(json.dumps({"structures_dir": str(structures), "translations": [
+        {"id": "multi", "input": str(multi_book_source), "name": "Multi", "lang": "eng"}]}), encoding="utf-8")
+
+    xml_to_json.convert_registry(str(registry))
+    first = (structures / "structures.json").read_text(encoding="utf-8")
+    # Nothing changed: the counts come from the build manifest
+    xml_to_json.convert_registry(str(registry))
+    assert (structures / "structures.json").read_text(encoding="utf-8") == first
+    assert json.loads(first) == {"multi": {"gen": 2, "exo": 1, "rev": 1}}
+
+
+def test_compact_format(tmp_path, source):
+    output = tmp_path / "out"
+    convert(source, output, output_format="compact")
+    assert (output / "gen_1.json").read_bytes() == '{"1":"In the beginning","2":"And the earth"}'.encode("utf-8")
+    assert json.loads((output / xml_to_json.VERSION_META_FILE).read_text(encoding="utf-8")) == {
+        "name": "Test", "lang": "eng"}
+
+    # Back to the pretty format: the version file is no longer generated
+    convert(source, output)
+    assert not (output / xml_to_json.VERSION_META_FILE).exists()
+    assert json.loads((output / "gen_1.json").read_text(encoding="utf-8"))["version_meta"] == {
+        "name": "Test", "lang": "eng"}
+
+
+def test_precompressed_files_are_reproducible(tmp_path, source):
+    convert(source, tmp_path / "a", precompress=True)
+    convert(source, tmp_path / "b", precompress=True)
+    first, second = read_tree(tmp_path / "a"), read_tree(tmp_path / "b")
+    assert first["gen_1.json.gz"] == second["gen_1.json.gz"]
+    assert gzip.decompress(first["gen_1.json.gz"]) == first["gen_1.json"]
+    if xml_to_json.brotli is not None:
+        assert xml_to_json.brotli.decompress(first["gen_1.json.br"]) == first["gen_1.json"]
+    else:
+        assert "gen_1.json.br" not in first
+
+
+def test_missing_sibling_is_regenerated(tmp_path, source):
+    output = tmp_path / "out"
+    convert(source, output, precompress=True)
+    (output / "gen_2.json.gz").unlink()
+    convert(source, output, precompress=True)
+    assert gzip.decompress((output / "gen_2.json.gz").read_bytes()) == (output / "gen_2.json").read_bytes()
@@ -0,0 +1,223 @@
+"""
+Topic asset builder: Topics/topics.json -> Frontend/src/assets/topics/<id>.json + index.json.
+
+Replaces the topics.json -> getVerses.py CSV -> generate-topics.js chain
+for the frontend assets. References are parsed with bible_refs, whole
+chapters are expanded and every verse ID is checked against a local
+translation (xml_to_json.py output or the frontend's bibles/<translation>
+folder). Verse IDs use the frontend's span format ("exo-3-14-15").
+Only topics whose entry changed since the last build of the same output
+folder are rebuilt, in parallel; metadata edited by hand in an asset
+(titles, icon, category, ...) is kept.
+
+    python topic_assets.py --validate-with Texts/bibles/eng_rylt
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from bible_refs import VerseRef, parse_references, span_id
+from verse_source import LocalBibleSource
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TOPICS_FILE = os.path.join(SCRIPT_DIR, "Topics", "topics.json")
+ASSETS_DIR = os.path.join(SCRIPT_DIR, "Frontend", "src", "assets", "topics")
+INDEX_FILE = "index.json"
+# Build manifest of an output folder, kept inside it. No .json suffix: every
+# .json there is read as a topic (build_index, generate-topics.js)
+MANIFEST_FILE = ".topic_assets_manifest"
+VALIDATION_TRANSLATION = "validate"
+
+# Same fallbacks as Frontend/generate/generate-topics.js
+INDEX_DEFAULTS = {
+    "titles": {"hu": "Névtelen", "en": "Untitled"},
+    "description": {"hu": "", "en": ""},
+    "icon": "star",
+    "category": "general",
+    "theme_color": "#3b82f6",
+}
+
+
+def topic_id(topic: str) -> str:
+    return "_".join(topic.lower().split())
+
+
+def write_json_atomic(path: str, content):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(content, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_json(path: str, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def verse_runs(verses: List[int]) -> List[Tuple[int, int]]:
+    """Sorted verse numbers -> (start, end) runs of consecutive verses."""
+    runs: List[List[int]] = []
+    for v in verses:
+        if runs and v == runs[-1][1] + 1:
+            runs[-1][1] = v
+        else:
+            runs.append([v, v])
+    return [(start, end) for start, end in runs]
+
+
+def expand_verse_ids(refs: List[VerseRef], local: Optional[LocalBibleSource],
+                     warnings: List[str], translation: str = VALIDATION_TRANSLATION) -> List[str]:
+    """
+    Frontend verse IDs of the references, one span ID per passage, in order
+    and without duplicates. With a local translation, whole chapters and
+    open ranges are resolved against the chapter's verses, and verses
+    missing from the translation are reported and cut out of the span.
+    Without one they cannot be resolved and are left out with a warning.
+    """
+    verse_ids = []
+    for ref in refs:
+        available = local.chapter_verses(translation, ref.book, ref.chapter) if local else None
+        if available is None:
+            verse_id = ref.verse_id()
+            if verse_id is None:
+                reason = ("chapter missing from the local translation" if local
+                          else "no local translation (--validate-with) to count its verses")
+                warnings.append(f"{ref.label()}: left out, {reason}")
+                continue
+            if local:
+                warnings.append(f"{ref.label()}: chapter missing from the local translation")
+            verse_ids.append(verse_id)
+            continue
+
+        if ref.verse_start is None or ref.verse_end is None:
+            verses = [v for v in available if ref.contains(v)]
+            if not verses:
+                warnings.append(f"{ref.label()}: no such verses in the local translation, left out")
+        else:
+            present = set(available)
+            verses = []
+            for v in range(ref.verse_start, ref.verse_end + 1):
+                if v not in present:
+                    warnings.append(f"{ref.label()}: verse {v} does not exist, left out")
+                    continue
+                verses.append(v)
+        verse_ids.extend(span_id(ref.book, ref.chapter, start, end) for start, end in verse_runs(verses))
+    return list(dict.fromkeys(verse_ids))
+
+
+def write_topic_json(json_dir: str, topic: str, refs: List[VerseRef],
+                     local: Optional[LocalBibleSource] = None,
+                     translation: str = VALIDATION_TRANSLATION) -> Tuple[str, int, List[str]]:
+    """
+    Writes the topic in the frontend's assets/topics/<id>.json format.
+    Metadata already in the file is kept, only verse_ids is replaced.
+    `translation` names the local source's translation used to resolve
+    whole chapters. Returns (path, passage count, warnings).
+    """
+    path = os.path.join(json_dir, f"{topic_id(topic)}.json")
+    content = load_json(path, {})
+    warnings: List[str] = []
+    content["verse_ids"] = expand_verse_ids(refs, local, warnings, translation)
+
+    os.makedirs(json_dir, exist_ok=True)
+    write_json_atomic(path, content)
+    return path, len(content["verse_ids"]), warnings
+
+
+def build_topic(entry: dict, assets_dir: str, validate_dir: Optional[str]):
+    """One topic, run in a worker process."""
+    started = time.perf_counter()
+    local = LocalBibleSource({VALIDATION_TRANSLATION: validate_dir}) if validate_dir else None
+    warnings: List[str] = []
+    refs = parse_references(entry["verses"], warn=warnings.append)
+    path, count, expand_warnings = write_topic_json(assets_dir, entry["topic"], refs, local)
+    if local:
+        local.close()
+    return topic_id(entry["topic"]), count, warnings + expand_warnings, time.perf_counter() - started
+
+
+def topic_digest(entry: dict, validate_dir: Optional[str]) -> str:
+    data = json.dumps({"topic": entry, "validate_with": validate_dir}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def build_index(assets_dir: str) -> List[dict]:
+    """index.json in the same shape generate-topics.js produces (TopicSummary)."""
+    index = []
+    for filename in sorted(os.listdir(assets_dir)):
+        if not filename.endswith(".json") or filename == INDEX_FILE:
+            continue
+        data = load_json(os.path.join(assets_dir, filename), None)
+        if data is None:
+            print(f"  [Warning] {filename} is not valid JSON, skipped from the index")
+            continue
+        item = {"id": filename[:-len(".json")]}
+        for key, default in INDEX_DEFAULTS.items():
+            item[key] = data.get(key) or default
+        item["verseCount"] = len(data["verse_ids"]) if isinstance(data.get("verse_ids"), list) else 0
+        index.append(item)
+    write_json_atomic(os.path.join(assets_dir, INDEX_FILE), index)
+    return index
+
+
+def build(topics_file: str = TOPICS_FILE, assets_dir: str = ASSETS_DIR,
+          validate_dir: Optional[str] = None, workers: int = 1, force: bool = False):
+    with open(topics_file, "r", encoding="utf-8") as f:
+        topics = json.load(f)
+    os.makedirs(assets_dir, exist_ok=True)
+    # {topic id: digest} of the last build of this output folder
+    manifest_file = os.path.join(assets_dir, MANIFEST_FILE)
+    manifest: Dict[str, str] = {} if force else load_json(manifest_file, {})
+    if validate_dir and not os.path.isdir(validate_dir):
+        raise SystemExit(f"Local translation folder not found: {validate_dir}")
+
+    digests = {topic_id(entry["topic"]): topic_digest(entry, validate_dir) for entry in topics}
+    changed = [entry for entry in topics
+               if manifest.get(topic_id(entry["topic"])) != digests[topic_id(entry["topic"])]
+               or not os.path.exists(os.path.join(assets_dir, f"{topic_id(entry['topic'])}.json"))]
+    print(f"{len(topics)} topics, {len(changed)} changed")
+
+    started = time.perf_counter()
+    if workers > 1 and len(changed) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(build_topic, changed, [assets_dir] * len(changed),
+                                    [validate_dir] * len(changed)))
+    else:
+        results = [build_topic(entry, assets_dir, validate_dir) for entry in changed]
+
+    for tid, count, warnings, elapsed in results:
+        print(f"✅ {tid}: {count} passages ({elapsed:.2f}s)")
+        for message in warnings:
+            print(f"  [Warning] {message}")
+        manifest[tid] = digests[tid]
+
+    if changed or not os.path.exists(os.path.join(assets_dir, INDEX_FILE)):
+        index = build_index(assets_dir)
+        print(f"index.json: {len(index)} topics")
+    # Topics removed from topics.json drop out of the manifest (their asset files are left alone)
+    write_json_atomic(manifest_file, {tid: digest for tid, digest in manifest.items() if tid in digests})
+    print(f"Done in {time.perf_counter() - started:.2f}s")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the frontend topic assets from topics.json")
+    parser.add_argument("--topics", default=TOPICS_FILE, help="Topic list")
+    parser.add_argument("--output", default=ASSETS_DIR, help="Frontend topics folder")
+    parser.add_argument("--validate-with", default=None, metavar="DIR",
+                        help="Local translation (xml_to_json.py output or frontend bibles/<translation>) "
+                             "used to expand whole chapters and check verse IDs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parallel topic builds")
+    parser.add_argument("--force", action="store_true", help="Rebuild every topic")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    build(args.topics, args.output, args.validate_with, args.workers, args.force)
@@ -0,0 +1,107 @@
+"""
+Persistent verse text cache for getVerses.py.
+
+Entries are keyed by (translation, normalized reference) -- the reference
+key comes from the parsed VerseRef ("psa-103-2-3", "psa-46" for a whole
+chapter) so every spelling of the same reference shares one entry. Stored
+in a single SQLite file with size-bounded LRU eviction and an optional TTL.
+"""
+import sqlite3
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from bible_refs import VerseRef
+
+DEFAULT_CACHE_FILE = "verse_cache.sqlite"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS verses (
+    translation TEXT NOT NULL,
+    ref         TEXT NOT NULL,
+    text        TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    created     REAL NOT NULL,
+    last_used   REAL NOT NULL,
+    PRIMARY KEY (translation, ref)
+);
+CREATE INDEX IF NOT EXISTS verses_last_used ON verses (last_used);
+"""
+
+
+def ref_key(ref: VerseRef) -> str:
+    parts = [ref.book, str(ref.chapter)]
+    if ref.verse_start is not None:
+        parts.append(str(ref.verse_start))
+        parts.append("" if ref.verse_end is None else str(ref.verse_end))
+    return "-".join(parts)
+
+
+class VerseCache:
+    def __init__(self, path: str = DEFAULT_CACHE_FILE, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl: Optional[float] = None):
+        """ttl: seconds after which an entry counts as missing (None = never expires)."""
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+
+    def get_many(self, keys: Iterable[Tuple[str, VerseRef]]) -> Dict[Tuple[str, VerseRef], str]:
+        """Looks up (translation, ref) pairs, returns the cached ones."""
+        now = time.time()
+        found = {}
+        touched = []
+        for translation, ref in keys:
+            row = self._db.execute("SELECT text, created FROM verses WHERE translation = ? AND ref = ?",
+                                   (translation, ref_key(ref))).fetchone()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                self.misses += 1
+                continue
+            self.hits += 1
+            found[(translation, ref)] = row[0]
+            touched.append((now, translation, ref_key(ref)))
+        if touched:
+            with self._db:
+                self._db.executemany("UPDATE verses SET last_used = ? WHERE translation = ? AND ref = ?", touched)
+        return found
+
+    def put_many(self, items: Dict[Tuple[str, VerseRef], str]):
+        now = time.time()
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO verses (translation, ref, text, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(translation, ref_key(ref), text, len(text.encode('utf-8')), now, now)
+                 for (translation, ref), text in items.items()])
+        self.evict()
+
+    def evict(self):
+        """Drops expired entries, then least recently used ones until the cache fits max_bytes."""
+        with self._db:
+            if self.ttl is not None:
+                self._db.execute("DELETE FROM verses WHERE created < ?", (time.time() - self.ttl,))
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM verses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            freed = 0
+            victims = []
+            for translation, ref, size in self._db.execute(
+                    "SELECT translation, ref, size FROM verses ORDER BY last_used"):
+                if total - freed <= self.max_bytes:
+                    break
+                victims.append((translation, ref))
+                freed += size
+            self._db.executemany("DELETE FROM verses WHERE translation = ? AND ref = ?", victims)
+
+    def stats(self) -> str:
+        count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM verses").fetchone()
+        lookups = self.hits + self.misses
+        ratio = self.hits / lookups * 100 if lookups else 0
+        return (f"cache: {self.hits} hits, {self.misses} misses ({ratio:.0f}% hit rate), "
+                f"{count} entries, {size / 1024:.0f} KiB")
+
+    def close(self):
+        self._db.close()
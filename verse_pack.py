@@ -0,0 +1,118 @@
+"""
+Packed per-book verse store.
+
+One ``.pack`` file per book holds the UTF-8 text of every verse plus a
+fixed-width offset table keyed by (chapter, verse), so a verse can be read
+straight out of a memory map without parsing any JSON.
+
+Layout (little-endian):
+    header   "<4sHHI"  magic b"BFPK", format version, meta length, entry count
+    meta     UTF-8 JSON {"book_id": ..., "book_name": ...}, padded to 4 bytes
+    table    entry count x "<HHII"  chapter, verse, text offset, text length
+    blob     concatenated UTF-8 verse texts (offsets are relative to the blob)
+"""
+import bisect
+import json
+import mmap
+import os
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MAGIC = b"BFPK"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+ENTRY = struct.Struct("<HHII")
+PACK_SUFFIX = ".pack"
+
+
+def encode_pack(book_id: str, book_name: str, verses: Iterable[Tuple[int, int, str]]) -> bytes:
+    """Builds the pack bytes for one book from (chapter, verse, text) triples."""
+    entries = sorted(verses, key=lambda item: (item[0], item[1]))
+
+    meta = json.dumps({"book_id": book_id, "book_name": book_name},
+                      ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    meta += b"\0" * (-len(meta) % 4)
+
+    table = bytearray()
+    blob = bytearray()
+    for chapter, verse, text in entries:
+        data = text.encode('utf-8')
+        table += ENTRY.pack(chapter, verse, len(blob), len(data))
+        blob += data
+
+    return HEADER.pack(MAGIC, FORMAT_VERSION, len(meta), len(entries)) + meta + bytes(table) + bytes(blob)
+
+
+class VersePack:
+    """Read-only, memory-mapped view of a single book pack."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, meta_len, count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Not a verse pack (v{FORMAT_VERSION}): {path}")
+
+        meta = json.loads(self._mm[HEADER.size:HEADER.size + meta_len].rstrip(b"\0"))
+        self.book_id: str = meta["book_id"]
+        self.book_name: str = meta["book_name"]
+
+        table_start = HEADER.size + meta_len
+        self._blob_start = table_start + count * ENTRY.size
+
+        # Sorted keys for range scans, dict for O(1) single-verse lookups
+        self._keys: List[Tuple[int, int]] = []
+        self._spans: List[Tuple[int, int]] = []
+        for chapter, verse, offset, length in ENTRY.iter_unpack(self._mm[table_start:self._blob_start]):
+            self._keys.append((chapter, verse))
+            self._spans.append((offset, length))
+        self._index: Dict[Tuple[int, int], int] = {key: i for i, key in enumerate(self._keys)}
+
+    def _text(self, i: int) -> str:
+        offset, length = self._spans[i]
+        start = self._blob_start + offset
+        return self._mm[start:start + length].decode('utf-8')
+
+    def get_verse(self, chapter: int, verse: int) -> Optional[str]:
+        i = self._index.get((chapter, verse))
+        return None if i is None else self._text(i)
+
+    def get_range(self, chapter: int, start: int, end: int) -> List[Tuple[int, str]]:
+        """All stored verses of a chapter with start <= verse <= end, in order."""
+        i = bisect.bisect_left(self._keys, (chapter, start))
+        result = []
+        while i < len(self._keys) and self._keys[i] <= (chapter, end):
+            result.append((self._keys[i][1], self._text(i)))
+            i += 1
+        return result
+
+    def chapters(self) -> List[int]:
+        return sorted({chapter for chapter, _ in self._keys})
+
+    def verses(self, chapter: int) -> List[int]:
+        i = bisect.bisect_left(self._keys, (chapter, 0))
+        j = bisect.bisect_left(self._keys, (chapter + 1, 0))
+        return [verse for _, verse in self._keys[i:j]]
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_pack_dir(pack_dir: str) -> Dict[str, VersePack]:
+    """Opens every .pack file in a directory, keyed by book_id."""
+    packs = {}
+    for filename in sorted(os.listdir(pack_dir)):
+        if filename.endswith(PACK_SUFFIX):
+            pack = VersePack(os.path.join(pack_dir, filename))
+            packs[pack.book_id] = pack
+    return packs
@@ -0,0 +1,250 @@
+"""
+Verse sources for getVerses.py.
+
+A source takes (translation, VerseRef) pairs and returns the text of the
+ones it can serve. getVerses chains them: the local translations generated
+by Texts/xml_to_json.py come first, then the SQLite verse cache, and
+bible-api.com only gets what is left (offline runs stop at the cache).
+"""
+import json
+import os
+import time
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import bible_api
+from bible_refs import VerseRef
+from verse_cache import VerseCache
+from verse_pack import PACK_SUFFIX, VersePack
+
+Pair = Tuple[str, VerseRef]
+# Called with each batch of texts as soon as a source has them
+OnTexts = Optional[Callable[[Dict[Pair, str]], None]]
+
+
+def response_text(ref: VerseRef, data: dict) -> str:
+    """
+    Joins the verses of a bible-api.com response that belong to the reference.
+    The response may cover more of the book (batched query), so it is
+    always filtered by chapter and verse number.
+    """
+    if 'verses' not in data:
+        return data['text'].strip()
+    return " ".join(v['text'].strip() for v in data['verses']
+                    if v.get('chapter', ref.chapter) == ref.chapter and ref.contains(v['verse']))
+
+
+class VerseSource:
+    name = "source"
+
+    def fetch(self, pairs: Sequence[Pair], on_texts: OnTexts = None) -> Dict[Pair, str]:
+        """
+        Returns the text of every pair this source can serve; the rest is left out.
+        Texts are also passed to on_texts as they become available.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class LocalBibleSource(VerseSource):
+    """
+    Reads translations converted by Texts/xml_to_json.py: per-book .pack
+    files if present, otherwise <book>_<chapter>.json in the pretty or the
+    compact format. The frontend layout (<book>/<chapter>.json holding
+    [{"v": ..., "text": ...}]) works too. Parsed chapters are kept in an LRU.
+    """
+    name = "local"
+
+    def __init__(self, dirs: Dict[str, str], chapter_cache: int = 256):
+        """dirs: translation -> output directory of xml_to_json.py"""
+        self.dirs = {translation: path for translation, path in dirs.items() if os.path.isdir(path)}
+        self._packs: Dict[Tuple[str, str], Optional[VersePack]] = {}
+        self._chapter = lru_cache(maxsize=chapter_cache)(self._load_chapter)
+
+    @classmethod
+    def discover(cls, bibles_root: str, translations: Sequence[str],
+                 mapping: Optional[Dict[str, str]] = None, **options) -> "LocalBibleSource":
+        """Explicit translation=dir mappings win, otherwise <bibles_root>/<translation> is used."""
+        dirs = {t: os.path.join(bibles_root, t) for t in translations}
+        dirs.update(mapping or {})
+        return cls(dirs, **options)
+
+    def _pack(self, translation: str, book_id: str) -> Optional[VersePack]:
+        key = (translation, book_id)
+        if key not in self._packs:
+            path = os.path.join(self.dirs[translation], f"{book_id}{PACK_SUFFIX}")
+            self._packs[key] = VersePack(path) if os.path.exists(path) else None
+        return self._packs[key]
+
+    def _load_chapter(self, translation: str, book_id: str, chapter: int) -> Optional[Dict[int, str]]:
+        pack = self._pack(translation, book_id)
+        if pack is not None:
+            verses = pack.get_range(chapter, 0, 0xFFFF)
+            return dict(verses) if verses else None
+
+        for path in (os.path.join(self.dirs[translation], f"{book_id}_{chapter}.json"),
+                     os.path.join(self.dirs[translation], book_id, f"{chapter}.json")):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                break
+            except FileNotFoundError:
+                continue
+        else:
+            return None
+        if isinstance(data, list):
+            # Frontend format: [{"v": 1, "text": ...}]
+            return {int(verse["v"]): verse["text"] for verse in data}
+        if "verses" in data:
+            # Pretty format: {"version_meta": ..., "verses": {"book-c-v": text}}
+            return {int(key.rsplit('-', 1)[1]): text for key, text in data["verses"].items()}
+        # Compact format: {"v": text}
+        return {int(v): text for v, text in data.items()}
+
+    def chapter_verses(self, translation: str, book_id: str, chapter: int) -> Optional[List[int]]:
+        """Verse numbers of a chapter in this translation, None if the chapter is not available."""
+        if translation not in self.dirs:
+            return None
+        verses = self._chapter(translation, book_id, chapter)
+        return None if verses is None else sorted(verses)
+
+    def fetch(self, pairs: Sequence[Pair], on_texts: OnTexts = None) -> Dict[Pair, str]:
+        texts = {}
+        for translation, ref in pairs:
+            if translation not in self.dirs:
+                continue
+            verses = self._chapter(translation, ref.book, ref.chapter)
+            if verses is None:
+                continue
+            texts[(translation, ref)] = " ".join(
+                text for v, text in sorted(verses.items()) if ref.contains(v))
+        if on_texts and texts:
+            on_texts(texts)
+        return texts
+
+    def close(self):
+        for pack in self._packs.values():
+            if pack is not None:
+                pack.close()
+
+
+class CacheSource(VerseSource):
+    """Texts fetched by an earlier run, from the SQLite verse cache. Owns (and closes) the cache."""
+    name = "cache"
+
+    def __init__(self, cache: VerseCache):
+        self.cache = cache
+
+    def fetch(self, pairs: Sequence[Pair], on_texts: OnTexts = None) -> Dict[Pair, str]:
+        texts = self.cache.get_many(pairs)
+        if on_texts and texts:
+            on_texts(dict(texts))
+        return texts
+
+    def close(self):
+        print(self.cache.stats())
+        self.cache.close()
+
+
+class BibleApiSource(VerseSource):
+    """
+    bible-api.com via the batched planner and the async engine. Fetched
+    texts are written to the verse cache; lookups are left to CacheSource,
+    which comes before this source in the chain.
+    """
+    name = "bible-api.com"
+
+    def __init__(self, cache: Optional[VerseCache] = None, **client_options):
+        # Fail before any work is done if the HTTP client is missing
+        bible_api.require_httpx()
+        self.cache = cache
+        self.client_options = client_options
+
+    def fetch(self, pairs: Sequence[Pair], on_texts: OnTexts = None) -> Dict[Pair, str]:
+        texts: Dict[Pair, str] = {}
+        missing: Dict[str, List[VerseRef]] = {}
+        for translation, ref in pairs:
+            missing.setdefault(translation, []).append(ref)
+        if not missing:
+            return texts
+
+        # A few queries per book and translation instead of one per verse
+        plans = {translation: bible_api.plan_queries(refs) for translation, refs in missing.items()}
+        jobs = [(query, translation) for translation, plan in plans.items()
+                for queries in plan.values() for query in queries]
+        print(f"Planned {len(jobs)} requests for {sum(map(len, missing.values()))} verses.")
+
+        def store(fetched: Dict[Pair, str]):
+            if self.cache:
+                self.cache.put_many(fetched)
+            texts.update(fetched)
+            if on_texts:
+                on_texts(fetched)
+
+        # A book's texts are final once all of its queries are back: cache and report them right away
+        refs_by_book: Dict[Tuple[str, str], List[VerseRef]] = {}
+        for translation, refs in missing.items():
+            for ref in refs:
+                refs_by_book.setdefault((translation, ref.book), []).append(ref)
+        job_book = [(translation, book_id) for translation, plan in plans.items()
+                    for book_id, queries in plan.items() for _ in queries]
+        pending = {key: len(plans[key[0]][key[1]]) for key in refs_by_book}
+        responses: Dict[Tuple[str, str], List[Tuple[int, Optional[dict]]]] = {}
+        singles: List[Pair] = []
+
+        def on_result(index: int, data: Optional[dict]):
+            key = job_book[index]
+            responses.setdefault(key, []).append((index, data))
+            pending[key] -= 1
+            if pending[key]:
+                return
+            book_responses = [data for _, data in sorted(responses.pop(key), key=lambda item: item[0])]
+            refs = refs_by_book[key]
+            # A batch that failed or came back not-found as a whole says nothing about
+            # its single references: ask for each on its own before caching anything
+            if len(refs) > 1 and any(data is None or bible_api.is_not_found(data) for data in book_responses):
+                singles.extend((key[0], ref) for ref in refs)
+                return
+            book_data = bible_api.combine_responses(book_responses)
+            # None means a request failed: leave it out, so it is neither cached nor final
+            if book_data is None:
+                return
+            store({(key[0], ref): response_text(ref, book_data) for ref in refs})
+
+        started = time.perf_counter()
+        _, stats = bible_api.fetch_all(jobs, on_result, **self.client_options)
+        elapsed = time.perf_counter() - started
+        print(f"Fetched {stats['ok']}/{len(jobs)} in {elapsed:.1f}s "
+              f"({stats['requests']} requests, {stats['rate_limited']} rate limited, {stats['failed']} failed)")
+
+        if singles:
+            print(f"Retrying {len(singles)} verses of failed batches one by one.")
+            single_jobs = [(bible_api.plan_queries([ref])[ref.book][0], translation) for translation, ref in singles]
+
+            def on_single(index: int, data: Optional[dict]):
+                if data is not None:
+                    translation, ref = singles[index]
+                    store({(translation, ref): response_text(ref, data)})
+
+            _, stats = bible_api.fetch_all(single_jobs, on_single, **self.client_options)
+            print(f"Fetched {stats['ok']}/{len(single_jobs)} single verses "
+                  f"({stats['not_found']} not found, {stats['failed']} failed)")
+        return texts
+
+
+def fetch_texts(sources: Sequence[VerseSource], pairs: Sequence[Pair], on_texts: OnTexts = None) -> Dict[Pair, str]:
+    """Asks each source in turn for the pairs the previous ones could not serve."""
+    texts: Dict[Pair, str] = {}
+    remaining = list(dict.fromkeys(pairs))
+    for source in sources:
+        if not remaining:
+            break
+        started = time.perf_counter()
+        served = source.fetch(remaining, on_texts)
+        texts.update(served)
+        remaining = [pair for pair in remaining if pair not in served]
+        print(f"{source.name}: {len(served)} verses in {time.perf_counter() - started:.2f}s, "
+              f"{len(remaining)} left")
+    return texts